@@ -1,14 +1,129 @@
-﻿import _thread as thread
-import base64
+﻿import base64
 import hashlib
 import hmac
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urlparse, urlencode
 from time import mktime
 from wsgiref.handlers import format_date_time
-import ssl
 from typing import Dict, Any
 from common_imports import *
+from pet_history import ConversationHistory, context_budget
+
+
+class SparkConnection:
+    """讯飞星火的WebSocket连接管理
+
+    星火每个连接只回答一次，回答完服务器就会断开，所以每次回复结束后立即在后台
+    建好下一个连接，下一条消息直接发送，只剩一次网络往返。签名URL在有效期内复用，
+    不用每次重新计算。建连只用一个常驻的后台线程，收发都在调用方（聊天工作线程）里同步进行。
+    """
+    URL_TTL = 240          # 签名URL复用时长（秒），服务器只接受5分钟内的签名
+    IDLE_MAX = 50          # 预先建好的连接最多闲置多久（秒），超过后服务器可能已经断开
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 15
+
+    def __init__(self, signer):
+        self._signer = signer      # 生成签名URL的函数
+        self._url = None
+        self._url_key = None
+        self._url_expires = 0
+        self._lock = threading.Lock()
+        self._next = None          # 预连接的Future，结果为 (ws, 建立时间, key)
+        self._active = None        # 正在使用的连接，取消时中断
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spark-connect")
+        self.connects = 0
+        self.reused = 0            # 直接用上预连接的次数
+        self.signed = 0
+
+    def url(self, key):
+        """签名URL；key（密钥和地址）变化或过期后重新签名"""
+        with self._lock:
+            now = time.monotonic()
+            if self._url is None or key != self._url_key or now >= self._url_expires:
+                self._url = self._signer()
+                self._url_key = key
+                self._url_expires = now + self.URL_TTL
+                self.signed += 1
+            return self._url
+
+    def _open(self, key):
+        start = time.perf_counter()
+        ws = websocket.create_connection(self.url(key), timeout=self.CONNECT_TIMEOUT,
+                                         sslopt={"cert_reqs": ssl.CERT_NONE})
+        ws.settimeout(self.READ_TIMEOUT)
+        self.connects += 1
+        print(f"[API_DEBUG] 星火连接已建立 用时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return ws, time.monotonic(), key
+
+    def prefetch(self, key):
+        """在后台建立下一次要用的连接"""
+        with self._lock:
+            if self._closed or self._next is not None:
+                return
+            self._next = self._executor.submit(self._open, key)
+
+    def acquire(self, key):
+        """取一个连接：优先用预连接（还在建立就等它），不可用时当场建立"""
+        with self._lock:
+            future, self._next = self._next, None
+        if future is not None:
+            try:
+                ws, opened, ws_key = future.result(timeout=self.CONNECT_TIMEOUT)
+            except Exception as e:
+                print(f"[API_DEBUG] 预连接不可用: {str(e)}")
+                future.add_done_callback(self._discard)  # 还在建立的连接建好后关闭
+            else:
+                if ws_key == key and ws.connected and time.monotonic() - opened < self.IDLE_MAX:
+                    self.reused += 1
+                    return self._activate(ws)
+                self._close_ws(ws)
+        return self._activate(self._open(key)[0])
+
+    def _activate(self, ws):
+        self._active = ws
+        return ws
+
+    def release(self, ws):
+        """本次请求结束：关闭连接（服务器也会断开）"""
+        if self._active is ws:
+            self._active = None
+        self._close_ws(ws)
+
+    @staticmethod
+    def _close_ws(ws):
+        """不等服务器回应关闭帧；服务器已经断开时close()不会释放socket，再调用shutdown()"""
+        try:
+            ws.close(timeout=0)
+        except Exception:
+            pass
+        ws.shutdown()
+
+    @classmethod
+    def _discard(cls, future):
+        if not future.cancelled() and future.exception() is None:
+            cls._close_ws(future.result()[0])
+
+    def abort(self):
+        """中断正在使用的连接，阻塞在接收上的线程会立即返回（GUI线程调用）"""
+        ws = self._active
+        if ws is not None:
+            ws.abort()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            future, self._next = self._next, None
+        self.abort()
+        if future is not None:
+            future.add_done_callback(self._discard)
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {"connects": self.connects, "reused": self.reused, "signed": self.signed}
+
+
 class APIHandler:
     API_TYPE = "xunfei"
     
@@ -24,14 +139,18 @@ class APIHandler:
         self.app_id = ""
         self.domain = "lite"
         self.spark_url = "wss://spark-api.xf-yun.com/v1.1/chat"
-        self.max_history_length = 3
         self.system_prompt = "你是一个可爱的桌面宠物助手，回答要简短有趣。"
-        self.conversation_history = [
-            {"role": "system", "content": self.system_prompt}
-        ]
+        self.history = ConversationHistory(self.system_prompt, context_budget(self.domain))
         self.answer = ""
+        self.connection = SparkConnection(self.create_url)
+        self._cancelled = False
         self.load_config()
 
+    @property
+    def conversation_history(self):
+        """发送给API的消息列表（每次生成新列表，修改历史请用 self.history）"""
+        return self.history.messages()
+
     def load_config(self):
         """加载配置"""
         if os.path.exists(self.config_file):
@@ -91,30 +210,41 @@ class APIHandler:
     
         return f"{self.spark_url}?{urlencode({'authorization': authorization, 'date': date, 'host': urlparse(self.spark_url).netloc})}"
 
-    def on_error(self, ws, error) -> None:
-        self.answer = f"错误: {str(error)}"
-
-    def on_close(self, ws, *args) -> None:
-        pass
-
-    def on_open(self, ws) -> None:
-        def run(*args):
-            ws.send(json.dumps({
-                "header": {"app_id": self.app_id, "uid": "123"},
-                "parameter": {"chat": {"domain": self.domain, "max_tokens": 512}},
-                "payload": {"message": {"text": self.conversation_history}}
-            }))
-        thread.start_new_thread(run, ())
-
-    def on_message(self, ws, message) -> None:
-        data = json.loads(message)
-        if data['header']['code'] != 0:
-            self.answer = f"API错误: {data['header']['message']}"
-            ws.close()
-        else:
+    def _connection_key(self):
+        """签名和连接都依赖这些配置，变化后旧的URL和预连接作废"""
+        return (self.api_key, self.api_secret, self.spark_url)
+
+    def warm_up(self) -> None:
+        """选中处理器时预先建立连接"""
+        if self.validate_config():
+            self.connection.prefetch(self._connection_key())
+
+    def cancel(self) -> None:
+        """中断进行中的请求（请求被取消或超时时由GUI线程调用）"""
+        self._cancelled = True
+        self.connection.abort()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _ask(self, ws) -> bool:
+        """在连接上发送当前对话并读完回复；连接已被服务器断开且还没收到内容时返回False"""
+        ws.send(json.dumps({
+            "header": {"app_id": self.app_id, "uid": "123"},
+            "parameter": {"chat": {"domain": self.domain, "max_tokens": 512}},
+            "payload": {"message": {"text": self.history.messages()}}
+        }))
+        while True:
+            message = ws.recv()
+            if not message:  # 对方关闭了连接
+                return bool(self.answer)
+            data = json.loads(message)
+            if data['header']['code'] != 0:
+                self.answer = f"API错误: {data['header']['message']}"
+                return True
             self.answer += data["payload"]["choices"]["text"][0]["content"]
             if data["payload"]["choices"]["status"] == 2:
-                ws.close()
+                return True
 
     def get_response(self, user_input: str) -> str:
         print(f"[API_DEBUG] 请求内容: {user_input}")
@@ -122,21 +252,40 @@ class APIHandler:
         if not self.validate_config():
             raise Exception("请先设置完整的API配置")
         
-        self.conversation_history.append({"role": "user", "content": user_input})
-        if len(self.conversation_history) > 5:
-            self.conversation_history = [self.conversation_history[0]] + self.conversation_history[-4:]
+        self.history.use_model(self.domain)
+        self.history.add("user", user_input)
         
         self.answer = ""
-        ws = websocket.WebSocketApp(
-            self.create_url(),
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close,
-            on_open=self.on_open
-        )
-        ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+        self._cancelled = False
+        key = self._connection_key()
+        try:
+            # 预连接可能闲置太久被服务器断开：还没收到内容就换新连接重发一次
+            for attempt in range(2):
+                ws = self.connection.acquire(key)
+                try:
+                    if self._cancelled or self._ask(ws):
+                        break
+                except (websocket.WebSocketConnectionClosedException, ConnectionError):
+                    if self._cancelled or self.answer or attempt:
+                        raise
+                finally:
+                    self.connection.release(ws)
+            if self._cancelled:
+                raise Exception("请求已取消")
+        except Exception as e:
+            if self._cancelled:
+                self.history.discard_unanswered()  # 没有回复的提问不留在历史里
+                raise Exception("请求已取消")
+            if isinstance(e, websocket.WebSocketTimeoutException):
+                self.history.discard_unanswered()
+                raise  # 保留超时类型，由调用方按超时处理
+            self.answer = self.answer or f"错误: {str(e)}"
+        finally:
+            if not self._cancelled:
+                self.connection.prefetch(key)  # 为下一条消息准备连接
         
         if self.answer:
-            self.conversation_history.append({"role": "assistant", "content": self.answer})
+            self.history.add("assistant", self.answer)
             return self.answer
-        raise Exception("未能获取响应")
\ No newline at end of file
+        self.history.discard_unanswered()
+        raise Exception("未能获取响应")
@@ -1,10 +1,16 @@
-﻿from typing import List, Dict, Any
+﻿from typing import List, Dict, Any, Iterator
 from common_imports import *
 from api_selector import APIHandlerBase
 from datetime import datetime
+from urllib.parse import urlsplit
 
 class APIHandler(APIHandlerBase):
     API_TYPE = "openrouter"
+    API_ROOT = "https://openrouter.ai/api/v1"
+    POOL_SIZE = 4          # 每个主机保持的连接数
+    CONNECT_TIMEOUT = 5    # 建立连接（TCP+TLS）的超时
+    READ_TIMEOUT = 15      # 两次收到数据之间的最长间隔
+
     def __init__(self):
         super().__init__()
         self.config_dir = Path("config")
@@ -14,7 +20,15 @@ class APIHandler(APIHandlerBase):
         self.config_file = self.config_dir / "openrouter.json"
         self.api_key = ""
         self.model = ""
-        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.stream = True    # 流式输出：回复边生成边显示
+        self.api_url = f"{self.API_ROOT}/chat/completions"
+        self.models_url = f"{self.API_ROOT}/models"
+        self.pool_size = self.POOL_SIZE
+        self.connect_timeout = self.CONNECT_TIMEOUT
+        self.read_timeout = self.READ_TIMEOUT
+        self._response = None  # 进行中的流式响应，取消时关闭
+        self._session = None
+        self._session_lock = threading.Lock()
         self.load_config()  # 确保初始化时加载配置
 
     def validate_config(self) -> bool:
@@ -36,6 +50,8 @@ class APIHandler(APIHandlerBase):
                     config = json.load(f)
                     self.api_key = config.get("api_key", "")
                     self.model = config.get("model", "")
+                    self.stream = config.get("stream", True)
+                    self._load_http_config(config)
 
             except Exception as e:
                 QMessageBox.warning(None, "配置错误", f"加载配置失败: {str(e)}")
@@ -43,13 +59,77 @@ class APIHandler(APIHandlerBase):
     def _update_config(self, config: Dict[str, Any]) -> None:
         self.api_key = config.get("api_key", "")
         self.model = config.get("model", "")
+        self.stream = config.get("stream", True)
+        self._load_http_config(config)
+
+    def _load_http_config(self, config: Dict[str, Any]) -> None:
+        pool_size = int(config.get("pool_size", self.POOL_SIZE))
+        # 基类构造时就会加载配置，这时会话还不存在
+        if getattr(self, "_session", None) is not None and pool_size != self.pool_size:
+            self.close()  # 连接池大小变了，下次请求时按新大小重建
+        self.pool_size = pool_size
+        self.connect_timeout = float(config.get("connect_timeout", self.CONNECT_TIMEOUT))
+        self.read_timeout = float(config.get("read_timeout", self.READ_TIMEOUT))
 
     def _get_config_data(self) -> Dict[str, Any]:
         return {
             "api_key": self.api_key,
-            "model": self.model
+            "model": self.model,
+            "stream": self.stream,
+            "pool_size": self.pool_size,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout
+        }
+
+    @property
+    def timeout(self):
+        """(连接超时, 读超时)：连接建立失败能很快报错，回复慢时又不会被过早打断"""
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def session(self):
+        """处理器自己的长连接会话（第一次使用时创建）
+
+        连接池里的连接在请求之间保持（keep-alive），后续请求省掉DNS、TCP和TLS握手。
+        """
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                self._session = session
+            return self._session
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
         }
 
+    def warm_up(self) -> None:
+        """在后台线程里预先建立到API主机的连接，第一条消息不用再等握手"""
+        parts = urlsplit(self.api_url)
+        origin = f"{parts.scheme}://{parts.netloc}/"
+
+        def connect():
+            start = time.perf_counter()
+            try:
+                self.session.head(origin, timeout=self.timeout).close()
+                print(f"[API_DEBUG] 已预连接 {parts.netloc} 用时 {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"[API_DEBUG] 预连接失败: {str(e)}")
+
+        threading.Thread(target=connect, name="openrouter-warmup", daemon=True).start()
+
+    def close(self) -> None:
+        """关闭连接池"""
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
     def validate_config(self) -> bool:
         return all([self.api_key, self.model])
 
@@ -58,10 +138,10 @@ class APIHandler(APIHandlerBase):
         headers = {"Authorization": f"Bearer {self.api_key}"}
     
         try:
-            response = requests.get(
-                "https://openrouter.ai/api/v1/models",
+            response = self.session.get(
+                self.models_url,
                 headers=headers,
-                timeout=10
+                timeout=self.timeout
             )
         
             if response.status_code == 200:
@@ -81,30 +161,86 @@ class APIHandler(APIHandlerBase):
         print(f"[API_DEBUG] 请求内容: {user_input}")
         print(f"[API_DEBUG] 当前配置: key={self.api_key}, model={self.model}")
         """获取AI响应"""
-        self.conversation_history.append({"role": "user", "content": user_input})
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        self.history.use_model(self.model)
+        self.history.add("user", user_input)
         
         payload = {
             "model": self.model,
-            "messages": self.conversation_history,
+            "messages": self.history.messages(),
             "temperature": 0.7
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
-                headers=headers,
+                headers=self._headers(),
                 data=json.dumps(payload),
-                timeout=15
+                timeout=self.timeout
             )
             response.raise_for_status()
             
             ai_response = response.json()["choices"][0]["message"]["content"]
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            self.history.add("assistant", ai_response)
             return ai_response
+        except requests.exceptions.Timeout:
+            self.history.discard_unanswered()
+            raise  # 保留超时类型，由调用方按超时处理
+        except Exception as e:
+            self.history.discard_unanswered()
+            raise Exception(f"API错误: {str(e)}")
+
+    def stream_response(self, user_input: str) -> Iterator[str]:
+        """流式获取AI响应（SSE，stream: true），逐段产出文本，结束后把完整回复加入对话历史"""
+        print(f"[API_DEBUG] 流式请求内容: {user_input}")
+        self.history.use_model(self.model)
+        self.history.add("user", user_input)
+
+        payload = {
+            "model": self.model,
+            "messages": self.history.messages(),
+            "temperature": 0.7,
+            "stream": True
+        }
+
+        parts = []
+        completed = False
+        try:
+            # 读超时是两段数据之间的最长间隔，不是整个回复的时长
+            response = self.session.post(self.api_url, headers=self._headers(), data=json.dumps(payload),
+                                         timeout=self.timeout, stream=True)
+            self._response = response
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    # 空行分隔事件，冒号开头的是服务器的保活注释
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    event = json.loads(data)
+                    if "error" in event:
+                        raise Exception(event["error"].get("message", event["error"]))
+                    content = event["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        parts.append(content)
+                        yield content
+            finally:
+                self._response = None
+                response.close()
+            completed = True
+        except requests.exceptions.Timeout:
+            raise  # 保留超时类型，由调用方按超时处理
         except Exception as e:
-            raise Exception(f"API错误: {str(e)}")
\ No newline at end of file
+            raise Exception(f"API错误: {str(e)}")
+        finally:
+            # 取消（生成器被提前关闭）、超时或出错时没有完整回复，去掉这轮的提问
+            if not completed:
+                self.history.discard_unanswered()
+        self.history.add("assistant", "".join(parts))
+
+    def cancel(self) -> None:
+        """关闭进行中的流式响应（请求被取消或超时时由GUI线程调用）"""
+        response = self._response
+        if response is not None:
+            response.close()
\ No newline at end of file
@@ -1,6 +1,7 @@
 ﻿from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from common_imports import *
+from pet_history import ConversationHistory
 
 class APISelector:
     def __init__(self, parent=None):
@@ -51,10 +52,14 @@ class APIHandlerBase(ABC):
         # 配置文件路径
         default_config_file = f"config_{self.API_TYPE}.json"
         self.config_file = self.config_dir / (config_file or default_config_file)
-        self.conversation_history = [
-            {"role": "system", "content": "你是一个可爱的桌面宠物助手，回答要简短有趣。"}
-        ]
+        # 按token预算裁剪的对话历史，请求大小不随对话变长而增长
+        self.history = ConversationHistory("你是一个可爱的桌面宠物助手，回答要简短有趣。")
         self.load_config()
+
+    @property
+    def conversation_history(self):
+        """发送给API的消息列表（每次生成新列表，修改历史请用 self.history）"""
+        return self.history.messages()
     
     @property
     @abstractmethod
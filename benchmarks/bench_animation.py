@@ -0,0 +1,309 @@
+"""动画渲染基准：在offscreen平台下逐个播放动画、随机行走、模拟拖动，统计渲染开销
+
+用法:
+    python benchmarks/bench_animation.py                    # 运行并与 baseline.json 对比
+    python benchmarks/bench_animation.py --duration 3000    # 每个场景运行3秒
+    python benchmarks/bench_animation.py --update-baseline  # 用本次结果覆盖基线
+    python benchmarks/bench_animation.py --check            # 有回归时返回非0退出码
+    python benchmarks/bench_animation.py --compact          # 使用紧凑帧存储，对比常驻帧内存
+
+基线和机器有关，换机器后先运行一次 --update-baseline。
+"""
+import os
+import sys
+import time
+import json
+import math
+import argparse
+import tracemalloc
+
+from bench_common import setup_repo_path, peak_rss_kb, REPO_ROOT
+
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+
+# 指标: (显示名, 越大越好, 允许的回归比例)
+METRICS = {
+    "fps": ("帧率", True, 0.20),
+    "ms_per_frame": ("每帧CPU(ms)", False, 0.30),
+    "wakeups_per_sec": ("唤醒/秒", False, 0.30),
+    "py_alloc_peak_kb": ("Python分配峰值(KB)", False, 0.50),
+    "qobject_growth": ("QObject增长", False, 0.0),
+    "peak_rss_kb": ("峰值RSS(KB)", False, 0.20),
+    "drag_latency_ms": ("拖动延迟(ms)", False, 0.50),
+    "frame_memory_kb": ("常驻帧内存(KB)", False, 0.10),
+}
+
+
+def count_qobjects(app):
+    """所有顶层窗口及其子对象的数量"""
+    from PyQt5.QtCore import QObject
+    return sum(1 + len(w.findChildren(QObject)) for w in app.topLevelWidgets()) + \
+        len(app.findChildren(QObject))
+
+
+class AnimationBench:
+    """按顺序运行各场景，每个场景结束时记录指标"""
+
+    def __init__(self, app, pet, duration_ms, trace):
+        self.app = app
+        self.pet = pet
+        self.duration_ms = duration_ms
+        self.trace = trace
+        self.results = {}
+        self._queue = []
+        self._drag_timer = None
+
+    def build(self):
+        for name in self.pet.animation_bindings:
+            self._queue.append((f"play_{name}", lambda n=name: self.pet.animations.play(n), None))
+        self._queue.append(("random_walk", self._start_walks, self._stop_walks))
+        self._queue.append(("drag", self._start_drag, self._stop_drag))
+
+    def start(self):
+        from PyQt5.QtCore import QTimer
+        QTimer.singleShot(0, self._next)
+
+    def _next(self):
+        from PyQt5.QtCore import QTimer
+        if not self._queue:
+            self.app.quit()
+            return
+        name, begin, end = self._queue.pop(0)
+        self._begin(name)
+        begin()
+        QTimer.singleShot(self.duration_ms, lambda: self._finish(name, end))
+
+    def _snapshot(self):
+        canvas = self.pet.pet_image
+        return {
+            "time": time.perf_counter(),
+            "cpu": time.process_time(),
+            "paints": canvas.paints,
+            "wakeups": self.pet.clock.wakeups,
+            "qobjects": count_qobjects(self.app),
+        }
+
+    def _begin(self, name):
+        self.pet.power.notify_interaction()  # 基准期间不进入降帧模式
+        if self.trace:
+            tracemalloc.reset_peak()
+            self._trace_start = tracemalloc.get_traced_memory()[0]
+        self._start = self._snapshot()
+
+    def _finish(self, name, end):
+        extra = end() if end else None
+        self.pet.animations._stop_current_animations()
+        stop = self._snapshot()
+        start = self._start
+        seconds = max(1e-6, stop["time"] - start["time"])
+        frames = stop["paints"] - start["paints"]
+        result = {
+            "frames": frames,
+            "fps": frames / seconds,
+            "ms_per_frame": (stop["cpu"] - start["cpu"]) * 1000 / frames if frames else None,
+            "wakeups_per_sec": (stop["wakeups"] - start["wakeups"]) / seconds,
+            "qobject_growth": stop["qobjects"] - start["qobjects"],
+            "peak_rss_kb": peak_rss_kb(),
+            "frame_memory_kb": self.pet.animations.atlas.resident_bytes() / 1024,
+        }
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            result["py_alloc_peak_kb"] = (peak - self._trace_start) / 1024
+            result["py_alloc_net_kb"] = (current - self._trace_start) / 1024
+        if extra:
+            result.update(extra)
+        self.results[name] = result
+        print(f"[基准] {name}: {frames}帧 {result['fps']:.1f}fps", file=sys.stderr)
+        self._next()
+
+    # ---- 场景 ----
+    def _start_walks(self):
+        self._walking = True
+        self._walk_once()
+
+    def _walk_once(self):
+        if not self._walking:
+            return
+        animations = self.pet.animations
+        if not animations.motion.is_running():
+            animations._stop_current_animations()
+            animations.random_walk()
+        self.pet.clock.schedule(100, self._walk_once)
+
+    def _stop_walks(self):
+        self._walking = False
+
+    def _start_drag(self):
+        from PyQt5.QtCore import Qt, QPoint, QEvent, QTimer
+        from PyQt5.QtGui import QMouseEvent
+        pet = self.pet
+        self._drag_stats = pet.drag.stats()
+        self._drag_origin = pet.pos()
+        self._drag_step = 0
+        local = QPoint(pet.width() // 2, pet.height() // 2)
+        press = QMouseEvent(QEvent.MouseButtonPress, local, pet.mapToGlobal(local),
+                            Qt.LeftButton, Qt.LeftButton, Qt.NoModifier)
+        self.app.sendEvent(pet, press)
+        self._drag_local = local
+        self._drag_timer = QTimer()
+        self._drag_timer.timeout.connect(self._drag_move)
+        self._drag_timer.start(8)  # 鼠标事件比帧率更密集
+
+    def _drag_move(self):
+        from PyQt5.QtCore import Qt, QPoint, QEvent
+        from PyQt5.QtGui import QMouseEvent
+        self._drag_step += 1
+        angle = self._drag_step * 0.05
+        target = self._drag_origin + QPoint(int(120 * math.cos(angle)), int(80 * math.sin(angle)))
+        global_pos = target + self._drag_local
+        move = QMouseEvent(QEvent.MouseMove, self._drag_local, global_pos,
+                           Qt.NoButton, Qt.LeftButton, Qt.NoModifier)
+        self.app.sendEvent(self.pet, move)
+
+    def _stop_drag(self):
+        from PyQt5.QtCore import Qt, QEvent
+        from PyQt5.QtGui import QMouseEvent
+        self._drag_timer.stop()
+        pet = self.pet
+        release = QMouseEvent(QEvent.MouseButtonRelease, self._drag_local, pet.mapToGlobal(self._drag_local),
+                              Qt.LeftButton, Qt.NoButton, Qt.NoModifier)
+        self.app.sendEvent(pet, release)
+        before, after = self._drag_stats, pet.drag.stats()
+        events = after["events"] - before["events"]
+        return {
+            "drag_events": events,
+            "drag_moves": after["moves"] - before["moves"],
+            "drag_coalesced": after["coalesced"] - before["coalesced"],
+            "drag_latency_ms": after["latency_avg_ms"],
+        }
+
+
+def run_bench(duration_ms, trace, compact=False):
+    setup_repo_path()
+    os.chdir(REPO_ROOT)
+    if trace:
+        tracemalloc.start()
+
+    from PyQt5.QtCore import Qt, QCoreApplication, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    app = QApplication(sys.argv[:1])
+
+    # 启动过程中可能弹出API配置对话框，基准中自动关闭
+    def close_modal():
+        widget = QApplication.activeModalWidget()
+        if widget:
+            widget.close()
+    modal_closer = QTimer()
+    modal_closer.timeout.connect(close_modal)
+    modal_closer.start(20)
+
+    from desktop_pet import DesktopPet
+    pet = DesktopPet()
+    # 关掉随机动画和问候，只运行基准场景
+    pet.animation_timer.stop()
+    pet.greeting_timer.stop()
+    pet.animations.set_compact_frames(compact)  # 只影响本次运行，不保存设置
+
+    bench = AnimationBench(app, pet, duration_ms, trace)
+    bench.build()
+
+    def start_when_ready():
+        if pet.startup.finished:
+            bench.start()
+        else:
+            QTimer.singleShot(50, start_when_ready)
+    QTimer.singleShot(0, start_when_ready)
+    app.exec_()
+    return {
+        "config": {"duration_ms": duration_ms, "pet_size": pet.pet_size,
+                   "tracemalloc": trace, "platform": sys.platform, "compact": compact},
+        "scenarios": bench.results,
+    }
+
+
+def compare(results, baseline):
+    """返回 [(场景, 指标, 基线, 本次, 变化比例, 是否回归)]"""
+    rows = []
+    for scenario, metrics in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        for key, (_label, higher_better, tolerance) in METRICS.items():
+            old, new = base.get(key), metrics.get(key)
+            if old is None or new is None:
+                continue
+            if old == 0:
+                change = 0.0 if new == 0 else math.inf
+            else:
+                change = (new - old) / abs(old)
+            worse = -change if higher_better else change
+            if key == "qobject_growth":
+                regressed = new > old
+            else:
+                regressed = worse > tolerance
+            rows.append((scenario, key, old, new, change, regressed))
+    return rows
+
+
+def print_report(results, rows):
+    print(f"{'场景':<22}{'帧数':>8}{'帧率':>10}{'每帧CPU(ms)':>14}{'唤醒/秒':>10}"
+          f"{'分配峰值KB':>12}{'QObject增长':>12}{'帧内存KB':>10}")
+    for name, r in results["scenarios"].items():
+        ms = r.get("ms_per_frame")
+        alloc = r.get("py_alloc_peak_kb")
+        print(f"{name:<22}{r['frames']:>8}{r['fps']:>10.1f}"
+              f"{(f'{ms:.2f}' if ms is not None else '-'):>14}{r['wakeups_per_sec']:>10.1f}"
+              f"{(f'{alloc:.0f}' if alloc is not None else '-'):>12}{r['qobject_growth']:>12}{r.get('frame_memory_kb', 0):>10.0f}")
+    last = list(results["scenarios"].values())[-1] if results["scenarios"] else {}
+    if last.get("peak_rss_kb"):
+        print(f"峰值RSS: {last['peak_rss_kb'] / 1024:.1f}MB")
+
+    regressions = [row for row in rows if row[5]]
+    if rows:
+        print(f"\n与基线对比: {len(rows)}项指标，{len(regressions)}项回归")
+        for scenario, key, old, new, change, _ in regressions:
+            label = METRICS[key][0]
+            print(f"  回归 {scenario} {label}: {old:.2f} -> {new:.2f} ({change * 100:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桌宠动画渲染基准")
+    parser.add_argument("--duration", type=int, default=2000, help="每个场景的时长(ms)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="不统计Python分配（计时更准）")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--check", action="store_true", help="有回归时返回非0退出码")
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    parser.add_argument("--compact", action="store_true", help="使用紧凑帧存储")
+    args = parser.parse_args()
+
+    results = run_bench(args.duration, not args.no_tracemalloc, args.compact)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print(f"注意: 基线配置 {baseline.get('config')} 与本次 {results['config']} 不同，对比仅供参考")
+    rows = compare(results, baseline) if baseline else []
+
+    if args.json:
+        print(json.dumps({"results": results, "comparison": rows}, ensure_ascii=False, indent=2))
+        regressions = [row for row in rows if row[5]]
+    else:
+        regressions = print_report(results, rows)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"已更新基线 {args.baseline}")
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""基准测试共用的小工具"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_repo_path():
+    """让基准脚本可以直接导入仓库根目录下的模块"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+def current_rss_kb():
+    """当前进程常驻内存(KB)，取不到时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss // 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return peak_rss_kb()
+
+
+def peak_rss_kb():
+    """进程峰值常驻内存(KB)，取不到时返回None"""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) // 1024
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 返回字节，Linux 返回KB
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except ImportError:
+        return None
+
+
+def run_child(script, args, env=None, timeout=120):
+    """运行子进程并解析它最后一行输出的JSON结果"""
+    child_env = dict(os.environ)
+    child_env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if env:
+        child_env.update(env)
+    proc = subprocess.run(
+        [sys.executable, script] + list(args),
+        cwd=REPO_ROOT, env=child_env, capture_output=True,
+        text=True, encoding="utf-8", errors="replace", timeout=timeout
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"子进程没有输出结果:\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+
+
+def summarize(values):
+    """返回中位数，忽略None"""
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
@@ -0,0 +1,99 @@
+"""对话历史基准：模拟一段很长的对话，对比每次请求发送的消息大小
+
+改动前 OpenRouter 处理器每次发送全部历史，讯飞处理器只保留系统提示和最近4条；
+现在两者共用按token预算裁剪的 ConversationHistory（被删掉的提问压缩成摘要）。
+
+用法:
+    python benchmarks/bench_history.py                   # 模拟1000轮
+    python benchmarks/bench_history.py --turns 5000 --model lite
+    python benchmarks/bench_history.py --json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+
+from bench_common import setup_repo_path, peak_rss_kb
+
+SYSTEM_PROMPT = "你是一个可爱的桌面宠物助手，回答要简短有趣。"
+QUESTIONS = ("讲个笑话", "你喜欢吃什么", "给我推荐一本书", "我今天好累啊", "帮我想个周末去哪玩",
+             "what's your favourite colour", "怎么学好Python", "陪我聊聊天吧")
+
+
+def reply(rng):
+    return "".join(rng.choice("好呀嘿嘿今天我们一起去玩吧皮卡丘最喜欢你了") for _ in range(rng.randint(20, 80)))
+
+
+def payload_size(messages):
+    return len(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+def run_bench(turns, model, seed=1):
+    setup_repo_path()
+    from pet_history import ConversationHistory, estimate_tokens, MESSAGE_OVERHEAD
+
+    rng = random.Random(seed)
+    system = {"role": "system", "content": SYSTEM_PROMPT}
+    unbounded = [system]
+    history = ConversationHistory(SYSTEM_PROMPT)
+    history.use_model(model)
+    checkpoints = sorted({t for t in (10, 100, turns // 2, turns) if 0 < t <= turns})
+    rows = []
+    add_ns = 0
+    for turn in range(1, turns + 1):
+        question = f"{rng.choice(QUESTIONS)}（{turn}）"
+        answer = reply(rng)
+
+        unbounded.append({"role": "user", "content": question})
+        start = time.perf_counter_ns()
+        history.add("user", question)
+        add_ns += time.perf_counter_ns() - start
+        if turn in checkpoints:
+            managed = history.messages()
+            rows.append({
+                "turn": turn,
+                "full_bytes": payload_size(unbounded),
+                "full_tokens": sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in unbounded),
+                "last4_bytes": payload_size([system] + unbounded[1:][-4:]),
+                "managed_bytes": payload_size(managed),
+                "managed_tokens": history.tokens,
+                "managed_messages": len(managed),
+            })
+        unbounded.append({"role": "assistant", "content": answer})
+        start = time.perf_counter_ns()
+        history.add("assistant", answer)
+        add_ns += time.perf_counter_ns() - start
+    return {"config": {"turns": turns, "model": model, "budget": history.budget},
+            "checkpoints": rows, "add_us": add_ns / (2 * turns) / 1000,
+            "history": history.stats(), "peak_rss_kb": peak_rss_kb()}
+
+
+def print_report(results):
+    config = results["config"]
+    print(f"模型 {config['model'] or '(默认)'}，预算 {config['budget']} tokens，共 {config['turns']} 轮")
+    print(f"{'轮次':>6}{'全部历史 KB/token':>22}{'最近4条 KB':>12}{'预算裁剪 KB/token/条':>24}")
+    for r in results["checkpoints"]:
+        print(f"{r['turn']:>6}{r['full_bytes'] / 1024:>14.1f} / {r['full_tokens']:<7}"
+              f"{r['last4_bytes'] / 1024:>10.1f}"
+              f"{r['managed_bytes'] / 1024:>14.1f} / {r['managed_tokens']:<4} / {r['managed_messages']}")
+    print(f"每条消息加入+裁剪平均 {results['add_us']:.1f}us，已删除 {results['history']['evicted']} 条，"
+          f"摘要 {results['history']['summary_topics']} 个话题")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话历史大小基准")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--model", default="", help="按模型名选择预算，例如 lite")
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    args = parser.parse_args()
+
+    results = run_bench(args.turns, args.model)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""HTTP连接基准：对比每次调用模块级 requests.post 和 OpenRouter 处理器的长连接会话
+
+本地起一个模拟的 OpenRouter 服务（HTTP/1.1 keep-alive），服务端不做任何处理，
+测出来的延迟基本就是客户端每个请求的开销。--handshake-ms 让服务端在每个新连接上
+先等待一段时间，模拟真实网络里TCP+TLS握手的往返。
+
+用法:
+    python benchmarks/bench_http.py                      # 握手0ms和30ms各测一次
+    python benchmarks/bench_http.py --requests 200 --handshake-ms 80
+    python benchmarks/bench_http.py --json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import setup_repo_path, peak_rss_kb
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟 /chat/completions（普通和SSE）、/models 和预连接用的HEAD"""
+    protocol_version = "HTTP/1.1"
+    handshake_ms = 0
+
+    def setup(self):
+        super().setup()
+        # 头和正文分两次写，不关Nagle时复用的连接会撞上延迟ACK（约40ms），真实服务器都会关掉
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._send(json.dumps({"data": [{"id": "mock/gpt", "description": "chat"}]}).encode())
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if payload.get("stream"):
+            events = [{"choices": [{"delta": {"content": piece}}]} for piece in ("你", "好", "呀")]
+            body = b"".join(b"data: " + json.dumps(e).encode() + b"\n\n" for e in events) + b"data: [DONE]\n\n"
+            self._send(body, "text/event-stream")
+        else:
+            self._send(json.dumps({"choices": [{"message": {"content": "你好呀"}}]}).encode())
+
+
+def start_server(handshake_ms):
+    handler = type("Handler", (MockHandler,), {"handshake_ms": handshake_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(call, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "first_ms": samples[0] if count == 1 else None,
+    }
+
+
+def run_case(handshake_ms, count):
+    import requests
+    from api_handler2 import APIHandler
+
+    server = start_server(handshake_ms)
+    root = f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+
+    def make_handler():
+        handler = APIHandler()
+        handler.api_key = "mock-key-0123456789abcdef"
+        handler.model = "mock/gpt"
+        handler.api_url = f"{root}/chat/completions"
+        handler.models_url = f"{root}/models"
+        return handler
+
+    def old_post():
+        # 改动前 get_response 的写法：每次调用都新建会话和连接
+        payload = {"model": "mock/gpt", "messages": [{"role": "user", "content": "你好"}], "temperature": 0.7}
+        response = requests.post(f"{root}/chat/completions", data=json.dumps(payload),
+                                 headers={"Authorization": "Bearer mock", "Content-Type": "application/json"},
+                                 timeout=15)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    handler = make_handler()
+
+    def pooled_post():
+        handler.history.clear()  # 每次请求的消息长度保持一致
+        return handler.get_response("你好")
+
+    def pooled_stream():
+        handler.history.clear()
+        return "".join(handler.stream_response("你好"))
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, call in (("requests.post", old_post), ("session", pooled_post), ("session_stream", pooled_stream)):
+            before = server.connections
+            call()  # 预热：导入、第一次建立连接
+            stats = measure(call, count)
+            stats["connections"] = server.connections - before
+            results[name] = stats
+
+        # 切换到处理器后发第一条消息：冷启动 vs 选中时已预连接
+        cold = make_handler()
+        results["first_cold_ms"] = measure(lambda: cold.get_response("你好"), 1)["first_ms"]
+        warm = make_handler()
+        warm.warm_up()
+        time.sleep(handshake_ms / 1000 + 0.2)
+        results["first_warm_ms"] = measure(lambda: warm.get_response("你好"), 1)["first_ms"]
+        for h in (handler, cold, warm):
+            h.close()
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def run_bench(handshakes, count):
+    setup_repo_path()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # 处理器在当前目录读写config/，不碰仓库里的配置
+        try:
+            cases = {str(ms): run_case(ms, count) for ms in handshakes}
+        finally:
+            os.chdir(cwd)
+    return {"config": {"requests": count, "handshake_ms": handshakes}, "cases": cases, "peak_rss_kb": peak_rss_kb()}
+
+
+def print_report(results):
+    count = results["config"]["requests"]
+    for ms, case in results["cases"].items():
+        print(f"握手 {ms}ms，{count}个请求")
+        print(f"  {'方式':<16}{'中位数ms':>10}{'p95 ms':>10}{'新建连接':>10}")
+        for name in ("requests.post", "session", "session_stream"):
+            r = case[name]
+            print(f"  {name:<16}{r['median_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['connections']:>10}")
+        old, new = case["requests.post"]["median_ms"], case["session"]["median_ms"]
+        print(f"  每个请求节省 {old - new:.2f}ms ({old / max(new, 1e-6):.1f}x)；"
+              f"切换后第一条消息 冷启动{case['first_cold_ms']:.1f}ms → 预连接{case['first_warm_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenRouter处理器HTTP长连接基准")
+    parser.add_argument("--requests", type=int, default=100, help="每种方式的请求数")
+    parser.add_argument("--handshake-ms", type=int, action="append",
+                        help="模拟每个新连接的握手耗时，可多次指定（默认0和30）")
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    args = parser.parse_args()
+
+    results = run_bench(args.handshake_ms or [0, 30], args.requests)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""讯飞星火连接基准：对比改动前每条消息新建WebSocketApp+线程的写法和连接管理器
+
+本地起一个模拟的星火服务（最简WebSocket实现，和真服务一样回答完就断开连接），
+--handshake-ms 让服务端在每个新连接上先等待一段时间，模拟TCP+TLS+WebSocket握手的往返。
+两条消息之间留出“打字时间”，让后台预连接有机会完成。
+
+用法:
+    python benchmarks/bench_spark.py                     # 握手0ms和30ms各测一次
+    python benchmarks/bench_spark.py --turns 50 --handshake-ms 80
+    python benchmarks/bench_spark.py --json
+"""
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import socket
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+import socketserver
+
+from bench_common import setup_repo_path, peak_rss_kb
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class MockSpark(socketserver.BaseRequestHandler):
+    """握手、读一条文本消息、分几帧回复、发关闭帧后断开"""
+    handshake_ms = 0
+    pieces = ("你", "好", "呀")
+
+    def handle(self):
+        self.server.connections += 1
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sock.makefile("rb")
+        headers = {}
+        reader.readline()  # 请求行
+        for line in iter(reader.readline, b"\r\n"):
+            if not line:
+                return
+            name, _sep, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000)
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        try:
+            opcode, _payload = self.read_frame(reader)
+        except (OSError, struct.error, IndexError):  # 客户端没发消息就断开
+            return
+        if opcode != 1:
+            return
+        for i, piece in enumerate(self.pieces):
+            status = 2 if i == len(self.pieces) - 1 else 1
+            message = {"header": {"code": 0, "message": "Success"},
+                       "payload": {"choices": {"status": status, "text": [{"content": piece}]}}}
+            self.send_frame(sock, 1, json.dumps(message).encode())
+        self.send_frame(sock, 8, struct.pack("!H", 1000))
+
+    @staticmethod
+    def read_frame(reader):
+        head = reader.read(2)
+        opcode, length = head[0] & 0x0f, head[1] & 0x7f
+        if length == 126:
+            length = struct.unpack("!H", reader.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", reader.read(8))[0]
+        mask = reader.read(4) if head[1] & 0x80 else b"\0\0\0\0"
+        data = reader.read(length)
+        return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+    @staticmethod
+    def send_frame(sock, opcode, data):
+        if len(data) < 126:
+            head = struct.pack("!BB", 0x80 | opcode, len(data))
+        else:
+            head = struct.pack("!BBH", 0x80 | opcode, 126, len(data))
+        try:
+            sock.sendall(head + data)
+        except OSError:
+            pass
+
+
+def start_server(handshake_ms):
+    handler = type("Handler", (MockSpark,), {"handshake_ms": handshake_ms})
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def old_turn(handler):
+    """改动前 get_response 的写法：每条消息重新签名、新建WebSocketApp，并开一个线程发送"""
+    import _thread
+    import ssl
+    import websocket
+    handler.answer = ""
+
+    def on_open(ws):
+        def run(*args):
+            ws.send(json.dumps({
+                "header": {"app_id": handler.app_id, "uid": "123"},
+                "parameter": {"chat": {"domain": handler.domain, "max_tokens": 512}},
+                "payload": {"message": {"text": handler.conversation_history}}
+            }))
+        _thread.start_new_thread(run, ())
+
+    def on_message(ws, message):
+        data = json.loads(message)
+        handler.answer += data["payload"]["choices"]["text"][0]["content"]
+        if data["payload"]["choices"]["status"] == 2:
+            ws.close()
+
+    ws = websocket.WebSocketApp(handler.create_url(), on_message=on_message, on_open=on_open)
+    ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+    return handler.answer
+
+
+def run_case(handshake_ms, turns, think_ms):
+    from api_handler import APIHandler
+
+    server = start_server(handshake_ms)
+
+    def make_handler():
+        handler = APIHandler()
+        handler.api_key, handler.api_secret, handler.app_id = "mock-key", "mock-secret", "mock-app"
+        handler.spark_url = f"ws://127.0.0.1:{server.server_address[1]}/v1.1/chat"
+        return handler
+
+    def run(call):
+        before = server.connections
+        samples = []
+        for _ in range(turns):
+            time.sleep(think_ms / 1000)  # 用户打字的时间，不计入
+            start = time.perf_counter()
+            assert call() == "你好呀"
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return {"median_ms": statistics.median(samples),
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "connections": server.connections - before}
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        old = make_handler()
+        results["old"] = run(lambda: old_turn(old))
+
+        new = make_handler()
+        new.warm_up()
+        results["managed"] = run(lambda: new.get_response("你好"))
+        results["managed"].update(new.connection.stats())
+        new.close()
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def run_bench(handshakes, turns, think_ms):
+    setup_repo_path()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # 处理器在当前目录读写config/，不碰仓库里的配置
+        try:
+            cases = {str(ms): run_case(ms, turns, think_ms) for ms in handshakes}
+        finally:
+            os.chdir(cwd)
+    return {"config": {"turns": turns, "think_ms": think_ms, "handshake_ms": handshakes},
+            "cases": cases, "peak_rss_kb": peak_rss_kb()}
+
+
+def print_report(results):
+    turns = results["config"]["turns"]
+    for ms, case in results["cases"].items():
+        old, new = case["old"], case["managed"]
+        print(f"握手 {ms}ms，{turns}轮对话")
+        print(f"  {'方式':<12}{'中位数ms':>10}{'p95 ms':>10}{'新建连接':>10}")
+        print(f"  {'改动前':<12}{old['median_ms']:>10.2f}{old['p95_ms']:>10.2f}{old['connections']:>10}")
+        print(f"  {'连接管理器':<12}{new['median_ms']:>10.2f}{new['p95_ms']:>10.2f}{new['connections']:>10}")
+        print(f"  每轮节省 {old['median_ms'] - new['median_ms']:.2f}ms；"
+              f"预连接命中 {new['reused']}/{turns}，URL签名 {new['signed']}次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="讯飞星火WebSocket连接基准")
+    parser.add_argument("--turns", type=int, default=30, help="每种方式的对话轮数")
+    parser.add_argument("--think-ms", type=int, default=100, help="两轮之间的间隔")
+    parser.add_argument("--handshake-ms", type=int, action="append",
+                        help="模拟每个新连接的握手耗时，可多次指定（默认0和30）")
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    args = parser.parse_args()
+
+    results = run_bench(args.handshake_ms or [0, 30], args.turns, args.think_ms)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""精灵格式基准：对比原始GIF和gif2sprite生成的.pspr的文件大小、解码时间和解码后内存
+
+用法:
+    python benchmarks/bench_sprite.py                 # 转换pikaqiu下的GIF到临时目录后对比
+    python benchmarks/bench_sprite.py --runs 20 --size 280
+    python benchmarks/bench_sprite.py --json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+from bench_common import setup_repo_path, peak_rss_kb, REPO_ROOT
+
+
+def distinct_bytes(images):
+    """去掉重复对象后的帧像素字节数"""
+    return sum(image.sizeInBytes() for image in {id(image): image for image in images}.values())
+
+
+def time_median(func, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def run_bench(skin_dir, size, runs):
+    setup_repo_path()
+    from PyQt5.QtCore import QSize
+    from PyQt5.QtGui import QGuiApplication
+    app = QGuiApplication(sys.argv[:1])
+
+    from pet_frame_atlas import FrameAtlas
+    from pet_sprite import SpriteFile
+    sys.path.insert(0, os.path.join(REPO_ROOT, "tools"))
+    from gif2sprite import read_gif
+
+    atlas = FrameAtlas(QSize(size, size))
+    pixel_size = QSize(size, size)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(os.listdir(skin_dir)):
+            if not name.lower().endswith(".gif"):
+                continue
+            gif_path = os.path.join(skin_dir, name)
+            sprite_path = os.path.join(tmp, os.path.splitext(name)[0] + SpriteFile.SUFFIX)
+            images, delays = read_gif(gif_path)
+            SpriteFile.save(SpriteFile.encode(images, delays), sprite_path)
+
+            gif_ms, (gif_images, _d) = time_median(lambda: atlas._decode_gif(name, gif_path, pixel_size), runs)
+            sprite_ms, (sprite_images, _d) = time_median(lambda: atlas._decode_sprite(name, sprite_path, pixel_size), runs)
+            load_ms, sprite = time_median(lambda: SpriteFile.load(sprite_path), runs)
+            results[name] = {
+                "frames": len(gif_images),
+                "unique_frames": len(sprite.frames),
+                "gif_kb": os.path.getsize(gif_path) / 1024,
+                "sprite_kb": os.path.getsize(sprite_path) / 1024,
+                "gif_decode_ms": gif_ms,
+                "sprite_decode_ms": sprite_ms,
+                "sprite_load_ms": load_ms,
+                "gif_frames_kb": distinct_bytes(gif_images) / 1024,
+                "sprite_frames_kb": distinct_bytes(sprite_images) / 1024,
+                "sprite_indexed_kb": sprite.nbytes() / 1024,
+            }
+            print(f"[基准] {name} 完成", file=sys.stderr)
+    del app
+    return {"config": {"size": size, "runs": runs}, "animations": results, "peak_rss_kb": peak_rss_kb()}
+
+
+def print_report(results):
+    print(f"{'动画':<22}{'帧/去重':>9}{'文件KB GIF→精灵':>18}{'解码ms GIF→精灵':>18}"
+          f"{'ARGB帧KB GIF→精灵':>20}{'索引KB':>9}")
+    totals = dict.fromkeys(("gif_kb", "sprite_kb", "gif_decode_ms", "sprite_decode_ms",
+                            "gif_frames_kb", "sprite_frames_kb", "sprite_indexed_kb"), 0.0)
+    for name, r in results["animations"].items():
+        for key in totals:
+            totals[key] += r[key]
+        print(f"{name:<22}{r['frames']:>5}/{r['unique_frames']:<3}"
+              f"{r['gif_kb']:>9.0f} → {r['sprite_kb']:<6.0f}"
+              f"{r['gif_decode_ms']:>9.1f} → {r['sprite_decode_ms']:<6.1f}"
+              f"{r['gif_frames_kb']:>11.0f} → {r['sprite_frames_kb']:<6.0f}"
+              f"{r['sprite_indexed_kb']:>9.0f}")
+    t = totals
+    print(f"{'合计':<22}{'':>9}{t['gif_kb']:>9.0f} → {t['sprite_kb']:<6.0f}"
+          f"{t['gif_decode_ms']:>9.1f} → {t['sprite_decode_ms']:<6.1f}"
+          f"{t['gif_frames_kb']:>11.0f} → {t['sprite_frames_kb']:<6.0f}{t['sprite_indexed_kb']:>9.0f}")
+    if t["sprite_decode_ms"]:
+        print(f"解码加速 {t['gif_decode_ms'] / t['sprite_decode_ms']:.2f}x，"
+              f"解码后帧内存 {t['sprite_frames_kb'] / max(1e-6, t['gif_frames_kb']) * 100:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIF与精灵格式对比基准")
+    parser.add_argument("--skin", default=os.path.join(REPO_ROOT, "pikaqiu"), help="包含GIF的目录")
+    parser.add_argument("--size", type=int, default=200, help="解码目标尺寸")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    args = parser.parse_args()
+
+    results = run_bench(args.skin, args.size, args.runs)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
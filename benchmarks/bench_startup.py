@@ -0,0 +1,127 @@
+"""冷启动基准：对比延迟导入与旧的全部预先导入，在idle.gif首帧绘制前的耗时和内存
+
+用法:
+    python benchmarks/bench_startup.py            # 每种模式运行5次取中位数
+    python benchmarks/bench_startup.py --runs 10 --json
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+_PROCESS_START = time.perf_counter()
+
+from bench_common import setup_repo_path, run_child, summarize, current_rss_kb
+
+
+def _child(mode):
+    """子进程：启动桌宠直到画布第一次画出精灵"""
+    setup_repo_path()
+
+    eager_errors = {}
+    if mode == "eager":
+        # 模拟原来 common_imports 中的全部预先导入
+        import importlib
+        for name in ("requests", "websocket", "ssl", "PyQt5.QtWebEngineWidgets"):
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                eager_errors[name] = str(e)
+
+    from PyQt5.QtCore import Qt, QCoreApplication, QObject, QEvent, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    app = QApplication(sys.argv[:1])
+
+    import_start = time.perf_counter()
+    from desktop_pet import DesktopPet
+    from pet_canvas import PetCanvas
+    import common_imports
+    import_ms = (time.perf_counter() - import_start) * 1000
+
+    class FirstPaintFilter(QObject):
+        """画布第一次带着精灵帧（或备用圆球）绘制时记录；idle帧在后台解码，之前的绘制是空窗口"""
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and isinstance(obj, PetCanvas) \
+                    and (obj.pixmap() is not None or obj.decorated()):
+                first_paint_ms = (time.perf_counter() - _PROCESS_START) * 1000
+                loaded = [m._module_name for m in common_imports.LAZY_MODULES if m.is_loaded()]
+                print(json.dumps({
+                    "mode": mode,
+                    "import_ms": import_ms,
+                    "first_paint_ms": first_paint_ms,
+                    "rss_kb": current_rss_kb(),
+                    "heavy_modules_loaded": loaded,
+                    "eager_errors": eager_errors,
+                }), flush=True)
+                os._exit(0)
+            return False
+
+    paint_filter = FirstPaintFilter()
+    app.installEventFilter(paint_filter)
+
+    # 启动过程中可能弹出API配置对话框，基准中自动关闭
+    def close_modal():
+        widget = QApplication.activeModalWidget()
+        if widget:
+            widget.close()
+    modal_closer = QTimer()
+    modal_closer.timeout.connect(close_modal)
+    modal_closer.start(20)
+
+    pet = DesktopPet()
+    app.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="桌宠冷启动基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    parser.add_argument("--child", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+        return
+
+    script = os.path.abspath(__file__)
+    results = {}
+    for mode in ("eager", "lazy"):
+        runs = []
+        for _ in range(args.runs):
+            wall_start = time.perf_counter()
+            result = run_child(script, ["--child", mode])
+            result["wall_ms"] = (time.perf_counter() - wall_start) * 1000
+            runs.append(result)
+        results[mode] = {
+            "first_paint_ms": summarize([r["first_paint_ms"] for r in runs]),
+            "wall_ms": summarize([r["wall_ms"] for r in runs]),
+            "import_ms": summarize([r["import_ms"] for r in runs]),
+            "rss_kb": summarize([r["rss_kb"] for r in runs]),
+            "heavy_modules_loaded": runs[-1]["heavy_modules_loaded"],
+            "eager_errors": runs[-1]["eager_errors"],
+        }
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    eager, lazy = results["eager"], results["lazy"]
+    print(f"{'指标':<20}{'预先导入':>12}{'延迟导入':>12}{'节省':>12}")
+    for key, label, unit in (("first_paint_ms", "首帧(进程内)", "ms"),
+                             ("wall_ms", "首帧(含解释器)", "ms"),
+                             ("rss_kb", "首帧时RSS", "KB")):
+        if eager[key] is None or lazy[key] is None:
+            continue
+        print(f"{label:<20}{eager[key]:>10.1f}{unit}{lazy[key]:>10.1f}{unit}"
+              f"{eager[key] - lazy[key]:>10.1f}{unit}")
+    if lazy["heavy_modules_loaded"]:
+        print(f"注意: 延迟模式下首帧前已加载 {lazy['heavy_modules_loaded']}")
+    for name, error in eager["eager_errors"].items():
+        print(f"注意: 预先导入 {name} 失败({error})，该模块未计入对比")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 ﻿import sys
+from PyQt5.QtCore import Qt, QCoreApplication
 from PyQt5.QtWidgets import QApplication
 from desktop_pet import DesktopPet
 import ctypes
@@ -7,6 +8,8 @@ import ctypes
 
 
 if __name__ == "__main__":
+    # 浏览器模块改为延迟导入，需要在创建QApplication前开启共享OpenGL上下文
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     
     # 设置应用程序样式
@@ -1,19 +1,59 @@
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtWebEngineWidgets import *
 
 
 import time
 import os
 import json
 import subprocess
-import requests
-import ssl
-import websocket
 import webbrowser
 import random
 import math
 import threading
 import logging
+import importlib
 from pathlib import Path
+
+
+class LazyModule:
+    """延迟导入的模块代理，第一次访问属性时才真正import"""
+
+    def __init__(self, module_name):
+        self.__dict__["_module_name"] = module_name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._module_name)
+            self.__dict__["_module"] = module
+            logging.debug(f"延迟导入 {self._module_name} 用时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "已加载" if self.is_loaded() else "未加载"
+        return f"<LazyModule {self._module_name} ({state})>"
+
+    def is_loaded(self):
+        """模块是否已经真正导入"""
+        return self.__dict__["_module"] is not None
+
+
+# 重量级模块：只有浏览器 / 聊天路径才会用到，启动时不导入
+requests = LazyModule("requests")
+websocket = LazyModule("websocket")
+ssl = LazyModule("ssl")
+QtWebEngineWidgets = LazyModule("PyQt5.QtWebEngineWidgets")
+
+LAZY_MODULES = (requests, websocket, ssl, QtWebEngineWidgets)
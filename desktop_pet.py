@@ -19,8 +19,18 @@ from pet_clipboard import PetClipboard
 from pet_time_display import PetTimeDisplay
 from english_page import PetWebBrowser
 from app_open import AppLauncher
+from pet_startup import StartupScheduler
+from pet_frame_clock import FrameClock, ClockTimer
+from pet_power import PowerMonitor
+from pet_drag import DragController
+from pet_skins import SkinPack, discover_skins
+from pet_behavior import BehaviorScheduler, BehaviorPriority
+from pet_screens import ScreenIndex
+from pet_canvas import PetCanvas
+from pet_chat import ChatPipeline
+from pet_response_cache import ResponseCache
 from typing import Optional
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from common_imports import *
 
 from enum import Enum, auto
@@ -37,81 +47,149 @@ class RestReminderState(Enum):
 class DesktopPet(QWidget):
     def __init__(self):
         super().__init__()
+        # 分阶段启动：首帧之前只做和显示有关的初始化
+        self.startup = StartupScheduler(self)
+
         # 初始化变量
         self.pet1 = []  # 存储GIF动画路径
         self.condition = 0  # 宠物状态
         self.rest_open = 1 # 休息提醒状态
         self.state = PetState.IDLE
-        self.state = PetState.IDLE
         self.rest_reminder = RestReminderState.ENABLED
-        self.is_rest_reminder_actove = False
+        self.is_rest_reminder_active = False
+        self._mask_key = None  # 当前窗口形状对应的 (动画变体, 偏移)
         
         
         self.is_active = True
+
+        # 皮肤包：动画、帧时长、可点击区域和缩放都来自包里的清单（托盘图标也用它）
+        self.skin = self._load_skin()
+        self.animation_bindings = self.skin.bindings()
         self.init_system_tray()
 
         self.saved_states = {}
-    
-        # 添加动画绑定字典 (MOVED THIS BEFORE PetAnimations INIT)
-        self.animation_bindings = {
-            "idle": resource_path(os.path.join("pikaqiu", "idle.gif")),
-            "phonewalkright": resource_path(os.path.join("pikaqiu", "phonewalkright.gif")),
-            "phonewalkleft": resource_path(os.path.join("pikaqiu", "phonewalkleft.gif")),
-            "walkleft": resource_path(os.path.join("pikaqiu", "walkleft.gif")),
-            "walkright": resource_path(os.path.join("pikaqiu", "walkright.gif")),
-            "jump": resource_path(os.path.join("pikaqiu", "jump.gif")),
-            "touch": resource_path(os.path.join("pikaqiu", "touch.gif")),
-            "shake": resource_path(os.path.join("pikaqiu", "shake.gif"))
-        }
         self.current_animation = "idle"
+
+        # 添加动画控制标志
+        self.animations_enabled = True  # 默认开启动画
+
+        # 桌宠大小（逻辑像素），用户可在菜单里调整
+        self.pet_size = self._load_pet_size()
+        # 紧凑帧存储：帧以调色板索引常驻，绘制时才展开，内存占用约为原来的1/4
+        self.compact_frames = QSettings("YourCompany", "DesktopPet").value("compact_frames", False, type=bool)
+
+        # 全局帧时钟：帧切换、补间和各种定时器共用一个唤醒源
+        self.clock = FrameClock(self)
+
+        # 多显示器几何缓存，显示器变化时自动更新
+        self.screens = ScreenIndex(self)
     
-        # 初始化动画系统 
+        # 初始化动画系统（首帧只加载idle）
         self.animations = PetAnimations(self)
+
+        # 行为调度：拖动、思考、提醒和闲逛动画按优先级互相打断
+        self.behavior = BehaviorScheduler(self.clock, on_interrupt=self.animations._stop_current_animations)
+        self._init_behaviors()
+
+        # 省电：被遮挡/全屏/锁屏时冻结，电池/空闲时降帧
+        self.power = PowerMonitor(self, self.clock)
+        self.drag = DragController(self, self.clock)
+        self.is_dragging = False
+
+        # 聊天请求在后台线程执行，等待回复时桌宠照常活动；Esc取消
+        # 问过的问题直接用缓存的回复（cache/responses.db，第一次聊天时才打开）
+        self.response_cache = ResponseCache()
+        self.response_cache.enabled = QSettings("YourCompany", "DesktopPet").value("response_cache", True, type=bool)
+        self.chat = ChatPipeline(self.clock, self, cache=self.response_cache)
+        self.chat.response_ready.connect(self._on_chat_response)
+        self.chat.request_failed.connect(self._on_chat_failed)
+        self.chat.request_timeout.connect(self._on_chat_timeout)
+        self.chat.request_cancelled.connect(self._on_chat_cancelled)
+        self.chat.stream_started.connect(self._on_chat_stream_started)
+        self.chat.text_appended.connect(self._on_chat_text)
+        self.chat.stream_finished.connect(self._on_chat_stream_finished)
+        self._chat_waiting = False
+        self.cancel_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        self.cancel_shortcut.activated.connect(self.cancel_chat)
     
         # 先初始化UI
         self.init_ui()
     
         # 然后初始化时间显示
         self.time_display = PetTimeDisplay(self)
-
-        # 添加动画控制标志
-        self.animations_enabled = True  # 默认开启动画
     
-        # 初始化功能模块
+        # 功能模块在启动阶段中初始化
         self.api_selector = APISelector(self)
         self.api_handler = None
-        self.setup_api_handler()
-        self.notes = PetNotes(self)
-        self.clipboard = PetClipboard(self)
+        self.notes = None
+        self.clipboard = None
         self.web_browser = None  # 延迟初始化浏览器 
-        self.app_launcher = AppLauncher(self)
+        self.app_launcher = None
 
-        self.screen_geometry = QApplication.desktop().availableGeometry()
-        self.setMaximumSize(self.screen_geometry.width(), self.screen_geometry.height())
 
         # 动画定时器
-        self.animation_timer = QTimer(self)
+        self.animation_timer = ClockTimer(self.clock, self)
         self.animation_timer.timeout.connect(self.random_animation)
         random_interval = random.randint(5000, 15000)
         print(f"随机动画时间：{random_interval}")
         self.animation_timer.start(random_interval)
-        self.animations = PetAnimations(self) 
-
-        # 动画保活定时器（每10秒检查一次）
-        self.animation_keeper = QTimer(self)
-        self.animation_keeper.timeout.connect(self._check_animation_alive)
-        self.animation_keeper.start(10000)
     
         # 添加问候定时器初始化
-        self.greeting_timer = QTimer(self)
+        self.greeting_timer = ClockTimer(self.clock, self)
         self.greeting_timer.timeout.connect(self.show_greeting)
         random_greeting = random.randint(500, 1000)+random_interval
         print(f"随机问候语时间：{random_greeting}")
         self.greeting_timer.start(random_greeting)  # 可以注释这行来默认关闭
     
         self._enable_rest_reminder()
+        self._init_startup_stages()
         self.show()
-        
+        # 移到缩放比例不同的显示器时切换精灵变体
+        self.windowHandle().screenChanged.connect(self._on_screen_changed)
+        self.screens.changed.connect(self._on_screen_changed)
+        self.power.start()
+        # 正常情况下画布画出首帧后开始后台阶段，一直没画出来时兜底启动
+        self.clock.schedule(1000, self.startup.start)
+
+    def _init_startup_stages(self):
+        """注册首帧之后在空闲时初始化的子系统（数字越小越先执行）"""
+        self.startup.add_stage("animations", self.animations._preload_animations, 0)
+        self.startup.add_stage("greetings", self.animations._load_dialog_file, 1)
+        self.startup.add_stage("clipboard", self._init_clipboard, 2)
+        self.startup.add_stage("notes", self._init_notes, 3)
+        self.startup.add_stage("app_launcher", self._init_app_launcher, 4)
+        # API处理器可能弹出配置对话框，放在最后
+        self.startup.add_stage("api_handler", self.setup_api_handler, 5)
+
+    def _init_behaviors(self):
+        """注册行为：weight>0的参与随机闲逛，cooldown单位毫秒"""
+        b = self.behavior
+        b.register("walk", self.animations.random_walk, weight=4, cooldown=3000,
+                   animations=("walkleft", "walkright"))
+        b.register("phonewalk", self.animations.random_phonewalk, weight=3, cooldown=3000,
+                   animations=("phonewalkleft", "phonewalkright"))
+        b.register("jump", self.animations.jump_animation, weight=2, cooldown=6000, animations=("jump",))
+        b.register("hop", self.animations.hop_walk, weight=1, cooldown=12000,
+                   animations=("walkleft", "walkright", "jump"))
+        b.register("bounce", self.animations.start_bounce_animation, BehaviorPriority.REACTION,
+                   cooldown=1000, queueable=True)
+        b.register("shake", partial(self.play_animation, "shake"), BehaviorPriority.REACTION, duration=1500,
+                   animations=("shake",))
+        b.register("rest_reminder", partial(self.play_animation, "shake"), BehaviorPriority.REMINDER, hold=True,
+                   animations=("shake",))
+        b.register("thinking", self.show_thinking_animation, BehaviorPriority.THINKING, hold=True,
+                   active=lambda: self.chat.busy())
+        b.register("drag", self._begin_drag, BehaviorPriority.DRAG, hold=True,
+                   active=lambda: bool(QApplication.mouseButtons() & Qt.LeftButton))
+
+    def _init_clipboard(self):
+        self.clipboard = PetClipboard(self)
+
+    def _init_notes(self):
+        self.notes = PetNotes(self)
+
+    def _init_app_launcher(self):
+        self.app_launcher = AppLauncher(self)
 
     def init_ui(self):
         # 设置窗口属性
@@ -120,24 +198,15 @@ class DesktopPet(QWidget):
         self.setAutoFillBackground(False)
     
         # 设置宠物图像 - 使用GIF动画或粉色圆球
-        gif_path = resource_path(os.path.join("pikaqiu", "idle.gif"))
+        gif_path = self.skin.file_path("idle")
     
-        self.pet_image = QLabel(self)
+        # 画布直接绘制缓存帧，换帧时只重绘精灵区域
+        self.pet_image = PetCanvas(self, QSize(self.pet_size, self.pet_size))
+        # 画布第一次画出精灵后才开始后台阶段，首帧用时按这个时刻计算
+        self.pet_image.first_frame_painted.connect(self.startup.start)
     
-        # 检查GIF文件是否存在
-        if os.path.exists(gif_path):
-            print(f"GIF路径: {gif_path}")
-            self.movie = QMovie(gif_path)
-            self.movie.setCacheMode(QMovie.CacheAll)
-        
-            if self.movie.isValid():
-                self.movie.setScaledSize(QSize(200, 200))
-                self.pet_image.setMovie(self.movie)
-                self.movie.start()
-            else:
-                print("错误: 无效的GIF文件")
-                self._setup_fallback_circle()
-        else:
+        # idle动画由动画系统在后台解码，解码失败时动画系统会切换到备用圆球
+        if not gif_path:
             print(f"GIF文件未找到: {gif_path}")
             self._setup_fallback_circle()
     
@@ -151,27 +220,109 @@ class DesktopPet(QWidget):
         # 设置初始动画
         self.play_animation("idle")
     
-        # 其余初始化代码保持不变...
-        # "休息一下"时间显示
-        self.show_time_rest = QLabel(self)
-        self.show_time_rest.setStyleSheet("font:15pt '楷体';border-width: 1px;color:blue;")
-    
-        # 初始化输入框组件
+        # 初始化输入框组件（独立的聊天窗口，跟随桌宠移动）
         self.pet_input = PetInput(self)
         self.pet_input.input_box.returnPressed.connect(self.handle_input)
+
+        # "休息一下"时间显示，放在聊天窗口顶部
+        self.show_time_rest = QLabel(self.pet_input.window)
+        self.show_time_rest.setStyleSheet("font:15pt '楷体';border-width: 1px;color:blue;")
+        self.show_time_rest.hide()
+        self.pet_input.layout.insertWidget(0, self.show_time_rest)
     
-        # 布局设置
-        layout = QVBoxLayout()
+        # 桌宠窗口只包含画布，大小随画布变化
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.pet_image)
-        layout.addWidget(self.show_time_rest)
-        layout.addLayout(self.pet_input.setup_layout())
-        self.setLayout(layout)
-    
-        # 设置窗口初始大小
-        self.resize(300, 300)
+        layout.setSizeConstraint(QLayout.SetFixedSize)
         self.randomPosition()
 
 
+    PET_SIZES = [("小", 120), ("中", 200), ("大", 280), ("特大", 360)]
+
+    def _load_pet_size(self):
+        settings = QSettings("YourCompany", "DesktopPet")
+        size = settings.value("pet_size", 200, type=int)
+        return min(max(size, 64), 512)
+
+    BUILTIN_SKIN = "pikaqiu"
+
+    def _available_skins(self):
+        return discover_skins(resource_path(self.BUILTIN_SKIN), resource_path("skins"))
+
+    def _load_skin(self):
+        """加载上次选择的皮肤，失败时用内置皮肤"""
+        saved = QSettings("YourCompany", "DesktopPet").value("skin", "", type=str)
+        if saved and os.path.exists(saved):
+            try:
+                return SkinPack(saved)
+            except ValueError as e:
+                print(f"[皮肤] {e}，改用内置皮肤")
+        return SkinPack(resource_path(self.BUILTIN_SKIN))
+
+    def set_skin(self, path):
+        """运行时切换皮肤并保存，不需要重启"""
+        if os.path.abspath(path) == self.skin.path:
+            return
+        try:
+            skin = SkinPack(path)
+        except ValueError as e:
+            QMessageBox.warning(self, "皮肤", f"无法加载皮肤:\n{e}")
+            return
+        self.skin = skin
+        self.animation_bindings = skin.bindings()
+        self.pet1 = list(self.animation_bindings.values())
+        self.animations.set_skin(skin)
+        self.pet_image.set_fallback(False)
+        self._update_window_mask()
+        self._apply_tray_icon()
+        QSettings("YourCompany", "DesktopPet").setValue("skin", skin.path)
+        print(f"[皮肤] 切换到 {skin.name}，常驻帧 {self.animations.atlas.resident_bytes() / 1024 / 1024:.1f}MB")
+
+    def set_pet_size(self, size):
+        """调整桌宠大小并保存"""
+        if size == self.pet_size:
+            return
+        self.pet_size = size
+        QSettings("YourCompany", "DesktopPet").setValue("pet_size", size)
+        center = self.geometry().center()
+        self.pet_image.setFixedSize(size, size)
+        self.animations.set_sprite_variant(QSize(size, size), self.devicePixelRatioF())
+        # 以原来的中心为准调整位置，并保证仍在屏幕内
+        self.adjustSize()
+        pos = QPoint(center.x() - size // 2, center.y() - size // 2)
+        self.move(self.screens.clamp(pos, QSize(size, size)))
+
+    def set_compact_frames(self, enabled):
+        """开关紧凑帧存储并保存"""
+        self.compact_frames = bool(enabled)
+        QSettings("YourCompany", "DesktopPet").setValue("compact_frames", self.compact_frames)
+        self.animations.set_compact_frames(self.compact_frames)
+
+    def set_response_cache(self, enabled):
+        """开关回复缓存并保存"""
+        self.response_cache.enabled = bool(enabled)
+        QSettings("YourCompany", "DesktopPet").setValue("response_cache", self.response_cache.enabled)
+
+    def show_response_cache_stats(self):
+        stats = self.response_cache.stats()
+        QMessageBox.information(self, "回复缓存", (
+            f"缓存条目: {stats['entries']}\n"
+            f"本次运行: 命中 {stats['hits']} 次（精确 {stats['exact_hits']}），命中率 {stats['hit_rate']:.0%}，"
+            f"节省 {stats['saved_ms'] / 1000:.1f} 秒 / {stats['saved_tokens']} tokens\n"
+            f"累计: 命中 {stats['total_hits']} 次，命中率 {stats['total_hit_rate']:.0%}，"
+            f"节省 {stats['total_saved_ms'] / 1000:.1f} 秒 / {stats['total_saved_tokens']} tokens"
+        ))
+
+    def clear_response_cache(self):
+        self.response_cache.clear()
+        QToolTip.showText(self._calculate_bubble_position(), "回复缓存已清空", self,
+                          QRect(0, 0, self.width(), self.height()), 1500)
+
+    def _on_screen_changed(self, *_args):
+        """所在显示器或其缩放比例变化"""
+        self.animations.set_sprite_variant(QSize(self.pet_size, self.pet_size), self.devicePixelRatioF())
+
     def save_settings(self):
         """保存设置到配置文件"""
         settings = QSettings("YourCompany", "DesktopPet")
@@ -187,36 +338,40 @@ class DesktopPet(QWidget):
 
     def _setup_fallback_circle(self):
         """设置粉色圆球作为备用显示"""
-        self.pet_image.setStyleSheet("""
-            background-color: pink;
-            border-radius: 100px;
-            border: 2px solid white;
-            min-width: 200px;
-            min-height: 200px;
-            max-width: 200px;
-            max-height: 200px;
-        """)
+        self.pet_image.set_fallback(True)
+        self._update_window_mask()
         # 禁用动画功能
         self.animations_enabled = False
         if hasattr(self, 'animation_timer'):
             self.animation_timer.stop()
 
 
+    def _update_window_mask(self):
+        """窗口形状取当前动画所有帧不透明区域的并集，透明处的点击直接穿透到下面的窗口"""
+        frames = self.animations.current_frames
+        canvas = self.pet_image
+        if frames is None or frames.region is None or canvas.decorated():
+            if self._mask_key is not None:
+                self._mask_key = None
+                self.clearMask()
+            return
+        offset = canvas.pos() + canvas._target_rect(frames.frames[0]).topLeft()
+        key = (frames.key, offset.x(), offset.y())
+        if key != self._mask_key:
+            self._mask_key = key
+            self.setMask(frames.region.translated(offset))
+
     def play_animation(self, anim_name):
         """委托给动画子系统"""
         self.animations.play(anim_name)
 
     def randomPosition(self):
         """完全随机的初始位置"""
-        screen_geo = QDesktopWidget().screenGeometry()
-        self.move(
-            random.randint(0, screen_geo.width() - self.width()),
-            random.randint(0, screen_geo.height() - self.height())
-        )
+        self.move(self.screens.random_position(self.size(), screen=self.screens.primary()))
 
     def random_animation(self):
         """随机动画触发"""
-        if self.state == PetState.IDLE and self.animations_enabled:
+        if self.state == PetState.IDLE and self.animations_enabled and not self.power.frozen:
             self.animations.random_animation()
 
        
@@ -227,62 +382,88 @@ class DesktopPet(QWidget):
         self.web_browser.show()
         self.web_browser.raise_() 
            
+    def enterEvent(self, event):
+        """鼠标移到桌宠上时立即退出省电模式"""
+        self.power.notify_interaction()
+        super().enterEvent(event)
+
     def mousePressEvent(self, event):
         """重写鼠标点击事件"""
+        self.power.notify_interaction()
+        if not self.animations.hit_test(event.pos()):
+            event.ignore()  # 点在当前帧的透明处
+            return
         if event.button() == Qt.LeftButton:
-            # 通知动画系统处理点击中断
-            if hasattr(self, 'animations'):
-                self.animations.handle_click_interrupt()
+            # 拖动优先级最高，会打断正在进行的动画
+            self.behavior.request("drag")
             
             # 正常处理拖动逻辑
             self.state = PetState.CLICKED
-            self.drag_pos = event.globalPos() - self.frameGeometry().topLeft()
+            self.drag.begin(event.globalPos())
             self.is_dragging = True
             event.accept()
 
     def mouseMoveEvent(self, event):
-        """重写鼠标移动事件"""
+        """重写鼠标移动事件：只记录目标位置，每帧统一移动一次"""
         if event.buttons() == Qt.LeftButton and self.is_dragging:
-            new_pos = event.globalPos() - self.drag_pos
-            self.move(new_pos)
+            self.drag.move(event.globalPos())
             event.accept()
 
     def mouseReleaseEvent(self, event):
         """重写鼠标释放事件"""
         if event.button() == Qt.LeftButton:
-            self.is_dragging = False
-            self.state = PetState.IDLE  # 明确重置状态
-        
-            # 确保动画系统知道拖动结束
-            if hasattr(self, 'animations'):
-                self.animations._is_animating = False
-                self.animations._stop_current_animations()
-            
-                # 延迟一点再触发随机动画，避免冲突
-                QTimer.singleShot(300, self.animations.random_animation)
-            
+            self._end_drag(event.globalPos())
             event.accept()
 
+    def focusOutEvent(self, event):
+        """菜单、弹窗抢走鼠标或焦点时收不到松开事件，在这里结束拖动"""
+        self._end_drag()
+        super().focusOutEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.ActivationChange and not self.isActiveWindow():
+            self._end_drag()
+        super().changeEvent(event)
+
+    def _end_drag(self, global_pos=None):
+        if not self.is_dragging:
+            return
+        self.drag.end(global_pos)
+        self.is_dragging = False
+        self.state = PetState.IDLE  # 明确重置状态
+
+        # 通知行为调度拖动结束
+        self.behavior.finish("drag")
+
+        # 延迟一点再触发随机动画，避免冲突
+        self.clock.schedule(300, self.random_animation)
+
+
+    def _begin_drag(self):
+        """拖动开始：停止移动并回到idle"""
+        self.animations._stop_current_animations()
+        if self.animations.current_anim != "idle":
+            self.play_animation("idle")
 
     def _get_center_position(self):
-        """获取屏幕中心位置"""
-        screen = QApplication.desktop().availableGeometry()
+        """获取当前所在屏幕的中心位置"""
+        screen = self.screens.screen_for_rect(self.frameGeometry()).available
         return QPoint(
-            screen.width()//2 - self.width()//2,
-            screen.height()//2 - self.height()//2
+            screen.center().x() - self.width()//2,
+            screen.center().y() - self.height()//2
         )
 
     def mouseDoubleClickEvent(self, event):
         """重写鼠标点击事件"""
+        self.power.notify_interaction()
+        if not self.animations.hit_test(event.pos()):
+            event.ignore()
+            return
         if event.pos().y() < self.pet_image.height():
             if self.animations_enabled:  # 如果动画是开启状态，则暂停
-                # 停止所有动画
+                # 停止随机动画，播放抖动动画（会打断正在进行的动画）
                 self.animation_timer.stop()
-                if hasattr(self, 'animations'):
-                    self.animations._stop_current_animations()
-            
-                # 播放抖动动画
-                self.play_animation("shake")
+                self.behavior.request("shake")
             
                 # 显示输入框
                 self.pet_input.toggle_input()
@@ -305,11 +486,24 @@ class DesktopPet(QWidget):
     def handle_input(self):
         """处理输入框的回车事件"""
         text = self.pet_input.input_box.text()
+        self.power.notify_interaction()
         if text:
             self.pet_input.add_user_input(text)  # 添加到对话历史
             self._process_chat(text)
             self.pet_input.input_box.clear()  #处理输入框的回车事件
 
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        if not self.drag.active:  # 拖动时由DragController在移动桌宠的同一帧里移动
+            self._move_attached_windows()
+
+    def _move_attached_windows(self):
+        """聊天窗口和时间框跟随桌宠，拖动时与桌宠在同一帧内移动"""
+        if hasattr(self, 'pet_input'):
+            self.pet_input.update_position()
+        if hasattr(self, 'time_display') and self.time_display.enabled:
+            self.time_display.update_label_position(raise_top=False)
+
     #处理窗口大小改变时的事件
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -346,6 +540,13 @@ class DesktopPet(QWidget):
             self.start_countdown(minutes)
     
     def contextMenuEvent(self, event):
+        if not self.animations.hit_test(event.pos()):
+            event.ignore()
+            return
+        self.power.notify_interaction()
+        self._end_drag()  # 菜单会抢走鼠标
+        # 启动阶段还没跑完时，用到的子系统立即初始化
+        self.startup.require("app_launcher", "notes", "clipboard")
         menu = QMenu(self)
         
         # 添加原有菜单项
@@ -357,6 +558,16 @@ class DesktopPet(QWidget):
         set_api_action.triggered.connect(self.check_api_key)
         select_api_action.triggered.connect(self.select_api_provider)
 
+        cache_menu = menu.addMenu("回复缓存")
+        cache_action = cache_menu.addAction("启用")
+        cache_action.setCheckable(True)
+        cache_action.setChecked(self.response_cache.enabled)
+        cache_action.triggered.connect(self.set_response_cache)
+        cache_stats_action = cache_menu.addAction("统计...")
+        cache_stats_action.triggered.connect(self.show_response_cache_stats)
+        cache_clear_action = cache_menu.addAction("清空")
+        cache_clear_action.triggered.connect(self.clear_response_cache)
+
         notes_action = menu.addAction("笔记")
         notes_action.triggered.connect(
             lambda: self.notes.show_notes_menu(event)  # 传递事件对象
@@ -388,6 +599,26 @@ class DesktopPet(QWidget):
         browser_action = menu.addAction("浏览器")
         browser_action.triggered.connect(self.open_web_browser)
 
+        # 切换皮肤
+        skin_menu = menu.addMenu("切换皮肤")
+        for skin in self._available_skins():
+            action = skin_menu.addAction(skin.name)
+            action.setCheckable(True)
+            action.setChecked(skin.path == self.skin.path)
+            action.triggered.connect(lambda checked, p=skin.path: self.set_skin(p))
+
+        # 桌宠大小
+        size_menu = menu.addMenu("桌宠大小")
+        for label, size in self.PET_SIZES:
+            action = size_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(size == self.pet_size)
+            action.triggered.connect(lambda checked, s=size: self.set_pet_size(s))
+        compact_action = size_menu.addAction("省内存模式")
+        compact_action.setCheckable(True)
+        compact_action.setChecked(self.compact_frames)
+        compact_action.triggered.connect(self.set_compact_frames)
+
         # 添加GIF动画控制菜单
         animation_action = QAction("开关动画效果", menu)
         animation_action.setCheckable(True)
@@ -426,8 +657,8 @@ class DesktopPet(QWidget):
     def _enable_rest_reminder(self):
         self.rest_reminder = RestReminderState.ENABLED
         if not hasattr(self, 'timer_rest'):
-            self.timer_rest = QTimer(self)
-        self.timer_rest.timeout.connect(self.relax)
+            self.timer_rest = ClockTimer(self.clock, self)
+            self.timer_rest.timeout.connect(self.relax)
         self.timer_rest.start(1800000)  # 30分钟
 
     def relax(self):
@@ -447,8 +678,8 @@ class DesktopPet(QWidget):
         msg_box.setIcon(QMessageBox.NoIcon)
     
         # 添加图片
-        rest_image_path = resource_path(os.path.join("pikaqiu", "relax.png"))
-        if os.path.exists(rest_image_path):
+        rest_image_path = self.skin.resource("rest_image")
+        if rest_image_path:
             pixmap = QPixmap(rest_image_path)
             pixmap = pixmap.scaled(1000,1000, Qt.KeepAspectRatio)
             msg_box.setIconPixmap(pixmap)
@@ -457,12 +688,13 @@ class DesktopPet(QWidget):
         msg_box.setWindowFlags(msg_box.windowFlags() | Qt.WindowStaysOnTopHint)
     
         # 播放提醒动画
-        self.play_animation("shake")
+        self.behavior.request("rest_reminder")
     
         # 显示弹窗并等待用户响应
         msg_box.exec_()
     
         # 用户点击OK后
+        self.behavior.finish("rest_reminder")
         self.is_rest_reminder_active = False
         self.timer_rest.start(1800000)  # 重新启动30分钟定时器
 
@@ -473,6 +705,7 @@ class DesktopPet(QWidget):
 
     def check_api_key(self):
         """通用的API配置对话框，根据类型标识自动适配"""
+        self.startup.require("api_handler")
         if not self.api_handler:
             QMessageBox.warning(self, "错误", "API处理器未初始化")
             return
@@ -550,6 +783,7 @@ class DesktopPet(QWidget):
 
     def setup_api_handler(self, handler_type="api_handler"):
         """根据类型设置API处理器"""
+        previous = self.api_handler
         try:
             if handler_type == "api_handler":
                 from api_handler import APIHandler
@@ -557,22 +791,30 @@ class DesktopPet(QWidget):
             elif handler_type == "api_handler2":
                 from api_handler2 import APIHandler
                 self.api_handler = APIHandler()
-                # 如果配置有效，不自动弹出配置对话框
-                if self.api_handler.validate_config():
-                    self.show_api_tooltip()
-                    return
             else:
                 raise ValueError(f"未知的API处理器类型: {handler_type}")
         
+            self._release_api_handler(previous)
             self.show_api_tooltip()
         
-            # 只有配置无效时才弹出配置对话框
-            if not self.api_handler.validate_config():
+            if self.api_handler.validate_config():
+                self.api_handler.warm_up()  # 提前建立连接，第一条消息不用等握手
+            else:
+                # 只有配置无效时才弹出配置对话框
                 self.check_api_key()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法加载API处理器: {str(e)}")
             self.api_handler = None
 
+    def _release_api_handler(self, handler):
+        """换掉旧的处理器：取消它进行中的请求并关闭连接"""
+        if handler is None or handler is self.api_handler:
+            return
+        self.chat.cancel()
+        close = getattr(handler, "close", None)
+        if close is not None:
+            close()
+
     def select_api_provider(self):
         """选择API供应商"""
         selected_handler = self.api_selector.show_selection_dialog()
@@ -602,44 +844,68 @@ class DesktopPet(QWidget):
         self._process_chat(user_input)  # 调用处理聊天的方法
 
     def _process_chat(self, user_input):
-        """使用线程池处理聊天请求"""
-        try:
-            print(f"[DEBUG] 开始处理输入: {user_input}")
-            self.set_thinking_state(True)
-    
-            # 对话时暂停动画
-            was_animation_enabled = getattr(self, 'animations_enabled', False)  # 安全获取属性
-            if was_animation_enabled:
-                self.toggle_animations(False)
-
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self.api_handler.get_response, user_input)
-                try:
-                    response = future.result(timeout=15)
-                    print(f"[DEBUG] 获取到响应: {response}")
-                    if response:
-                        self.show_response(response)
-                    else:
-                        print("[ERROR] 空响应")
-                        self.show_error("未能获取响应")
-                except TimeoutError:
-                    print("[ERROR] 请求超时")
-                    self.show_error("请求超时，请重试")
-                except Exception as e:
-                    print(f"[ERROR] 请求异常: {str(e)}")
-                    self.show_error(str(e))
-        except Exception as e:
-            print(f"[ERROR] 处理聊天异常: {str(e)}")
-        finally:
+        """把聊天请求交给后台线程，结果通过信号回到界面，等待期间动画照常播放"""
+        self.startup.require("api_handler")
+        if not self.api_handler:
+            QMessageBox.warning(self, "错误", "API处理器未初始化")
+            return
+
+        print(f"[DEBUG] 开始处理输入: {user_input}")
+        # 上一条还没回复时会先被取消
+        self.chat.submit(self.api_handler, user_input)
+        self._chat_waiting = True
+        self.set_thinking_state(True)
+
+    def cancel_chat(self):
+        """取消正在等待的聊天请求（Esc）"""
+        self.chat.cancel()
+
+    def _end_chat_wait(self):
+        """结束思考状态；流式回复开始显示时已经结束过一次，不重复恢复"""
+        if self._chat_waiting:
+            self._chat_waiting = False
             self.set_thinking_state(False)
-            # 恢复动画状态
-            if was_animation_enabled:  # 现在这个变量总是有值
-                self.toggle_animations(True)
+
+    def _on_chat_response(self, request_id, response):
+        print(f"[DEBUG] 获取到响应: {response}")
+        self._end_chat_wait()
+        self.show_response(response)
+
+    def _on_chat_stream_started(self, request_id):
+        self._end_chat_wait()
+        self.pet_input.begin_stream()
+
+    def _on_chat_text(self, request_id, text):
+        self.pet_input.append_response(text)
+
+    def _on_chat_stream_finished(self, request_id, response):
+        print(f"[DEBUG] 流式响应结束: {len(response)}字")
+        self.pet_input.finish_stream(response)
+        self.start_bounce_animation()
+
+    def _on_chat_failed(self, request_id, message):
+        print(f"[ERROR] 请求异常: {message}")
+        self._end_chat_wait()
+        self.show_error(message)
+
+    def _on_chat_timeout(self, request_id):
+        print("[ERROR] 请求超时")
+        self._end_chat_wait()
+        self.show_error("请求超时，请重试")
+
+    def _on_chat_cancelled(self, request_id):
+        self._end_chat_wait()
+        QToolTip.showText(self._calculate_bubble_position(), "已取消", self,
+                          QRect(0, 0, self.width(), self.height()), 1500)
+
+    def show_error(self, message):
+        """在回复框里显示错误，不弹窗也不打断动画"""
+        self.pet_input.show_error(message)
 
     def start_bounce_animation(self):
         """委托给动画子系统执行弹跳动画"""
         if hasattr(self, 'animations') and self.animations_enabled:
-            self.animations.start_bounce_animation()
+            self.behavior.request("bounce")
 
     def toggle_animations(self, checked):
         """切换动画效果"""
@@ -659,6 +925,7 @@ class DesktopPet(QWidget):
         else:
             self.animation_timer.stop()
             if hasattr(self, 'animations'):
+                self.behavior.clear()
                 self.animations._stop_current_animations()
             QToolTip.showText(
                 self.mapToGlobal(QPoint(self.width()//2, 0)),
@@ -671,9 +938,12 @@ class DesktopPet(QWidget):
     def set_thinking_state(self, is_thinking):
         """统一设置思考状态"""
         if is_thinking:
-            self.show_thinking_animation()
+            # 思考期间占住行为调度，闲逛动画不会打断；被拖动挡住时也照样显示提示
+            if not self.behavior.request("thinking"):
+                self.show_thinking_animation()
             QApplication.setOverrideCursor(Qt.WaitCursor)
         else:
+            self.behavior.finish("thinking")
             self.show_normal_animation()
             QApplication.restoreOverrideCursor()  #统一设置思考状态
         
@@ -685,6 +955,8 @@ class DesktopPet(QWidget):
 
     def show_greeting(self):
         """显示问候语，气泡固定在桌宠上方"""
+        if self.power.frozen:
+            return  # 全屏/锁屏时不打扰
         greeting = self.animations.get_random_greeting()  
         bubble_pos = self._calculate_bubble_position()
     
@@ -722,7 +994,7 @@ class DesktopPet(QWidget):
     def start_greeting_timer(self, interval=10000):
         """启动随机语句定时器"""
         if not hasattr(self, 'greeting_timer') or not self.greeting_timer:
-            self.greeting_timer = QTimer(self)
+            self.greeting_timer = ClockTimer(self.clock, self)
             self.greeting_timer.timeout.connect(self.show_greeting)
         self.greeting_timer.start(interval)
 
@@ -736,11 +1008,8 @@ class DesktopPet(QWidget):
         bubble_pos = self._calculate_bubble_position()
     
         # 改变外观表示正在思考
-        self.pet_image.setStyleSheet("""
-            background-color: lightblue; 
-            border-radius: 50px;
-            border: 10px solid white;
-        """)
+        self.pet_image.set_thinking(True)
+        self._update_window_mask()
     
         QToolTip.showText(
             bubble_pos,
@@ -756,7 +1025,7 @@ class DesktopPet(QWidget):
         bubble_pos = self.mapToGlobal(QPoint(self.width() // 2, -10))
     
         # 确保气泡不会超出屏幕顶部
-        screen_top = QApplication.desktop().availableGeometry().top()
+        screen_top = self.screens.nearest(bubble_pos).top
         if bubble_pos.y() < screen_top + 10:  # 保留10px边距
             bubble_pos.setY(screen_top + 10)
     
@@ -765,84 +1034,22 @@ class DesktopPet(QWidget):
     def _ensure_in_screen(self, pos):
         """确保位置在屏幕范围内"""
         margin = 20  # 与 pet_animations.py 中保持一致
-        x = max(margin, min(pos.x(), self.screen_geometry.width() - self.width() - margin))
-        y = max(margin, min(pos.y(), self.screen_geometry.height() - self.height() - margin))
-        return QPoint(x, y)
-
-    def _stop_current_animations(self):
-        """停止当前所有动画"""
-        for anim in self._current_animations:
-            anim.stop()
-            anim.deleteLater()
-        self._current_animations.clear()
-        self._is_animating = False
-        # 停止当前电影
-        if hasattr(self, 'current_movie') and self.current_movie:
-            self.current_movie.stop()
-        # 强制设置为idle状态
-        self.play("idle")
+        return self.screens.clamp(pos, self.size(), margin)
 
     def show_normal_animation(self):
         if hasattr(self, 'pet_image'):
-            if self.pet_image.pixmap() and not self.pet_image.pixmap().isNull():
-                self.pet_image.setStyleSheet("")
-            else:
-                self.pet_image.setStyleSheet("")
-
-    def _smooth_return(self, target_pos):
-        """添加视觉提示的返回动画"""
-        # 创建提示气泡
-        bubble = QLabel(self.pet)
-        bubble.setText("带我回来啦~")
-        bubble.setStyleSheet("""
-            background-color: rgba(255,255,255,150);
-            border-radius: 10px;
-            padding: 5px;
-            color: black;
-        """)
-        bubble.move(10, -30)
-        bubble.show()
-    
-        # 动画完成后移除气泡
-        QTimer.singleShot(1500, bubble.deleteLater)
-
-    def _check_animation_alive(self):
-        """确保动画系统持续运行"""
-        if not self.pet_image.movie() or self.pet_image.movie().state() != QMovie.Running:
-            print("动画中断，正在恢复...")
-            self.animations.play(self.animations.current_anim if hasattr(self.animations, 'current_anim') else "idle")
-
-    def _smooth_return(self, target_pos):
-        """平滑回到可视区域"""
-        self._is_animating = True
-    
-        # 淡出+移动+淡入动画组合
-        group = QParallelAnimationGroup()
-    
-        # 移动动画
-        move_anim = QPropertyAnimation(self, b"pos")
-        move_anim.setDuration(1000)
-        move_anim.setEasingCurve(QEasingCurve.InOutQuad)
-        move_anim.setStartValue(self.pos())
-        move_anim.setEndValue(target_pos)
-    
-        # 透明度动画（闪烁效果）
-        opacity_anim = QPropertyAnimation(self, b"windowOpacity")
-        opacity_anim.setDuration(1000)
-        opacity_anim.setKeyValues([(0.0, 0.7), (0.5, 0.3), (1.0, 1.0)])
-    
-        group.addAnimation(move_anim)
-        group.addAnimation(opacity_anim)
-        group.finished.connect(lambda: self.play_animation("idle"))
-        group.start()
+            self.pet_image.set_thinking(False)
+            self._update_window_mask()
 
     def reset_animation_system(self):
         """完全重置动画系统"""
+        self.behavior.clear()
         self.animations._is_animating = False
         self.animations._stop_current_animations()
-        self.pet_image.setMovie(None)
+        self.pet_image.clear()
         # 重新初始化
-        self.animations._preload_animations()
+        self.animations.atlas.clear()
+        self.animations._preload_animations(self.skin.preload)
         self.animations.play("idle")
 
 
@@ -881,15 +1088,12 @@ class DesktopPet(QWidget):
         if hasattr(self, 'time_display'):
             self.time_display.set_visible(self.saved_states.get('time_display', False))
 
-    def init_system_tray(self):
-        """初始化系统托盘图标"""
-        self.tray_icon = QSystemTrayIcon(self)
-    
-        # 设置托盘图标
-        icon_path = resource_path(os.path.join("pikaqiu", "tray_icon.png"))
+    def _apply_tray_icon(self):
+        """托盘图标取当前皮肤的tray_icon，没有或无效时用系统图标"""
+        icon_path = self.skin.resource("tray_icon")
     
         # 确保图标文件存在且有效
-        if os.path.exists(icon_path):
+        if icon_path:
             try:
                 tray_icon = QIcon(icon_path)
                 if not tray_icon.isNull():  # 检查图标是否有效
@@ -900,8 +1104,15 @@ class DesktopPet(QWidget):
                 print(f"加载自定义托盘图标失败: {e}")
                 self.tray_icon.setIcon(QApplication.style().standardIcon(QStyle.SP_ComputerIcon))
         else:
-            print(f"托盘图标文件未找到: {icon_path}")
+            print(f"皮肤 {self.skin.name} 没有托盘图标")
             self.tray_icon.setIcon(QApplication.style().standardIcon(QStyle.SP_ComputerIcon))
+
+    def init_system_tray(self):
+        """初始化系统托盘图标"""
+        self.tray_icon = QSystemTrayIcon(self)
+    
+        # 设置托盘图标
+        self._apply_tray_icon()
     
         # 创建托盘菜单
         tray_menu = QMenu()
@@ -960,12 +1171,12 @@ class DesktopPet(QWidget):
         self.is_active = active
     
         # 1. 控制动画系统
-        if hasattr(self, 'movie') and self.movie:
+        if hasattr(self, 'animations'):
             if active:
-                self.movie.start()  # 恢复GIF播放
+                self.animations.resume()  # 恢复GIF播放
                 self.animation_timer.start(5000)  # 5秒随机动画
             else:
-                self.movie.setPaused(True)  # 暂停GIF（保留当前帧）
+                self.animations.pause()  # 暂停GIF（保留当前帧）
                 self.animation_timer.stop()
     
         # 2. 控制休息提醒
@@ -984,6 +1195,8 @@ class DesktopPet(QWidget):
     
         # 4. 强制隐藏所有弹出内容
         QToolTip.hideText()
+        if not active and hasattr(self, 'pet_input'):
+            self.pet_input.hide_input()
         if hasattr(self, 'time_display'):
             self.time_display.set_visible(active)
 
@@ -1007,6 +1220,10 @@ class DesktopPet(QWidget):
     def cleanup_and_quit(self):
         """彻底退出时的清理"""
         self.set_pet_active(False)
+        close = getattr(self.api_handler, "close", None)
+        if close is not None:
+            close()
+        self.response_cache.close()
         if hasattr(self, 'tray_icon'):
             self.tray_icon.hide()
         QApplication.quit()
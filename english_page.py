@@ -49,7 +49,7 @@ class PetWebBrowser(QWidget):
         nav_layout.addWidget(self.set_default_btn)
         
         # 网页视图
-        self.web_view = QWebEngineView()
+        self.web_view = QtWebEngineWidgets.QWebEngineView()
         
         layout.addLayout(nav_layout)
         layout.addWidget(self.web_view)
@@ -1,29 +1,57 @@
 ﻿from random import Random
 from common_imports import *
-from collections import defaultdict
+from functools import partial
+from pet_frame_atlas import FrameAtlas
+from pet_frame_cache import FrameDiskCache
+from pet_frame_loader import FrameLoader
+from pet_motion import MotionEngine, MotionSegment, SequentialMotion, ParallelMotion
 
 class PetAnimations:
 
     def __init__(self, pet_widget):          
-        self._load_dialog_file()  # 确保加载对话文件
-        if not hasattr(self, 'dialog'):
-            self.dialog = ["你好!", "今天过得怎么样?", "我是一只可爱的桌宠!"]
+        # 问候语文件在启动阶段中再加载，先使用默认问候语
+        self.dialog = ["你好!", "今天过得怎么样?", "我是一只可爱的桌宠!"]
             
         self.pet = pet_widget
-        self._animation_cache = {}
+        # 动画来源是当前皮肤包，所有动画共享一个帧图集，播放时按帧延迟切换图片
+        self.skin = self.pet.skin
+        self.atlas = FrameAtlas(self._sprite_size(QSize(self.pet.pet_size, self.pet.pet_size)),
+                                device_pixel_ratio=self.pet.devicePixelRatioF(),
+                                disk_cache=FrameDiskCache(),
+                                compact=self.pet.compact_frames)
+        # 解码在线程池里进行，播放时帧还没准备好就先等解码完成的通知，界面不会卡住
+        self.loader = FrameLoader(self.atlas, self.pet)
+        self.loader.loaded.connect(self._on_frames_loaded)
+        self.loader.failed.connect(self._on_frames_failed)
+        self.loader.sources_changed.connect(self._on_sources_changed)
+        self._register_skin()
+        # 帧切换由全局帧时钟调度
+        self.clock = self.pet.clock
+        self.current_anim = None
+        self.current_frames = None
+        self._pending_anim = None  # 正在后台解码、解码完就播放的动画
+        self._frame_index = 0
+        self._hit_key = None      # 命中测试用的精灵左上角和可点击区域缓存
+        self._hit_origin = (0, 0)
+        self._hit_box = None
+        self._frame_job = None
+        self._next_frame_due = 0
+        self._paused = False
+        self._frozen = False      # 省电冻结，与用户暂停分开记录
+        self.frame_scale = 1.0    # 帧延迟倍数，降帧模式下大于1
+
+        # 位移和透明度也由帧时钟推进，运动对象从对象池取用，结束后自动回收
         self._animation_pool = AnimationPool()
-        self._preload_animations()
+        self.motion = MotionEngine(self.pet, self.clock, pool=self._animation_pool)
+        self._preload_animations(["idle"])  # 首帧只需要idle，其余动画在启动阶段排队解码
         self._init_animation_system()
 
     def _init_animation_system(self):
         """初始化动画系统（移除边界限制）"""
-        self.screen_geometry = QApplication.desktop().availableGeometry()
-        self._current_animations = []
+        self.screens = self.pet.screens  # 多显示器几何缓存，边界检测不再查询窗口系统
         self._is_animating = False
         self.current_direction = random.choice([-1, 1])
-        # 移除 margin 相关设置
-        self._load_dialog_file()
-        QApplication.desktop().screenCountChanged.connect(self._update_screen_geometry)
+        self.margin = 20  # 边界检测的安全边距，与 desktop_pet.py 保持一致
 
     def _load_dialog_file(self):
         try:
@@ -39,99 +67,224 @@ class PetAnimations:
             logging.error(f"加载对话文件出错: {str(e)}")
 
     def play(self, anim_name):
-        """增强的动画播放方法（抗干扰）"""
+        """从帧图集播放动画；还没解码时以最高优先级排队，解码完成后再切换"""
         print(f"尝试播放动画: {anim_name}")
-        print(f"当前movie状态: {self.current_movie.state() if hasattr(self, 'current_movie') else 'None'}")
-        if not hasattr(self, '_animation_cache'):
+        frames = self.atlas.lookup(anim_name)
+        if frames is None:
+            if not self.loader.request(anim_name, FrameLoader.URGENT) and not self.loader.pending(anim_name):
+                print(f"动画不可用: {anim_name}")
+                return
+            self._pending_anim = anim_name  # 先继续显示当前帧
             return
-        
-        # 强制停止可能存在的残留动画
-        if hasattr(self, 'current_movie') and self.current_movie:
-            self.current_movie.stop()
-    
-        # 重新加载动画（防止拖动导致资源释放）
-        if anim_name not in self._animation_cache:
-            self._preload_animations()
-    
-        if anim_name in self._animation_cache:
-            self.current_movie = self._animation_cache[anim_name]
-            self.pet.pet_image.setMovie(self.current_movie)
-            self.current_movie.start()
-            print(f"动画恢复: {anim_name}")  # 调试输出
+
+        self._pending_anim = None
+        self.current_anim = anim_name
+        self.current_frames = frames
+        self._frame_index = 0
+        self._paused = False
+        self._next_frame_due = self.clock.now()
+        self._show_frame()
+        self.pet._update_window_mask()
+
+        # 切换动画时让省电模块重新判断（例如从发呆切到走路需要恢复全速）
+        power = getattr(self.pet, 'power', None)
+        if power is not None:
+            power.evaluate()
+
+    def _show_frame(self):
+        """提交当前帧并预约下一帧"""
+        self.clock.cancel(self._frame_job)
+        self._frame_job = None
+        self.clock.request_repaint("sprite", self._present_frame)
+        frames = self.current_frames
+        if len(frames) > 1 and not self._paused and not self._frozen:
+            # 按理论截止时间累加，避免帧延迟越跑越慢
+            delay = int(frames.delays[self._frame_index] * self.frame_scale)
+            self._next_frame_due = max(self._next_frame_due + delay, self.clock.now())
+            self._frame_job = self.clock.schedule_at(self._next_frame_due, self._advance_frame)
+
+    def _present_frame(self):
+        if self.current_frames is not None:
+            self.pet.pet_image.setPixmap(self.current_frames.frames[self._frame_index])
+
+    def _advance_frame(self):
+        self._frame_job = None
+        if self.current_frames is None or self._paused or self._frozen:
+            return
+        self._frame_index = (self._frame_index + 1) % len(self.current_frames)
+        self._show_frame()
+
+    def pause(self):
+        """暂停在当前帧"""
+        self._paused = True
+        self.clock.cancel(self._frame_job)
+        self._frame_job = None
+
+    def resume(self):
+        """从当前帧继续播放"""
+        if self.current_frames is None:
+            self.play("idle")
+            return
+        self._paused = False
+        self._next_frame_due = self.clock.now()
+        self._show_frame()
+
+    def set_render_mode(self, frame_scale, frozen):
+        """省电模块调用：调整帧率或冻结在当前帧"""
+        self.frame_scale = frame_scale
+        if frozen == self._frozen:
+            return
+        self._frozen = frozen
+        if frozen:
+            self.clock.cancel(self._frame_job)
+            self._frame_job = None
+        elif self.current_frames is not None and not self._paused:
+            self._next_frame_due = self.clock.now()
+            self._show_frame()
+
+    def _on_frames_loaded(self, name):
+        if name == self._pending_anim:
+            self.play(name)
+        elif name == self.current_anim:
+            self._reload_current()  # 文件被替换或尺寸变化后的新帧
+
+    def _on_frames_failed(self, name):
+        if name == self._pending_anim:
+            self._pending_anim = None
+            print(f"动画不可用: {name}")
+        if name == "idle" and self.current_frames is None:
+            self.pet._setup_fallback_circle()
+
+    def _on_sources_changed(self, names):
+        """动画文件在运行时被替换：丢弃旧帧并在后台重新解码，解码完成前继续显示旧帧"""
+        if self.skin.is_zip:
+            self.skin.invalidate()
+        for name in names:
+            self.atlas.discard(name)
+            waiting = name in (self.current_anim, self._pending_anim)
+            self.loader.request(name, FrameLoader.URGENT if waiting else 0, prefetch=not waiting)
+
+    def _register_skin(self):
+        """登记当前皮肤的动画来源；zip包里的文件在第一次解码时才解压"""
+        for name, anim in self.skin.animations.items():
+            self.atlas.register(name, partial(self.skin.file_path, name), anim.frame_ms)
+        self.atlas.pin("idle")
+        # 监视动画文件（zip包监视压缩包本身），运行中替换GIF会自动重新解码
+        if self.skin.is_zip:
+            watched = {self.skin.path: list(self.skin.animations)}
+        else:
+            watched = {}
+            for name in self.skin.animations:
+                watched.setdefault(self.skin.file_path(name), []).append(name)
+        self.loader.watch(watched)
+
+    def _sprite_size(self, size):
+        """皮肤的scale决定精灵在画布里的大小"""
+        scale = self.skin.scale
+        return QSize(max(1, round(size.width() * scale)), max(1, round(size.height() * scale)))
+
+    def set_skin(self, skin):
+        """切换皮肤：丢弃旧皮肤的全部帧，只登记新皮肤的来源，用到的动画才解码"""
+        previous = self.current_anim or "idle"
+        self._stop_current_animations()
+        self.clock.cancel(self._frame_job)
+        self._frame_job = None
+        self.current_anim = None
+        self.current_frames = None
+        self._pending_anim = None
+        self._hit_key = None
+        self.pet.pet_image.clear()
+        self.atlas.reset()
+        self.skin = skin
+        self._register_skin()
+        self.atlas.set_variant(self._sprite_size(QSize(self.pet.pet_size, self.pet.pet_size)),
+                               self.atlas.device_pixel_ratio)
+        self.play(previous if previous in skin.animations else "idle")
+        self._preload_animations()
+
+    def set_compact_frames(self, compact):
+        """切换紧凑帧存储：丢弃已解码的帧，当前动画立即按新方式重新加载"""
+        if not self.atlas.set_compact(compact):
+            return
+        self._reload_current()
+        self._preload_animations()
+        print(f"[帧图集] 紧凑存储{'开启' if compact else '关闭'}，后台重新解码")
+
+    def _reload_current(self):
+        """帧图集变化后重新取当前动画的帧，保持帧序号；还没解码时先排队，完成后再切换"""
+        if self.current_anim is None:
+            return
+        frames = self.atlas.lookup(self.current_anim)
+        if frames is None:
+            self.loader.request(self.current_anim, FrameLoader.URGENT)
+            return
+        self.current_frames = frames
+        self._frame_index %= len(frames)
+        self.clock.request_repaint("sprite", self._present_frame)
+        self.pet._update_window_mask()
+
+    def set_sprite_variant(self, size, device_pixel_ratio):
+        """切换精灵尺寸/像素比：已缓存的变体立即生效，否则只缩放一次"""
+        size = self._sprite_size(size)
+        if not self.atlas.set_variant(size, device_pixel_ratio):
+            return
+        print(f"[帧图集] 切换到 {size.width()}x{size.height()}@{device_pixel_ratio:g}")
+        self._reload_current()
+
+    def hit_test(self, pos):
+        """pos(桌宠窗口坐标)处当前帧是否不透明；没有帧或画布在显示提示外观时总是命中"""
+        frames = self.current_frames
+        canvas = self.pet.pet_image
+        if frames is None or not frames.masks or canvas.decorated():
+            return True
+        key = (frames.key, canvas.width(), canvas.height())
+        if key != self._hit_key:
+            # 精灵左上角只在切换动画或尺寸时重新计算
+            origin = canvas.pos() + canvas._target_rect(frames.frames[0]).topLeft()
+            self._hit_key, self._hit_origin = key, (origin.x(), origin.y())
+            anim = self.skin.animations.get(frames.name)
+            box = anim.hitbox if anim else None
+            w, h = frames.size.width(), frames.size.height()
+            self._hit_box = (box.left() * w, box.top() * h, box.right() * w, box.bottom() * h) if box else None
+        x, y = pos.x() - self._hit_origin[0], pos.y() - self._hit_origin[1]
+        box = self._hit_box
+        if box is not None and not (box[0] <= x < box[2] and box[1] <= y < box[3]):
+            return False
+        return frames.masks[self._frame_index].hit(x, y)
+
+    def is_playing(self):
+        return self.current_frames is not None and not self._paused
     
-    def _preload_animations(self):
-        """更健壮的动画预加载"""
-        for name, path in self.pet.animation_bindings.items():
-            try:
-                full_path = os.path.join(os.path.dirname(__file__), path)
-                if os.path.exists(full_path):
-                    movie = QMovie(full_path)
-                    movie.setCacheMode(QMovie.CacheAll)
-                    movie.setScaledSize(QSize(200, 200))
-                    # 强制设置循环模式（防止意外停止）
-                    movie.setCacheMode(QMovie.CacheAll)
-                    movie.start()  # 预启动
-                    self._animation_cache[name] = movie
-            except Exception as e:
-                print(f"动画加载失败 {name}: {str(e)}")
+    def _preload_animations(self, names=None):
+        """在后台解码动画到帧图集，names为空时解码全部
 
-    def _teleport_to_random_position(self):
-        """使用对象池优化传送动画"""
-        sequence = self._anim_pool.get_sequential_group()
-        
-        # 从池中获取动画对象
-        fade_out = self._anim_pool.get_opacity_animation(self)
-        fade_out.setDuration(500)
-        fade_out.setStartValue(1.0)
-        fade_out.setEndValue(0.0)
-        
-        move = self._anim_pool.get_pos_animation(self)
-        move.setDuration(0)
-        move.setStartValue(self.pet.pos())
-        move.setEndValue(self._get_random_position())
-        
-        fade_in = self._anim_pool.get_opacity_animation(self)
-        fade_in.setDuration(500)
-        fade_in.setStartValue(0.0)
-        fade_in.setEndValue(1.0)
-        
-        sequence.addAnimation(fade_out)
-        sequence.addAnimation(move)
-        sequence.addAnimation(fade_in)
-        sequence.start()
+        idle最先，然后是皮肤清单的preload，其余按空闲行为的权重（被播放的可能性）排序。
+        preload以外的动画是预取，放不下时不挤掉已有的帧。
+        """
+        order = self._decode_order([n for n in self.skin.animations if names is None or n in names])
+        queued = [name for i, name in enumerate(order)
+                  if self.loader.request(name, len(order) - i, prefetch=name not in self.skin.preload)]
+        if queued:
+            print(f"[帧图集] 后台解码: {' > '.join(queued)}")
 
-    def _update_screen_geometry(self):
-        self._screen_geometry = QApplication.desktop().availableGeometry()
+    def _decode_order(self, names):
+        behavior = getattr(self.pet, 'behavior', None)  # 启动时行为调度器还没创建
+        weights = dict(behavior.animation_weights()) if behavior is not None else {}
+        preload = self.skin.preload
+        return sorted(names, key=lambda n: (n != "idle", n not in preload, -weights.get(n, 0)))
 
     def get_random_greeting(self):
         return random.choice(self.dialog)  #返回固定语句
     
-    def _ensure_screen_geometry(self):
-        if not hasattr(self, 'screen_geometry'):
-            self.screen_geometry = QApplication.desktop().availableGeometry()
-    
     def _check_boundary(self, pos):
-        """使用更精确的边界检测"""
-        screen_rect = QApplication.desktop().availableGeometry()
-        margin = self.margin
-        rect = self.pet.geometry()  # 改为通过 pet 获取 geometry
-    
-        new_x = min(max(pos.x(), margin), screen_rect.width() - rect.width() - margin)
-        new_y = min(max(pos.y(), margin), screen_rect.height() - rect.height() - margin)
-    
-        return QPoint(new_x, new_y)
+        """把位置限制在最近显示器的可用区域内"""
+        return self.screens.clamp(pos, self.pet.size(), self.margin)
 
-    def request_animation(self, anim_func, priority=0):
-        """请求播放动画，高优先级可中断低优先级动画"""
-        if not self.animations_enabled:
-            return
-        
-        if self._current_priority > priority and self._is_animating:
-            return  # 当前有更高优先级动画运行中
-        
-        self._current_priority = priority
-        self._stop_current_animations()
-        anim_func()
+    def request_animation(self, name):
+        """请求播放已注册的行为，由行为调度器按优先级决定是否打断当前动画"""
+        if not self.pet.animations_enabled:
+            return False
+        return self.pet.behavior.request(name)
 
     def _is_at_boundary(self, pos=None):
         if pos is None:
@@ -162,93 +315,52 @@ class PetAnimations:
         print(f"触发边界处理动画: {chosen_animation.__name__}")
         chosen_animation()
 
-    def _get_valid_position_range(self):
-        """获取有效的随机位置范围"""
-        self._ensure_screen_geometry()
-        max_x = max(self.margin, self.screen_geometry.width() - self.pet.width() - self.margin)
-        max_y = max(self.margin, self.screen_geometry.height() - self.pet.height() - self.margin)
-        return (self.margin, max_x, self.margin, max_y)
-    
     def _teleport_to_random_position(self):
         """传送到随机位置"""
         self._stop_current_animations()
     
-        min_x, max_x, min_y, max_y = self._get_valid_position_range()
-        new_x = random.randint(min_x, max_x)
-        new_y = random.randint(min_y, max_y)
-        
-        # 创建动画序列
-        sequence = QSequentialAnimationGroup()
-        
-        # 淡出
-        fade_out = QPropertyAnimation(self, b"windowOpacity")
-        fade_out.setDuration(500)
-        fade_out.setStartValue(1.0)
-        fade_out.setEndValue(0.0)
-        
-        # 移动
-        move = QPropertyAnimation(self, b"pos")
-        move.setDuration(0)
-        move.setStartValue(self.pet.pos())
-        move.setEndValue(QPoint(new_x, new_y))
-        
-        # 淡入
-        fade_in = QPropertyAnimation(self, b"windowOpacity")
-        fade_in.setDuration(500)
-        fade_in.setStartValue(0.0)
-        fade_in.setEndValue(1.0)
-        
-        sequence.addAnimation(fade_out)
-        sequence.addAnimation(move)
-        sequence.addAnimation(fade_in)
-        
-        sequence.finished.connect(self._animation_finished)
-        sequence.start()
-        self._current_animations.append(sequence)
+        new_pos = self.screens.random_position(self.pet.size(), self.margin)
+        self._fade_move_fade(new_pos, 500, self._animation_finished)
+
+    def _fade_move_fade(self, target, fade_ms, on_finished):
+        """淡出 -> 瞬移 -> 淡入"""
+        pool = self._animation_pool
+        sequence = pool.sequential(
+            pool.segment("opacity", fade_ms, start=1.0, end=0.0),
+            pool.segment("pos", 0, end=target),
+            pool.segment("opacity", fade_ms, start=0.0, end=1.0),
+        )
+        self.motion.run(sequence, on_finished)
+
+    def glide_to(self, target, opacity_keys, duration=1000, on_finished=None):
+        """移动到target，同时按关键帧改变透明度"""
+        pool = self._animation_pool
+        group = pool.parallel(
+            pool.segment("pos", duration, end=target, easing=QEasingCurve.InOutQuad),
+            pool.segment("opacity", duration, keyframes=opacity_keys),
+        )
+        self.motion.run(group, on_finished)
 
     def random_walk(self):
         """自由行走动画（无边界检查）"""
-        direction = "walkleft" if random.random() > 0.5 else "walkright"
-        self.current_direction = -1 if direction == "walkleft" else 1
-    
-        # 播放行走动画
-        self.play(direction)
-    
-        # 计算移动距离（不受限制）
-        distance = random.randint(50, 150) * self.current_direction
-        new_pos = self.pet.pos() + QPoint(distance, random.randint(-20, 20))
-    
-        # 创建移动动画
-        walkanime = QPropertyAnimation(self.pet, b"pos")
-        walkanime.setDuration(2000)
-        walkanime.setEasingCurve(QEasingCurve.InOutSine)
-        walkanime.setStartValue(self.pet.pos())
-        walkanime.setEndValue(new_pos)
-        walkanime.finished.connect(self._animation_finished)  # 确保连接完成回调
-        walkanime.start()
-        self._current_animations.append(walkanime)
+        self._walk("walkleft", "walkright")
 
     def random_phonewalk(self):
         """自由行走动画（无边界检查）"""
-        direction = "phonewalkleft" if random.random() > 0.5 else "phonewalkright"
-        self.current_direction = -1 if direction == "phonewalkleft" else 1
+        self._walk("phonewalkleft", "phonewalkright")
+
+    def _walk(self, left_anim, right_anim):
+        direction = left_anim if random.random() > 0.5 else right_anim
+        self.current_direction = -1 if direction == left_anim else 1
     
         # 播放行走动画
         self.play(direction)
     
         # 计算移动距离（不受限制）
         distance = random.randint(50, 150) * self.current_direction
-        new_pos = self.pet.pos() + QPoint(distance, random.randint(-20, 20))
-    
-        # 创建移动动画
-        walkanim = QPropertyAnimation(self.pet, b"pos")
-        walkanim.setDuration(2000)
-        walkanim.setEasingCurve(QEasingCurve.InOutSine)
-        walkanim.setStartValue(self.pet.pos())
-        walkanim.setEndValue(new_pos)
-        walkanim.finished.connect(self._animation_finished)  # 确保连接完成回调
-        walkanim.start()
-        self._current_animations.append(walkanim)
+        walk = self._animation_pool.segment("pos", 2000, by=(distance, random.randint(-20, 20)),
+                                            easing=QEasingCurve.InOutSine)
+        self.motion.run(walk, self._animation_finished)
 
     def jump_animation(self):
         """跳跃动画实现"""
@@ -262,32 +374,44 @@ class PetAnimations:
         jump_height = 100  # 跳跃高度(像素)
         jump_duration = 800  # 跳跃持续时间(毫秒)
     
-        # 创建跳跃动画序列
-        jump_sequence = QSequentialAnimationGroup()
-    
-        # 上升动画
-        up_anim = QPropertyAnimation(self.pet, b"pos")
-        up_anim.setDuration(jump_duration // 2)
-        up_anim.setEasingCurve(QEasingCurve.OutQuad)
-        up_anim.setStartValue(self.pet.pos())
-        up_anim.setEndValue(self.pet.pos() + QPoint(0, -jump_height))
-    
-        # 下降动画
-        down_anim = QPropertyAnimation(self.pet, b"pos")
-        down_anim.setDuration(jump_duration // 2)
-        down_anim.setEasingCurve(QEasingCurve.InQuad)
-        down_anim.setStartValue(self.pet.pos() + QPoint(0, -jump_height))
-        down_anim.setEndValue(self.pet.pos())
-    
-        jump_sequence.addAnimation(up_anim)
-        jump_sequence.addAnimation(down_anim)
-    
-        # 动画完成回调
-        jump_sequence.finished.connect(self._animation_finished)
-    
-        # 添加到当前动画列表
-        self._current_animations.append(jump_sequence)
-        jump_sequence.start()
+        pool = self._animation_pool
+        jump_sequence = pool.sequential(
+            pool.segment("pos", jump_duration // 2, by=(0, -jump_height), easing=QEasingCurve.OutQuad),
+            pool.segment("pos", jump_duration // 2, by=(0, jump_height), easing=QEasingCurve.InQuad),
+        )
+        self.motion.run(jump_sequence, self._animation_finished)
+
+    def hop_walk(self):
+        """走一段后跳起，落地时弹一下"""
+        if self._is_animating or not self.pet.animations_enabled:
+            return
+
+        self._is_animating = True
+        direction = random.choice([-1, 1])
+        self.current_direction = direction
+        walk_anim = "walkleft" if direction < 0 else "walkright"
+        pool = self._animation_pool
+        # 组合路径：走路 -> 起跳 -> 落地弹跳，作为一个运动整体调度
+        hop = pool.sequential(
+            pool.segment("pos", 1500, by=(random.randint(60, 120) * direction, 0),
+                         easing=QEasingCurve.InOutSine, on_start=partial(self.play, walk_anim)),
+            pool.segment("pos", 350, by=(30 * direction, -80), easing=QEasingCurve.OutQuad,
+                         on_start=partial(self.play, "jump")),
+            pool.segment("pos", 700, by=(20 * direction, 80), easing=QEasingCurve.OutBounce),
+        )
+        self.motion.run(hop, self._animation_finished)
+
+    def start_bounce_animation(self):
+        """原地小跳一下（收到回复时）"""
+        if self._is_animating:
+            return
+        self._is_animating = True
+        pool = self._animation_pool
+        bounce = pool.sequential(
+            pool.segment("pos", 200, by=(0, -40), easing=QEasingCurve.OutQuad),
+            pool.segment("pos", 600, by=(0, 40), easing=QEasingCurve.OutBounce),
+        )
+        self.motion.run(bounce, self._animation_finished)
 
     def touch_animation(self) :
         """触摸动画实现"""
@@ -304,29 +428,25 @@ class PetAnimations:
         current_pos = self.pet.pos()
         new_x = current_pos.x()
         new_y = current_pos.y()
+        screen = self.screens.screen_for_rect(self.pet.geometry())
+        if screen is None:
+            return
     
-        # 根据边界调整方向
-        if current_pos.x() <= self.margin:
+        # 根据所在显示器的边界调整方向
+        if current_pos.x() <= screen.left + self.margin:
             new_x = current_pos.x() + 50
             self.current_direction = 1  # 向右
-        elif current_pos.x() >= self.screen_geometry.width() - self.pet.width() - self.margin:
+        elif current_pos.x() >= screen.right - self.pet.width() - self.margin:
             new_x = current_pos.x() - 50
             self.current_direction = -1  # 向左
         
-        if current_pos.y() <= self.margin:
+        if current_pos.y() <= screen.top + self.margin:
             new_y = current_pos.y() + 50
-        elif current_pos.y() >= self.screen_geometry.height() - self.pet.height() - self.margin:
+        elif current_pos.y() >= screen.bottom - self.pet.height() - self.margin:
             new_y = current_pos.y() - 50
     
-        # 创建动画
-        anim = QPropertyAnimation(self.pet, b"pos")
-        anim.setDuration(800)
-        anim.setEasingCurve(QEasingCurve.OutBounce)
-        anim.setStartValue(current_pos)
-        anim.setEndValue(QPoint(new_x, new_y))
-        anim.finished.connect(self._animation_finished)
-        anim.start()
-        self._current_animations.append(anim)
+        anim = self._animation_pool.segment("pos", 800, end=(new_x, new_y), easing=QEasingCurve.OutBounce)
+        self.motion.run(anim, self._animation_finished)
 
     def _fade_and_reappear(self):
         """淡出并在附近重新出现"""
@@ -336,31 +456,8 @@ class PetAnimations:
         offset = 100 * self.current_direction
         new_pos = self._check_boundary(self.pet.pos() + QPoint(offset, 0))
         
-        # 创建动画组
-        group = QParallelAnimationGroup()
-        
-        # 移动动画
-        move = QPropertyAnimation(self, b"pos")
-        move.setDuration(1000)
-        move.setEasingCurve(QEasingCurve.InOutQuad)
-        move.setStartValue(self.pet.pos())
-        move.setEndValue(new_pos)
-        
-        # 透明度动画
-        opacity = QPropertyAnimation(self, b"windowOpacity")
-        opacity.setDuration(1000)
-        opacity.setKeyValues([
-            (0.0, 1.0),
-            (0.3, 0.2),
-            (0.7, 0.2),
-            (1.0, 1.0)
-        ])
-        
-        group.addAnimation(move)
-        group.addAnimation(opacity)
-        group.finished.connect(self._animation_finished)
-        group.start()
-        self._current_animations.append(group)
+        self.glide_to(new_pos, [(0.0, 1.0), (0.3, 0.2), (0.7, 0.2), (1.0, 1.0)],
+                      1000, self._animation_finished)
     
     def _animation_finished(self):
         """动画完成回调 - 检查位置并处理"""
@@ -374,6 +471,7 @@ class PetAnimations:
             # 正常状态恢复
             self.play("idle")
             self.pet.setAttribute(Qt.WA_TransparentForMouseEvents, False)  # 恢复鼠标交互
+            self.pet.behavior.finish()
 
     def handle_click_interrupt(self):
         """处理鼠标点击中断动画"""
@@ -382,132 +480,51 @@ class PetAnimations:
             self._stop_current_animations()
             self.play("idle")
      
-    def _stop_current_animations(self):
-        """停止当前所有动画"""
-        for anim in self._current_animations:
-            anim.stop()
-            anim.deleteLater()
-        self._current_animations.clear()
-        self._is_animating = False
-        # 停止当前电影
-        if hasattr(self, 'current_movie') and self.current_movie:
-            self.current_movie.stop()
-        # 恢复鼠标交互
-        self.pet.setAttribute(Qt.WA_TransparentForMouseEvents, False)
-    
     def random_animation(self):
         """随机动画触发"""
         if not self._is_animating and self.pet.animations_enabled:
-            # 先停止任何可能残留的动画
-            self._stop_current_animations()
-        
-            # 随机选择动画类型
-            animations = [
-                self.random_walk,
-                self.random_phonewalk,
-                self.jump_animation,
-
-            ]
-            random.choice(animations)()
+            # 按行为权重抽选（别名表，常数时间），冷却中的行为会被跳过
+            self.pet.behavior.run_idle()
 
     def _check_visible_area(self):
         """检查是否在屏幕可视范围内"""
-        screen_rect = QApplication.desktop().availableGeometry()
-        if not screen_rect.intersects(self.pet.geometry()):
+        if not self.screens.intersects(self.pet.geometry()):
             print(f" 宠物移出屏幕 {self.pet.pos()}，将返回安全位置")
             return self._get_safe_position()
         return None
-        pet_rect = self.pet.geometry()
-    
-        # 计算可见区域（保留20px边距）
-        margin = 20
-        visible_rect = screen_rect.adjusted(
-            margin, margin, -margin, -margin
-        )
-    
-        # 如果完全不可见，返回需要修正的位置
-        if not visible_rect.intersects(pet_rect):
-            return self._get_safe_position()
-        return None
 
-    def _get_safe_position(self):
-        """获取安全的随机位置（确保在屏幕内）"""
-        screen_rect = QApplication.desktop().availableGeometry()
-        margin = 50  # 安全边距
-        return QPoint(
-            random.randint(margin, screen_rect.width() - self.pet.width() - margin),
-            random.randint(margin, screen_rect.height() - self.pet.height() - margin)
-        )
     def _start_return_animation(self):
         """启动返回屏幕的动画（此时禁用鼠标交互）"""
         self._is_animating = True
         self.pet.setAttribute(Qt.WA_TransparentForMouseEvents, True)  # 仅在此处禁用鼠标
     
         safe_pos = self._get_safe_position()
-    
-        # 创建动画组
-        group = QSequentialAnimationGroup()
-    
-        # 淡出动画
-        fade_out = QPropertyAnimation(self.pet, b"windowOpacity")
-        fade_out.setDuration(300)
-        fade_out.setStartValue(1.0)
-        fade_out.setEndValue(0.0)
-    
-        # 瞬移（不可见时移动）
-        move = QPropertyAnimation(self.pet, b"pos")
-        move.setDuration(0)
-        move.setStartValue(self.pet.pos())
-        move.setEndValue(safe_pos)
-    
-        # 淡入动画
-        fade_in = QPropertyAnimation(self.pet, b"windowOpacity")
-        fade_in.setDuration(300)
-        fade_in.setStartValue(0.0)
-        fade_in.setEndValue(1.0)
-    
-        group.addAnimation(fade_out)
-        group.addAnimation(move)
-        group.addAnimation(fade_in)
-    
-        group.finished.connect(self._return_completed)
-        group.start()
-        self._current_animations.append(group)
+        # 淡出，不可见时瞬移，再淡入
+        self._fade_move_fade(safe_pos, 300, self._return_completed)
 
     def _return_completed(self):
         """返回动画完成后恢复状态"""
         self._is_animating = False
         self.pet.setAttribute(Qt.WA_TransparentForMouseEvents, False)  # 恢复鼠标交互
         self.play("idle")
+        self.pet.behavior.finish()
 
     def _get_safe_position(self):
-        """获取屏幕内的安全位置"""
-        screen = QApplication.desktop().availableGeometry()
-        margin = 50
-        return QPoint(
-            random.randint(margin, screen.width() - self.pet.width() - margin),
-            random.randint(margin, screen.height() - self.pet.height() - margin)
-        )
+        """获取离宠物最近的显示器内的安全位置"""
+        screen = self.screens.screen_for_rect(self.pet.geometry())
+        return self.screens.random_position(self.pet.size(), 50, screen=screen)
 
     def _stop_current_animations(self):
         """停止所有动画并清理状态"""
-        for anim in self._current_animations:
-            anim.stop()
-            anim.deleteLater()
-        self._current_animations.clear()
+        self.motion.stop()
+        if self.pet.windowOpacity() < 1.0:
+            self.pet.setWindowOpacity(1.0)  # 淡出途中被打断时恢复可见
         self._is_animating = False
         self.pet.setAttribute(Qt.WA_TransparentForMouseEvents, False)
 
     def _is_in_screen(self):
-        """检查宠物是否在屏幕范围内"""
-        screen_rect = QApplication.desktop().availableGeometry()
-        pet_rect = self.pet.geometry()
-        margin = 20  # 安全边距
-    
-        # 检查是否完全在屏幕内（含安全边距）
-        return screen_rect.adjusted(
-            margin, margin, -margin, -margin
-        ).contains(pet_rect)
+        """检查宠物是否完全在某个显示器内（含20px安全边距）"""
+        return self.screens.contains(self.pet.geometry(), 20)
 
  
 
@@ -516,31 +533,75 @@ class PetAnimations:
     
 
 class AnimationPool:
+    """运动对象池
+
+    MotionSegment、SequentialMotion、ParallelMotion用完后由MotionEngine交回，
+    下次取用时重新configure，长时间运行也不会持续分配新对象。
+    """
+    MAX_IDLE = 16  # 每种对象最多保留的空闲数量
+
     def __init__(self):
-        self._pool = defaultdict(list)
-        self._active_animations = set()
-        
-    def get_animation(self, anim_type, target, property_name):
-        if not self._pool[anim_type]:
-            anim = QPropertyAnimation(target.pet if hasattr(target, 'pet') else target, property_name)
-            anim.finished.connect(lambda: self.release_animation(anim_type, anim))
+        self._idle = {MotionSegment: [], SequentialMotion: [], ParallelMotion: []}
+        self._outstanding = {}  # id -> 已借出的对象
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+        self.dropped = 0  # 超过空闲上限直接丢弃的数量
+
+    def _acquire(self, kind):
+        idle = self._idle[kind]
+        if idle:
+            self.hits += 1
+            obj = idle.pop()
         else:
-            anim = self._pool[anim_type].pop()
-            anim.setTargetObject(target)
-            anim.setPropertyName(property_name)
-        
-        self._active_animations.add(anim)
-        return anim
-        
-    def release_animation(self, anim_type, anim):
-        if anim in self._active_animations:
-            anim.stop()
-            self._active_animations.remove(anim)
-            self._pool[anim_type].append(anim)
-            
+            self.misses += 1
+            obj = kind()
+        self._outstanding[id(obj)] = obj
+        return obj
+
+    def segment(self, prop, duration, **kwargs):
+        """取一个补间段，参数同MotionSegment.configure"""
+        return self._acquire(MotionSegment).configure(prop, duration, **kwargs)
+
+    def sequential(self, *children):
+        group = self._acquire(SequentialMotion)
+        group.children[:] = children
+        return group
+
+    def parallel(self, *children):
+        group = self._acquire(ParallelMotion)
+        group.children[:] = children
+        return group
+
+    def release(self, motion):
+        """归还运动对象（组合会连同子运动一起归还），不是从池里取的对象会被忽略"""
+        if self._outstanding.pop(id(motion), None) is None:
+            return
+        self.released += 1
+        children = getattr(motion, "children", None)
+        if children is not None:
+            for child in children:
+                self.release(child)
+            children.clear()
+        else:
+            motion.configure("pos", 0)  # 释放回调等引用
+        idle = self._idle[type(motion)]
+        if len(idle) < self.MAX_IDLE:
+            idle.append(motion)
+        else:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "outstanding": len(self._outstanding),
+            "released": self.released,
+            "dropped": self.dropped,
+            "idle": {kind.__name__: len(idle) for kind, idle in self._idle.items()},
+        }
+
     def cleanup(self):
-        for anim_list in self._pool.values():
-            for anim in anim_list:
-                anim.deleteLater()
-        self._pool.clear()
-        self._active_animations.clear()
\ No newline at end of file
+        for idle in self._idle.values():
+            idle.clear()
+        self._outstanding.clear()
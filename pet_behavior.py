@@ -0,0 +1,241 @@
+from common_imports import *
+from enum import IntEnum
+import heapq
+
+
+class BehaviorPriority(IntEnum):
+    """行为优先级，数值大的可以打断数值小的"""
+    IDLE = 0        # 随机闲逛
+    REACTION = 20   # 回复弹跳、双击抖动等即时反应
+    REMINDER = 30   # 休息提醒
+    THINKING = 40   # 等待AI回复
+    DRAG = 50       # 用户拖动，最高
+
+
+class Behavior:
+    """一个可调度的行为"""
+    __slots__ = ("name", "func", "priority", "cooldown", "weight", "hold", "active",
+                 "duration", "queueable", "animations", "ready_at", "runs", "rejected")
+
+    def __init__(self, name, func, priority, cooldown=0, weight=0, hold=False, active=None,
+                 duration=None, queueable=False, animations=()):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.cooldown = cooldown      # 两次执行的最短间隔(ms)
+        self.weight = weight          # >0时参与空闲随机选择
+        self.hold = hold              # True表示一直持续到显式finish（拖动、思考）
+        self.active = active          # hold行为超时检查时调用，返回True表示仍在进行
+        self.duration = duration      # 非hold行为的固定时长，None表示等动画完成通知
+        self.queueable = queueable    # 被更高优先级挡住时是否排队稍后执行
+        self.animations = tuple(animations)  # 会播放的动画，用于决定后台解码顺序
+        self.ready_at = 0
+        self.runs = 0
+        self.rejected = 0
+
+
+class AliasTable:
+    """Vose别名表：按权重随机选择，建表O(n)，每次抽样O(1)"""
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        n = len(self.items)
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        if n == 0:
+            return
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+class BehaviorScheduler:
+    """行为调度器
+
+    同一时间只有一个当前行为。新请求的优先级不低于当前行为时打断它（hold行为
+    只能被更高优先级打断）；被挡住的可排队行为进入优先队列，当前行为结束后按
+    优先级取出。空闲动画通过别名表按权重抽样，每次决策都是常数时间。
+    """
+    QUEUE_TTL = 5000           # 排队超过这么久的请求直接丢弃(ms)
+    WATCHDOG_MS = 15000        # 没有收到完成通知的行为最长占用时间
+    HOLD_WATCHDOG_MS = 60000   # hold行为丢了结束通知（例如松开鼠标的事件）时的兜底时间
+    IDLE_RETRIES = 3           # 抽到冷却中的空闲行为时重抽的次数
+
+    def __init__(self, clock, on_interrupt=None):
+        self.clock = clock
+        self.on_interrupt = on_interrupt  # 打断当前行为时调用，用于停止动画
+        self._behaviors = {}
+        self._idle_table = AliasTable([], [])
+        self._pending = []         # 堆: (-优先级, 序号, 名称, 过期时间)
+        self._seq = 0
+        self.current = None
+        self._started_at = 0
+        self._end_job = None
+        self.preemptions = 0
+        self.dropped = 0
+
+    def register(self, name, func, priority=BehaviorPriority.IDLE, **options):
+        behavior = Behavior(name, func, priority, **options)
+        self._behaviors[name] = behavior
+        if behavior.weight > 0:
+            self._rebuild_idle_table()
+        return behavior
+
+    def set_weight(self, name, weight):
+        self._behaviors[name].weight = weight
+        self._rebuild_idle_table()
+
+    def _rebuild_idle_table(self):
+        idle = [b for b in self._behaviors.values() if b.weight > 0]
+        self._idle_table = AliasTable(idle, [b.weight for b in idle])
+
+    def idle_weights(self):
+        """空闲行为及权重，按权重从大到小"""
+        idle = [b for b in self._behaviors.values() if b.weight > 0]
+        return [(b.name, b.weight) for b in sorted(idle, key=lambda b: -b.weight)]
+
+    def animation_weights(self):
+        """空闲行为会播放的动画及其被播放的可能性（所用行为的权重之和），从大到小"""
+        weights = {}
+        for name, weight in self.idle_weights():
+            for anim in self._behaviors[name].animations:
+                weights[anim] = weights.get(anim, 0) + weight
+        return sorted(weights.items(), key=lambda item: -item[1])
+
+    # ---- 请求 ----
+    def request(self, name):
+        """请求执行行为，返回是否已开始执行"""
+        behavior = self._behaviors.get(name)
+        if behavior is None:
+            print(f"[行为] 未注册的行为: {name}")
+            return False
+        now = self.clock.now()
+        if now < behavior.ready_at:
+            behavior.rejected += 1
+            return False
+        current = self.current
+        if current is not None and not self._can_preempt(behavior, current):
+            if behavior.queueable:
+                self._seq += 1
+                heapq.heappush(self._pending, (-behavior.priority, self._seq, name, now + self.QUEUE_TTL))
+            else:
+                behavior.rejected += 1
+            return False
+        self._start(behavior, now)
+        return True
+
+    def run_idle(self):
+        """按权重抽一个空闲行为执行"""
+        if self.current is not None or not len(self._idle_table):
+            return False
+        now = self.clock.now()
+        for _ in range(self.IDLE_RETRIES):
+            behavior = self._idle_table.sample()
+            if now >= behavior.ready_at:
+                self._start(behavior, now)
+                return True
+        return False
+
+    def _can_preempt(self, behavior, current):
+        if current.hold:
+            return behavior.priority > current.priority
+        return behavior.priority >= current.priority
+
+    def _start(self, behavior, now):
+        if self.current is not None:
+            self.preemptions += 1
+            print(f"[行为] {behavior.name} 打断 {self.current.name}")
+            self._end_current()
+            if self.on_interrupt is not None:
+                self.on_interrupt()
+        self.current = behavior
+        self._started_at = now
+        behavior.runs += 1
+        behavior.ready_at = now + behavior.cooldown
+        if behavior.hold:
+            limit = self.HOLD_WATCHDOG_MS
+        else:
+            limit = behavior.duration if behavior.duration is not None else self.WATCHDOG_MS
+        self._end_job = self.clock.schedule(limit, self._expire)
+        try:
+            behavior.func()
+        except Exception as e:
+            print(f"[行为] {behavior.name} 执行出错: {str(e)}")
+            if self.current is behavior:
+                self.finish()
+
+    # ---- 结束 ----
+    def finish(self, name=None):
+        """当前行为结束；指定name时只在当前行为是它时才结束，不指定时不会结束hold行为"""
+        current = self.current
+        if current is None:
+            return
+        if (current.name != name) if name is not None else current.hold:
+            return
+        self._end_current()
+        self._run_pending()
+
+    def _expire(self):
+        self._end_job = None
+        current = self.current
+        if current is None:
+            return
+        if current.hold and current.active is not None and current.active():
+            self._end_job = self.clock.schedule(self.HOLD_WATCHDOG_MS, self._expire)
+            return
+        if current.hold:
+            print(f"[行为] {current.name} 超时未结束，强制结束")
+        self.finish(current.name)
+
+    def _end_current(self):
+        self.clock.cancel(self._end_job)
+        self._end_job = None
+        self.current = None
+
+    def _run_pending(self):
+        now = self.clock.now()
+        while self._pending and self.current is None:
+            _neg, _seq, name, expires = heapq.heappop(self._pending)
+            behavior = self._behaviors[name]
+            if now > expires or now < behavior.ready_at:
+                self.dropped += 1
+                continue
+            self._start(behavior, now)
+
+    def clear(self):
+        """取消排队请求和当前动画行为（例如关闭动画时），拖动、思考等hold行为保留"""
+        self._pending.clear()
+        if self.current is not None and not self.current.hold:
+            self._end_current()
+            if self.on_interrupt is not None:
+                self.on_interrupt()
+
+    # ---- 调试 ----
+    def debug_state(self):
+        now = self.clock.now()
+        return {
+            "current": self.current.name if self.current else None,
+            "current_ms": now - self._started_at if self.current else 0,
+            "pending": [(name, -neg, expires - now) for neg, _seq, name, expires in sorted(self._pending)],
+            "cooldowns": {b.name: b.ready_at - now for b in self._behaviors.values() if b.ready_at > now},
+            "runs": {b.name: b.runs for b in self._behaviors.values() if b.runs},
+            "rejected": {b.name: b.rejected for b in self._behaviors.values() if b.rejected},
+            "preemptions": self.preemptions,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,90 @@
+from common_imports import *
+
+
+class PetCanvas(QWidget):
+    """桌宠画布
+
+    直接在paintEvent里绘制帧图集中的缓存帧，换帧时只标记精灵所在区域为脏区域，
+    不经过QLabel的布局和样式表，也不会让整个透明窗口重新合成。
+    """
+    first_frame_painted = pyqtSignal()  # 第一次真正画出精灵（或备用圆球）时发出一次
+
+    def __init__(self, parent=None, size=QSize(200, 200)):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_NoSystemBackground)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setFixedSize(size)
+        self._pixmap = None
+        self._sprite_rect = QRect()
+        self._thinking = False
+        self._fallback = False
+        self.updates = 0   # 请求的局部刷新次数
+        self.paints = 0    # 实际paintEvent次数
+        self.frame_painted = False
+
+    # ---- 与QLabel兼容的接口 ----
+    def setPixmap(self, pixmap):
+        self._pixmap = pixmap
+        rect = self._target_rect(pixmap)
+        dirty = rect if self._sprite_rect.isNull() else rect.united(self._sprite_rect)
+        self._sprite_rect = rect
+        self.updates += 1
+        self.update(dirty)
+
+    def pixmap(self):
+        return self._pixmap
+
+    def clear(self):
+        self._pixmap = None
+        if not self._sprite_rect.isNull():
+            self.update(self._sprite_rect)
+        self._sprite_rect = QRect()
+
+    # ---- 状态外观 ----
+    def set_thinking(self, thinking):
+        """思考中：精灵后面画浅蓝色底"""
+        if thinking != self._thinking:
+            self._thinking = thinking
+            self.update()
+
+    def set_fallback(self, fallback):
+        """GIF不可用时画粉色圆球"""
+        if fallback != self._fallback:
+            self._fallback = fallback
+            self.update()
+
+    def decorated(self):
+        """是否在画精灵以外的内容（思考底色或备用圆球）"""
+        return self._thinking or self._fallback
+
+    def _target_rect(self, pixmap):
+        """精灵在画布中的位置（居中，按逻辑像素计算）"""
+        if pixmap is None or pixmap.isNull():
+            return QRect()
+        dpr = pixmap.devicePixelRatio() or 1.0
+        size = QSize(round(pixmap.width() / dpr), round(pixmap.height() / dpr))
+        return QRect(QPoint((self.width() - size.width()) // 2,
+                            (self.height() - size.height()) // 2), size)
+
+    def paintEvent(self, event):
+        self.paints += 1
+        painter = QPainter(self)
+        if self._fallback:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(Qt.white, 2))
+            painter.setBrush(QColor("pink"))
+            painter.drawEllipse(self.rect().adjusted(1, 1, -1, -1))
+        elif self._thinking:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(Qt.white, 10))
+            painter.setBrush(QColor("lightblue"))
+            painter.drawRoundedRect(self.rect().adjusted(5, 5, -5, -5), 50, 50)
+        drawn = self._fallback
+        if self._pixmap is not None and event.rect().intersects(self._sprite_rect):
+            painter.drawPixmap(self._sprite_rect.topLeft(), self._pixmap)
+            drawn = True
+        painter.end()
+        if drawn and not self.frame_painted:
+            # idle帧是后台解码的，窗口第一次绘制时画布可能还是空的
+            self.frame_painted = True
+            self.first_frame_painted.emit()
@@ -0,0 +1,289 @@
+from common_imports import *
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from functools import partial
+import socket
+
+
+def is_timeout(error):
+    """是否是超时异常（futures、socket、requests、websocket各有自己的类型）"""
+    if isinstance(error, (FuturesTimeoutError, TimeoutError, socket.timeout)):
+        return True
+    if requests.is_loaded() and isinstance(error, requests.exceptions.Timeout):
+        return True
+    if websocket.is_loaded() and isinstance(error, websocket.WebSocketTimeoutException):
+        return True
+    return False
+
+
+class ChatRequest:
+    """一次聊天请求；流式回复的片段由工作线程放进缓冲区，GUI线程按帧取走"""
+    __slots__ = ("id", "handler", "text", "future", "timeout_job", "started_at", "cancelled",
+                 "streamed", "pieces", "updates", "first_visible_ms", "cached", "_buffer", "_lock")
+
+    def __init__(self, request_id, handler, text):
+        self.id = request_id
+        self.handler = handler
+        self.text = text
+        self.future = None
+        self.timeout_job = None
+        self.started_at = time.perf_counter()
+        self.cancelled = False
+        self.streamed = False
+        self.pieces = 0              # 收到的片段数
+        self.updates = 0             # 实际刷新界面的次数
+        self.first_visible_ms = None  # 第一段文字显示出来的用时
+        self.cached = None           # 命中缓存时为CachedResponse
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def push(self, piece):
+        """工作线程：放入一个片段，返回缓冲区原来是否为空（为空时需要通知GUI线程）"""
+        with self._lock:
+            self._buffer.append(piece)
+            self.pieces += 1
+            return len(self._buffer) == 1
+
+    def take(self):
+        """GUI线程：取走缓冲区里的全部文字"""
+        with self._lock:
+            text = "".join(self._buffer)
+            self._buffer.clear()
+        return text
+
+
+class ChatPipeline(QObject):
+    """后台聊天请求
+
+    get_response 在单独的工作线程里执行，结果、错误和超时都通过信号回到GUI线程，
+    等待期间界面和动画照常运行。同一时间只有一个当前请求：发新消息或按Esc会取消它，
+    被取消或超时的请求即使之后返回也不会再显示。处理器有 cancel() 时会被调用，
+    以便尽快结束阻塞中的网络连接。
+
+    处理器开启 stream 并提供 stream_response() 生成器时按流式处理：片段先进缓冲区，
+    GUI线程每帧最多取一次，通过 text_appended 追加到界面。超时按“多久没有新内容”计算。
+    首段文字显示的用时（first_visible_ms）和总用时分开统计。
+
+    传入cache（ResponseCache）时，工作线程先查缓存，命中就不再请求网络；
+    网络请求成功后把回复存进缓存。
+    """
+    response_ready = pyqtSignal(int, str)    # 请求编号, 回复
+    request_failed = pyqtSignal(int, str)    # 请求编号, 错误信息
+    request_timeout = pyqtSignal(int)
+    request_cancelled = pyqtSignal(int)
+    stream_started = pyqtSignal(int)         # 第一段文字即将显示
+    text_appended = pyqtSignal(int, str)     # 本帧新增的文字
+    stream_finished = pyqtSignal(int, str)   # 完整回复
+    _done = pyqtSignal(object, object, object)  # 工作线程 -> GUI线程: 请求, 回复, 异常
+    _chunk = pyqtSignal(object)              # 工作线程 -> GUI线程: 缓冲区有新片段
+
+    TIMEOUT_MS = 15000
+
+    def __init__(self, clock, parent=None, cache=None):
+        super().__init__(parent)
+        self.clock = clock
+        self.cache = cache
+        # 单线程：处理器的对话历史不是线程安全的，请求按顺序执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat")
+        self._current = None
+        self._seq = 0
+        self._done.connect(self._on_done)
+        self._chunk.connect(self._on_chunk)
+        self._flush_job = None
+        self._last_flush = -1000
+        self.completed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.stale = 0            # 取消或超时后才返回、被丢弃的结果
+        self.last_latency_ms = None
+        self.last_first_visible_ms = None
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def submit(self, handler, text, timeout_ms=None):
+        """提交请求，进行中的请求会先被取消；返回请求编号"""
+        self.cancel()
+        self._seq += 1
+        request = ChatRequest(self._seq, handler, text)
+        request.future = self._executor.submit(self._run, request)
+        request.timeout_job = self.clock.schedule(timeout_ms or self.TIMEOUT_MS,
+                                                  partial(self._on_timeout, request))
+        self._current = request
+        return request.id
+
+    def busy(self):
+        return self._current is not None
+
+    def cancel(self):
+        """取消当前请求，返回是否有请求被取消"""
+        request = self._current
+        if request is None:
+            return False
+        self._abort(request)
+        self.cancelled += 1
+        print(f"[聊天] 已取消请求 {request.id}")
+        self.request_cancelled.emit(request.id)
+        return True
+
+    def _run(self, request):
+        """工作线程"""
+        response, error = None, None
+        handler = request.handler
+        cache = self.cache if self.cache is not None and self.cache.enabled else None
+        key, hit = None, None
+        try:
+            # 查缓存出错也要走到_done，否则请求会一直挂到超时
+            key = cache.key(handler, request.text) if cache is not None else None
+            hit = cache.get(key) if key is not None else None
+            start = time.perf_counter()
+            if hit is not None:
+                request.cached = hit
+                self._remember(handler, request.text, hit.text)
+                response = hit.text
+            elif getattr(handler, "stream", False) and hasattr(handler, "stream_response"):
+                response = self._read_stream(request, handler.stream_response(request.text))
+            else:
+                response = handler.get_response(request.text)
+        except Exception as e:
+            error = e
+        if hit is None and key is not None and error is None and response and not request.cancelled:
+            cache.put(key, request.text, response, (time.perf_counter() - start) * 1000)
+        self._done.emit(request, response, error)
+
+    @staticmethod
+    def _remember(handler, text, response):
+        """命中缓存时也把这一轮记进处理器的对话历史，之后的请求上下文不缺这一轮"""
+        history = getattr(handler, "history", None)
+        if history is not None:
+            history.add("user", text)
+            history.add("assistant", response)
+
+    def _read_stream(self, request, stream):
+        """工作线程：逐段读取流式回复，缓冲区由空变为非空时通知GUI线程"""
+        request.streamed = True
+        parts = []
+        try:
+            for piece in stream:
+                if request.cancelled:
+                    break
+                if not piece:
+                    continue
+                parts.append(piece)
+                if request.push(piece):
+                    self._chunk.emit(request)
+        finally:
+            stream.close()  # 提前结束时关闭连接
+        return "".join(parts)
+
+    def _on_chunk(self, request):
+        if request is not self._current or self._flush_job is not None:
+            return
+        # 每帧最多刷新一次界面，这一帧里后到的片段留到下一帧一起追加
+        due = max(self.clock.now(), self._last_flush + self.clock.frame_interval)
+        self._flush_job = self.clock.schedule_at(due, self._flush)
+
+    def _flush(self):
+        self._flush_job = None
+        request = self._current
+        if request is not None:
+            self._flush_request(request)
+
+    def _flush_request(self, request):
+        text = request.take()
+        if not text:
+            return
+        self._last_flush = self.clock.now()
+        first = request.updates == 0
+        if first:
+            self.stream_started.emit(request.id)
+        request.updates += 1
+        self.text_appended.emit(request.id, text)
+        if first:
+            request.first_visible_ms = (time.perf_counter() - request.started_at) * 1000
+        # 流式回复只要还在输出就不算超时
+        self.clock.cancel(request.timeout_job)
+        request.timeout_job = self.clock.schedule(self.TIMEOUT_MS, partial(self._on_timeout, request))
+
+    def _on_done(self, request, response, error):
+        if request is not self._current:
+            self.stale += 1
+            return
+        if request.streamed:
+            self.clock.cancel(self._flush_job)
+            self._flush_job = None
+            self._flush_request(request)  # 剩余的片段立即显示
+        self._finish(request)
+        self.last_latency_ms = (time.perf_counter() - request.started_at) * 1000
+        if error is not None and is_timeout(error):
+            self.timeouts += 1
+            self.request_timeout.emit(request.id)
+        elif error is not None:
+            self.failures += 1
+            self.request_failed.emit(request.id, str(error))
+        elif not response:
+            self.failures += 1
+            self.request_failed.emit(request.id, "未能获取响应")
+        elif request.streamed:
+            self.completed += 1
+            self.last_first_visible_ms = request.first_visible_ms
+            print(f"[聊天] 请求 {request.id} 首段文字 {request.first_visible_ms:.0f}ms "
+                  f"总用时 {self.last_latency_ms:.0f}ms ({request.pieces}个片段, 刷新{request.updates}次)")
+            self.stream_finished.emit(request.id, response)
+        elif request.cached is not None:
+            self.completed += 1
+            print(f"[聊天] 请求 {request.id} 命中缓存({request.cached.kind}) 用时 {self.last_latency_ms:.1f}ms，"
+                  f"节省约 {request.cached.latency_ms:.0f}ms / {request.cached.tokens} tokens")
+            self.response_ready.emit(request.id, response)
+        else:
+            self.completed += 1
+            print(f"[聊天] 请求 {request.id} 用时 {self.last_latency_ms:.0f}ms")
+            self.response_ready.emit(request.id, response)
+
+    def _on_timeout(self, request):
+        request.timeout_job = None
+        if request is not self._current:
+            return
+        self._abort(request)
+        self.timeouts += 1
+        self.request_timeout.emit(request.id)
+
+    def _abort(self, request):
+        self._finish(request)
+        request.cancelled = True
+        if not request.future.cancel():  # 已经在执行，让处理器尽快结束
+            cancel = getattr(request.handler, "cancel", None)
+            if cancel is not None:
+                try:
+                    cancel()
+                except Exception as e:
+                    print(f"[聊天] 取消请求出错: {str(e)}")
+
+    def _finish(self, request):
+        self.clock.cancel(request.timeout_job)
+        request.timeout_job = None
+        if self._current is request:
+            self._current = None
+            self.clock.cancel(self._flush_job)
+            self._flush_job = None
+
+    def shutdown(self):
+        """退出时取消请求，不等待网络调用返回"""
+        if self._current is not None:
+            self._abort(self._current)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "busy": self.busy(),
+            "completed": self.completed,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "stale": self.stale,
+            "last_latency_ms": self.last_latency_ms,
+            "last_first_visible_ms": self.last_first_visible_ms,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
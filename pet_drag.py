@@ -0,0 +1,105 @@
+from common_imports import *
+from collections import deque
+
+
+class DragController:
+    """合并拖动中的鼠标事件
+
+    高回报率鼠标每秒会产生几百个移动事件，这里只记下最新的目标位置，每帧最多
+    移动一次桌宠及其附属窗口（聊天窗口、时间框）：距上次移动已满一帧的事件立即
+    生效，否则由帧时钟在下一帧应用；同一帧里被后来者覆盖的事件计为合并丢弃。
+    鼠标不动时不占用时钟。
+    """
+    LATENCY_SAMPLES = 256   # 保留最近这么多次移动的延迟用于统计分位数
+
+    def __init__(self, pet, clock):
+        self.pet = pet
+        self.clock = clock
+        self.active = False
+        self._offset = QPoint()      # 按下点相对桌宠左上角的偏移
+        self._target = None          # 本帧待应用的位置
+        self._pending_since = 0      # 本帧第一个未应用事件的到达时间
+        self._ticking = False
+        self._last_apply = -1000
+        self._latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self.drags = 0
+        self.events = 0
+        self.moves = 0
+        self.coalesced = 0
+        self.max_latency = 0
+
+    def begin(self, global_pos):
+        self.active = True
+        self._offset = global_pos - self.pet.pos()
+        self._target = None
+        self.drags += 1
+        QToolTip.hideText()  # 气泡不跟随移动，拖动时先收起
+
+    def move(self, global_pos):
+        if not self.active:
+            return
+        self.events += 1
+        if self._target is None:
+            self._pending_since = self.clock.now()
+        else:
+            self.coalesced += 1
+        self._target = global_pos - self._offset
+        now = self.clock.now()
+        if now - self._last_apply >= self.clock.frame_interval:
+            self._apply(now)  # 距上次移动已满一帧，立即生效；否则留给下一帧
+        if not self._ticking:
+            self._ticking = True
+            self.clock.add_ticker(self._tick)
+
+    def end(self, global_pos=None):
+        """松开鼠标：立即应用最后的位置，停止占用时钟"""
+        if not self.active:
+            return
+        if global_pos is not None:
+            self.move(global_pos)
+        self._apply(self.clock.now())
+        self.active = False
+        self._stop_ticking()
+        stats = self.stats()
+        print(f"[拖动] 事件{stats['events']} 移动{stats['moves']} 合并{stats['coalesced']} "
+              f"延迟均值{stats['latency_avg_ms']:.1f}ms p95 {stats['latency_p95_ms']}ms")
+
+    def _tick(self, now):
+        since = now - self._last_apply
+        if self._target is None:
+            if since >= self.clock.frame_interval:
+                self._stop_ticking()  # 一帧内没有新事件，等下一个事件再订阅
+            return
+        if since >= self.clock.frame_interval - self.clock.COALESCE_MS:
+            self._apply(now)
+
+    def _apply(self, now):
+        target = self._target
+        if target is None:
+            return
+        self._target = None
+        self._last_apply = now
+        latency = now - self._pending_since
+        self._latencies.append(latency)
+        self.max_latency = max(self.max_latency, latency)
+        self.moves += 1
+        if target != self.pet.pos():
+            self.pet.move(target)
+            self.pet._move_attached_windows()
+
+    def _stop_ticking(self):
+        if self._ticking:
+            self._ticking = False
+            self.clock.remove_ticker(self._tick)
+
+    def stats(self):
+        samples = sorted(self._latencies)
+        return {
+            "drags": self.drags,
+            "events": self.events,
+            "moves": self.moves,
+            "coalesced": self.coalesced,
+            "latency_avg_ms": sum(samples) / len(samples) if samples else 0.0,
+            "latency_p95_ms": samples[int(len(samples) * 0.95)] if samples else 0,
+            "latency_max_ms": self.max_latency,
+        }
@@ -0,0 +1,483 @@
+﻿from common_imports import *
+from collections import OrderedDict
+from array import array
+from pet_sprite import SpriteFile, build_palette, index_image, indexed_bytes, indexed_image, opaque_bounds
+
+
+class FrameMask:
+    """一帧的1位不透明度位图（设备像素，LSB在前），命中测试只需一次字节查找"""
+    __slots__ = ("width", "height", "stride", "bits", "dpr")
+
+    def __init__(self, image, dpr=1.0):
+        # 不透明度不低于50%的像素记为1
+        mask = image.createAlphaMask(Qt.ThresholdAlphaDither)
+        if mask.format() != QImage.Format_MonoLSB:
+            mask = mask.convertToFormat(QImage.Format_MonoLSB)
+        self.width = mask.width()
+        self.height = mask.height()
+        self.stride = mask.bytesPerLine()
+        self.bits = mask.constBits().asstring(mask.sizeInBytes())
+        self.dpr = dpr
+
+    def hit(self, x, y):
+        """逻辑坐标(x, y)处是否不透明"""
+        px, py = int(x * self.dpr), int(y * self.dpr)
+        if px < 0 or py < 0 or px >= self.width or py >= self.height:
+            return False
+        return (self.bits[py * self.stride + (px >> 3)] >> (px & 7)) & 1 == 1
+
+
+def union_region(masks, logical_size):
+    """所有帧不透明区域的并集，返回逻辑坐标下的QRegion，用于窗口形状"""
+    if not masks:
+        return None
+    combined = 0
+    for mask in masks:
+        combined |= int.from_bytes(mask.bits, "little")
+    first = masks[0]
+    data = combined.to_bytes(len(first.bits), "little")
+    image = QImage(data, first.width, first.height, first.stride, QImage.Format_MonoLSB)
+    image.setColorTable([0xffffffff, 0xff000000])  # 与createAlphaMask一致：1为不透明
+    if image.size() != logical_size:
+        image = image.scaled(logical_size, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+    return QRegion(QBitmap.fromImage(image))
+
+
+class AnimationFrames:
+    """一个动画在某个尺寸和像素比下解码并缩放后的全部帧"""
+    __slots__ = ("name", "key", "frames", "delays", "size", "masks", "region", "nbytes")
+
+    def __init__(self, name, frames, delays, size, key=None, masks=None):
+        self.name = name
+        self.key = key or (name, size.width(), size.height(), 1.0)
+        self.frames = frames    # QPixmap列表，已经是显示尺寸
+        self.delays = delays    # array('H')，每帧停留的毫秒数
+        self.size = size
+        self.masks = masks or []                    # 每帧的FrameMask
+        self.region = union_region(self.masks, size)  # 所有帧不透明区域的并集
+        # 重复帧共用同一个QPixmap，只计算一次
+        self.nbytes = sum(f.width() * f.height() * f.depth() // 8 for f in {id(f): f for f in frames}.values()) + \
+            sum(len(m.bits) for m in {id(m): m for m in self.masks}.values())
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class CompactFrames:
+    """调色板索引的紧凑帧
+
+    接口和AnimationFrames相同。去重后的帧裁剪到不透明区域的并集，8位索引依次
+    存在一个bytearray里，frames[i] 被读取（即将绘制）时才展开成ARGB的QPixmap。
+    展开结果全局只缓存最近一帧，常驻内存约为ARGB帧的1/4，重复帧不再占空间。
+    """
+    __slots__ = ("name", "key", "delays", "size", "masks", "region", "nbytes", "frames",
+                 "palette", "crop", "pixel_size", "dpr", "frame_map", "_data", "expansions")
+    _last = (None, None)   # ((帧对象id, 去重帧序号), QPixmap)
+
+    def __init__(self, name, images, delays, size, key, dpr):
+        self.name = name
+        self.key = key
+        self.delays = delays
+        self.size = size
+        self.dpr = dpr
+        self.pixel_size = images[0].size()
+        self.palette = build_palette({id(image): image for image in images}.values())
+        width, height = self.pixel_size.width(), self.pixel_size.height()
+
+        unique, self.frame_map, seen, masks_by_unique = [], [], {}, []
+        for image in images:
+            data = indexed_bytes(index_image(image, self.palette))
+            if data not in seen:
+                seen[data] = len(unique)
+                unique.append(data)
+                masks_by_unique.append(FrameMask(image, dpr))
+            self.frame_map.append(seen[data])
+        self.masks = [masks_by_unique[i] for i in self.frame_map]
+        self.region = None  # QRegion只能在GUI线程创建，由FrameAtlas.finish补上
+
+        bounds = [b for b in (opaque_bounds(data, width, height) for data in unique) if b]
+        if bounds:
+            x0 = min(b[0] for b in bounds)
+            y0 = min(b[1] for b in bounds)
+            x1 = max(b[0] + b[2] for b in bounds)
+            y1 = max(b[1] + b[3] for b in bounds)
+            self.crop = (x0, y0, x1 - x0, y1 - y0)
+        else:
+            self.crop = (0, 0, 1, 1)
+        cx, cy, cw, ch = self.crop
+        self._data = bytearray()
+        for data in unique:
+            for y in range(cy, cy + ch):
+                self._data += data[y * width + cx:y * width + cx + cw]
+        self.frames = _ExpandedFrames(self)
+        self.expansions = 0
+        self.nbytes = len(self._data) + len(self.palette) * 4 + sum(len(m.bits) for m in masks_by_unique)
+
+    def __len__(self):
+        return len(self.frame_map)
+
+    def unique_count(self):
+        return len(self._data) // max(1, self.crop[2] * self.crop[3])
+
+    def expand(self, index):
+        """把第index帧展开成显示用的QPixmap"""
+        unique = self.frame_map[index]
+        cache_key, pixmap = CompactFrames._last
+        if cache_key == (id(self), unique):
+            return pixmap
+        cx, cy, cw, ch = self.crop
+        start = unique * cw * ch
+        crop = indexed_image(bytes(self._data[start:start + cw * ch]), cw, ch, self.palette)
+        if (cw, ch) == (self.pixel_size.width(), self.pixel_size.height()):
+            image = crop.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        else:
+            image = QImage(self.pixel_size, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.transparent)
+            painter = QPainter(image)
+            painter.drawImage(cx, cy, crop)
+            painter.end()
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(self.dpr)
+        self.expansions += 1
+        CompactFrames._last = ((id(self), unique), pixmap)
+        return pixmap
+
+
+class _ExpandedFrames:
+    """CompactFrames.frames：像QPixmap列表一样按下标取帧，取的时候才展开"""
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def __len__(self):
+        return len(self._owner.frame_map)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return self._owner.expand(index)
+
+
+class DecodeJob:
+    """一次解码：登记时记下来源和目标变体，run()只用QImage，可以在工作线程执行
+
+    token是登记时来源的版本，结果回到GUI线程时版本已变（换了皮肤、文件被替换、
+    切换紧凑存储）说明结果作废。
+    """
+    __slots__ = ("atlas", "name", "source", "key", "token", "size", "dpr", "compact",
+                 "frame_ms", "decoded", "origin", "error", "elapsed_ms")
+
+    def __init__(self, atlas, name, source):
+        self.atlas = atlas
+        self.name = name
+        self.source = source
+        self.key = atlas._key(name)
+        self.token = atlas.token(name)
+        self.size = QSize(atlas.size)
+        self.dpr = atlas.device_pixel_ratio
+        self.compact = atlas.compact
+        self.frame_ms = atlas._timings.get(name)
+        self.decoded = None   # CompactFrames，或 (QImage列表, 延迟, FrameMask列表)
+        self.origin = None    # 帧来源：GIF/缓存/精灵
+        self.error = None
+        self.elapsed_ms = 0.0
+
+    def run(self):
+        start = time.perf_counter()
+        self.decoded = self.atlas._decode_images(self)
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+
+
+class FrameAtlas:
+    """共享帧图集：每个GIF只解码一次、缩放一次，按内存预算LRU淘汰
+
+    同一个动画可以有多个尺寸/像素比的变体，以 (名称, 宽, 高, 像素比) 为键缓存。
+    切换桌宠大小或移到缩放比例不同的显示器时只切换当前变体，用过的变体留在LRU里，
+    切回去不需要重新缩放。
+
+    compact=True 时帧以调色板索引存放（CompactFrames），缩放改用最近邻以保持
+    GIF原有的颜色，也不读写ARGB磁盘缓存。
+
+    解码分两步：job(name).run() 只生成QImage，可以交给FrameLoader在工作线程执行；
+    finish(job) 在GUI线程转换成QPixmap并放入图集。get() 在当前线程依次完成两步。
+    """
+    MIN_DELAY = 20        # GIF里0ms之类的帧延迟按此处理
+    DEFAULT_DELAY = 100
+
+    def __init__(self, size=QSize(200, 200), budget_bytes=32 * 1024 * 1024,
+                 device_pixel_ratio=1.0, disk_cache=None, compact=False):
+        self.size = QSize(size)
+        self.compact = compact
+        self.budget_bytes = budget_bytes
+        self.device_pixel_ratio = device_pixel_ratio
+        self.disk_cache = disk_cache    # FrameDiskCache，为None时每次都解码GIF
+        self._entries = OrderedDict()   # (名称, 宽, 高, 像素比) -> AnimationFrames，按最近使用排序
+        self._sources = {}              # name -> GIF路径，或第一次解码时才调用的路径函数
+        self._timings = {}              # name -> 覆盖GIF自带延迟的帧时长
+        self._pinned = set()            # 常驻的动画名（只对当前变体生效）
+        self._generation = 0            # clear()时加一，进行中的解码全部作废
+        self._versions = {}             # name -> 来源版本，discard()时加一
+        self._resident = 0
+        self.decode_count = 0
+        self.evict_count = 0
+        self.variant_switches = 0
+
+    def _key(self, name):
+        return (name, self.size.width(), self.size.height(), self.device_pixel_ratio)
+
+    def set_variant(self, size, device_pixel_ratio):
+        """切换当前使用的尺寸和像素比，返回是否有变化"""
+        size = QSize(size)
+        if size == self.size and device_pixel_ratio == self.device_pixel_ratio:
+            return False
+        self.size = size
+        self.device_pixel_ratio = device_pixel_ratio
+        self.variant_switches += 1
+        return True
+
+    def set_compact(self, compact):
+        """切换紧凑存储，已解码的帧全部丢弃，返回是否有变化"""
+        if compact == self.compact:
+            return False
+        self.compact = compact
+        self.clear()
+        return True
+
+    def register(self, name, path, frame_ms=None):
+        """登记动画来源，不会立即解码；frame_ms为整数或逐帧列表时覆盖GIF自带的延迟"""
+        if self._sources.get(name) != path or self._timings.get(name) != frame_ms:
+            self.discard(name)
+        self._sources[name] = path
+        if frame_ms is None:
+            self._timings.pop(name, None)
+        else:
+            self._timings[name] = frame_ms
+
+    def reset(self):
+        """丢弃所有来源、常驻设置和已解码的帧（切换皮肤时使用）"""
+        self.clear()
+        self._sources.clear()
+        self._timings.clear()
+        self._pinned.clear()
+
+    def names(self):
+        return list(self._sources)
+
+    def pin(self, name):
+        """常驻动画（例如idle）不参与淘汰"""
+        self._pinned.add(name)
+
+    def get(self, name):
+        """取动画帧，没有时在当前线程解码；失败返回None"""
+        entry = self.lookup(name)
+        if entry is not None:
+            return entry
+        job = self.job(name)
+        if job is None:
+            return None
+        job.run()
+        return self.finish(job)
+
+    def lookup(self, name):
+        """取当前变体已解码的帧，没有时返回None，不会解码"""
+        key = self._key(name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def contains(self, name):
+        """当前变体是否已解码"""
+        return self._key(name) in self._entries
+
+    def has_source(self, name):
+        return name in self._sources
+
+    def token(self, name):
+        """来源版本，解码结果回来时用来判断是否已经作废"""
+        return (self._generation, self._versions.get(name, 0))
+
+    def job(self, name):
+        """为当前变体创建解码任务，没有登记来源时返回None"""
+        source = self._sources.get(name)
+        return DecodeJob(self, name, source) if source else None
+
+    def finish(self, job, evict=True):
+        """GUI线程：把解码结果转换成显示用的帧并放入图集
+
+        结果已作废或解码失败时返回None；evict=False 用于预取，放不下时不挤掉已有的帧。
+        """
+        decoded = job.decoded
+        if decoded is None or job.token != self.token(job.name):
+            return None
+        start = time.perf_counter()
+        size, dpr = job.size, job.dpr
+        if job.compact:
+            entry = decoded
+            entry.region = union_region(entry.masks, size)
+            detail = f"{len(entry)}帧/去重{entry.unique_count()} {len(entry.palette)}色"
+            origin = f"{job.origin}, 紧凑"
+        else:
+            images, delays, masks = decoded
+            frames = []
+            shared = {}  # 精灵文件里重复的帧是同一个QImage，只转换一次
+            for image in images:
+                pixmap = shared.get(id(image))
+                if pixmap is None:
+                    pixmap = shared[id(image)] = QPixmap.fromImage(image)
+                    pixmap.setDevicePixelRatio(dpr)
+                frames.append(pixmap)
+            entry = AnimationFrames(job.name, frames, delays, QSize(size), job.key, masks)
+            detail = f"{len(frames)}帧"
+            origin = job.origin
+        if not evict and not self._fits(entry):
+            print(f"[帧图集] 预取 {job.name} 超出内存预算，等播放时再解码")
+            return None
+        self.decode_count += 1
+        self._store(entry)
+        print(f"[帧图集] 加载 {job.name} {size.width()}x{size.height()}@{dpr:g}({origin}): {detail} "
+              f"{entry.nbytes // 1024}KB 解码{job.elapsed_ms:.1f}ms 转换{(time.perf_counter() - start) * 1000:.1f}ms")
+        return entry
+
+    def _decode_images(self, job):
+        """解码并缩放到job的变体，只使用QImage（线程安全）；失败返回None"""
+        name = job.name
+        path = job.source() if callable(job.source) else job.source
+        if not path or not os.path.exists(path):
+            print(f"动画文件不存在 {name}: {path}")
+            return None
+        dpr = job.dpr
+        pixel_size = job.size * dpr
+        transform = Qt.FastTransformation if job.compact else Qt.SmoothTransformation
+
+        job.origin = "缓存"
+        is_sprite = path.lower().endswith(SpriteFile.SUFFIX)
+        use_cache = self.disk_cache and not is_sprite and not job.compact
+        cached = self.disk_cache.load(path, pixel_size.width(), pixel_size.height(), dpr) \
+            if use_cache else None
+        if is_sprite:
+            # 精灵文件本身就是快速格式，不再写磁盘缓存
+            job.origin = "精灵"
+            images, delays = self._decode_sprite(name, path, pixel_size, transform)
+            if not images:
+                return None
+        elif cached:
+            images, delays = cached
+        else:
+            job.origin = "GIF"
+            images, delays = self._decode_gif(name, path, pixel_size, transform)
+            if not images:
+                return None
+            if use_cache:
+                self.disk_cache.store(path, pixel_size.width(), pixel_size.height(), dpr, images, delays)
+        if job.frame_ms is not None:
+            delays = self._frame_delays(job.frame_ms, len(images), delays)
+
+        if job.compact:
+            return CompactFrames(name, images, delays, QSize(job.size), job.key, dpr)
+        masks = []
+        shared = {}
+        for image in images:
+            mask = shared.get(id(image))
+            if mask is None:
+                mask = shared[id(image)] = FrameMask(image, dpr)  # 解码时顺便生成命中测试位图
+            masks.append(mask)
+        return images, delays, masks
+
+    def _frame_delays(self, frame_ms, count, fallback):
+        """把清单里的帧时长展开成每帧的延迟，列表不够长时剩余帧沿用GIF的延迟"""
+        if isinstance(frame_ms, (int, float)):
+            frame_ms = [frame_ms] * count
+        delays = array('H', fallback)
+        for i, ms in enumerate(frame_ms[:count]):
+            delays[i] = min(65535, max(self.MIN_DELAY, int(ms)))
+        return delays
+
+    def _decode_sprite(self, name, path, pixel_size, transform=Qt.SmoothTransformation):
+        """读取gif2sprite生成的.pspr，重复帧返回同一个QImage"""
+        try:
+            sprite = SpriteFile.load(path)
+        except (OSError, ValueError) as e:
+            print(f"无法读取精灵 {name}: {e}")
+            return [], None
+        delays = array('H', (max(self.MIN_DELAY, d) for d in sprite.delays))
+        return SpriteFile.render(sprite, pixel_size, transform), delays
+
+    def _decode_gif(self, name, path, pixel_size, transform=Qt.SmoothTransformation):
+        """解码GIF并缩放到目标像素尺寸，返回 (QImage列表, 延迟数组)"""
+        reader = QImageReader(path)
+        if not reader.canRead():
+            print(f"无法解码动画 {name}: {reader.errorString()}")
+            return [], None
+
+        images = []
+        delays = array('H')
+        while True:
+            image = reader.read()
+            if image.isNull():
+                break
+            delay = reader.nextImageDelay()
+            delays.append(min(65535, max(self.MIN_DELAY, delay if delay > 0 else self.DEFAULT_DELAY)))
+            if image.size() != pixel_size:
+                image = image.scaled(pixel_size, Qt.IgnoreAspectRatio, transform)
+            images.append(image.convertToFormat(QImage.Format_ARGB32_Premultiplied))
+            if not reader.canRead():
+                break
+
+        if not images:
+            print(f"动画没有可用帧 {name}: {reader.errorString()}")
+        return images, delays
+
+    def _fits(self, entry):
+        """不淘汰其他帧能否放下entry"""
+        held = self._entries.get(entry.key)
+        return self._resident - (held.nbytes if held else 0) + entry.nbytes <= self.budget_bytes
+
+    def _store(self, entry):
+        self._drop(entry.key)
+        self._entries[entry.key] = entry
+        self._resident += entry.nbytes
+        self._enforce_budget(keep=entry.key)
+
+    def _enforce_budget(self, keep=None):
+        for key in list(self._entries):
+            if self._resident <= self.budget_bytes:
+                break
+            if key == keep or (key[0] in self._pinned and key == self._key(key[0])):
+                continue
+            self._drop(key)
+            self.evict_count += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._resident -= entry.nbytes
+
+    def discard(self, name):
+        """丢弃某个动画所有变体的帧（下次使用时重新解码），进行中的解码作废"""
+        self._versions[name] = self._versions.get(name, 0) + 1
+        for key in [k for k in self._entries if k[0] == name]:
+            self._drop(key)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._resident = 0
+
+    def resident_bytes(self):
+        """当前常驻的帧数据字节数"""
+        return self._resident
+
+    def stats(self):
+        return {
+            "resident_bytes": self._resident,
+            "budget_bytes": self.budget_bytes,
+            "variant": f"{self.size.width()}x{self.size.height()}@{self.device_pixel_ratio:g}",
+            "animations": {f"{k[0]}@{k[1]}x{k[2]}@{k[3]:g}": {"frames": len(e), "bytes": e.nbytes}
+                           for k, e in self._entries.items()},
+            "decodes": self.decode_count,
+            "evictions": self.evict_count,
+            "variant_switches": self.variant_switches,
+            "compact": self.compact,
+        }
@@ -0,0 +1,138 @@
+from common_imports import *
+from array import array
+import hashlib
+import mmap
+import struct
+
+
+class FrameDiskCache:
+    """解码后帧的磁盘缓存
+
+    每个缓存文件保存一个动画缩放后的全部ARGB32帧和帧延迟，热启动时直接mmap读取，
+    不再解码GIF。文件名包含GIF内容哈希、目标尺寸和设备像素比，替换GIF后哈希变化，
+    旧文件会在写入新缓存时自动删除。
+    """
+    MAGIC = b"PFRM"
+    VERSION = 1
+    # magic, version, 宽, 高, 帧数, 每行字节数, 设备像素比
+    HEADER = struct.Struct("<4sHHHHId")
+    SUFFIX = ".frames"
+
+    def __init__(self, cache_dir=Path("cache") / "frames"):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _source_id(path):
+        return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:10]
+
+    @staticmethod
+    def content_hash(path):
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:16]
+
+    def _variant(self, width, height, dpr):
+        return f"{width}x{height}@{dpr:g}"
+
+    def entry_path(self, path, width, height, dpr, digest=None):
+        """缓存文件路径：来源_内容哈希_尺寸@像素比"""
+        digest = digest or self.content_hash(path)
+        name = f"{self._source_id(path)}_{digest}_{self._variant(width, height, dpr)}{self.SUFFIX}"
+        return self.cache_dir / name
+
+    def load(self, path, width, height, dpr=1.0):
+        """读取缓存，返回 (QImage列表, 延迟数组)，没有或损坏时返回None
+
+        返回的QImage都已复制出来，不再引用映射的文件。
+        """
+        try:
+            entry = self.entry_path(path, width, height, dpr)
+        except OSError:
+            return None
+        if not entry.exists():
+            self.misses += 1
+            return None
+        try:
+            with open(entry, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                result = self._read(mapped, width, height)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[帧缓存] 读取失败 {entry.name}: {e}")
+            result = None
+        if result is None:
+            self.misses += 1
+            self._remove(entry)
+            return None
+        self.hits += 1
+        return result
+
+    def _read(self, mapped, width, height):
+        magic, version, w, h, count, bytes_per_line, _dpr = self.HEADER.unpack_from(mapped, 0)
+        if magic != self.MAGIC or version != self.VERSION or (w, h) != (width, height):
+            return None
+        delays = array('H')
+        delays.frombytes(mapped[self.HEADER.size:self.HEADER.size + count * 2])
+        offset = self._data_offset(count)
+        frame_bytes = bytes_per_line * h
+        if len(mapped) < offset + frame_bytes * count:
+            return None
+
+        images = []
+        view = memoryview(mapped)
+        try:
+            for i in range(count):
+                start = offset + i * frame_bytes
+                chunk = view[start:start + frame_bytes]
+                image = QImage(chunk, w, h, bytes_per_line, QImage.Format_ARGB32_Premultiplied)
+                images.append(image.copy())  # 复制后才能关闭映射
+                del image
+                chunk.release()
+        finally:
+            view.release()
+        return images, delays
+
+    def _data_offset(self, count):
+        # 帧数据按16字节对齐
+        return (self.HEADER.size + count * 2 + 15) & ~15
+
+    def store(self, path, width, height, dpr, images, delays):
+        """写入缓存，并删除同一来源、同一尺寸的旧缓存"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            digest = self.content_hash(path)
+            entry = self.entry_path(path, width, height, dpr, digest)
+            images = [img.convertToFormat(QImage.Format_ARGB32_Premultiplied) for img in images]
+            bytes_per_line = images[0].bytesPerLine()
+
+            tmp = entry.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, width, height,
+                                         len(images), bytes_per_line, dpr))
+                f.write(array('H', delays).tobytes())
+                f.write(b"\0" * (self._data_offset(len(images)) - f.tell()))
+                for image in images:
+                    f.write(image.constBits().asstring(image.sizeInBytes()))
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"[帧缓存] 写入失败 {path}: {e}")
+            return
+        self._prune(path, width, height, dpr, keep=entry)
+
+    def _prune(self, path, width, height, dpr, keep):
+        """删除同一GIF旧内容的缓存（用户替换了GIF）"""
+        prefix = self._source_id(path) + "_"
+        variant = "_" + self._variant(width, height, dpr) + self.SUFFIX
+        for old in self.cache_dir.glob(prefix + "*" + self.SUFFIX):
+            if old != keep and old.name.endswith(variant):
+                self._remove(old)
+
+    def _remove(self, entry):
+        try:
+            entry.unlink()
+            print(f"[帧缓存] 删除过期缓存 {entry.name}")
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in self.cache_dir.glob("*" + self.SUFFIX):
+            self._remove(entry)
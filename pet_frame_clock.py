@@ -0,0 +1,198 @@
+from common_imports import *
+import heapq
+
+
+class FrameClock(QObject):
+    """全局唯一的帧时钟
+
+    所有精灵帧切换、位移补间和定时任务都由同一个QTimer驱动：定时器只在最近的
+    截止时间唤醒一次，同一次唤醒里先执行到期任务、再调用逐帧订阅（运动引擎等）、
+    最后统一刷新画面，没有任务时定时器完全停止。
+    """
+    FRAME_INTERVAL = 16   # 有逐帧订阅时的唤醒间隔(ms)
+    COALESCE_MS = 4       # 截止时间相差不到这么多的任务合并到同一次唤醒
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._elapsed = QElapsedTimer()
+        self._elapsed.start()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+        self._jobs = []            # 堆: (截止时间, 序号, 回调)
+        self._live_jobs = set()    # 未取消的任务序号
+        self._seq = 0
+        self._tickers = []         # 每帧回调 callback(now_ms)
+        self._repaints = {}        # key -> 回调，同一次唤醒里只执行一次
+        self._in_tick = False
+        self.frame_interval = self.FRAME_INTERVAL  # 省电模式下会调大
+
+        self.wakeups = 0
+        self.repaints = 0
+        self.coalesced_repaints = 0
+        self._stats_start = self.now()
+
+    def now(self):
+        """时钟启动以来的毫秒数"""
+        return self._elapsed.elapsed()
+
+    # ---- 定时任务 ----
+    def schedule(self, delay_ms, callback):
+        """delay_ms毫秒后执行一次callback，返回可用于cancel的句柄"""
+        return self.schedule_at(self.now() + max(0, int(delay_ms)), callback)
+
+    def schedule_at(self, due_ms, callback):
+        self._seq += 1
+        heapq.heappush(self._jobs, (due_ms, self._seq, callback))
+        self._live_jobs.add(self._seq)
+        self._rearm()
+        return self._seq
+
+    def cancel(self, handle):
+        if handle is not None:
+            self._live_jobs.discard(handle)
+
+    def is_pending(self, handle):
+        return handle in self._live_jobs
+
+    # ---- 逐帧订阅 ----
+    def add_ticker(self, callback):
+        if callback not in self._tickers:
+            self._tickers.append(callback)
+            self._rearm()
+
+    def remove_ticker(self, callback):
+        if callback in self._tickers:
+            self._tickers.remove(callback)
+
+    # ---- 画面刷新 ----
+    def request_repaint(self, key, callback):
+        """请求在本次（或下一次）唤醒末尾刷新，同一个key多次请求只执行最后一次"""
+        if key in self._repaints:
+            self.coalesced_repaints += 1
+        self._repaints[key] = callback
+        if not self._in_tick:
+            self._rearm(0)
+
+    # ---- 调度 ----
+    def _next_due(self):
+        while self._jobs and self._jobs[0][1] not in self._live_jobs:
+            heapq.heappop(self._jobs)
+        due = self._jobs[0][0] if self._jobs else None
+        if self._tickers:
+            frame_due = self.now() + self.frame_interval
+            due = frame_due if due is None else min(due, frame_due)
+        return due
+
+    def _rearm(self, delay=None):
+        if self._in_tick:
+            return  # 唤醒结束时统一重新设置
+        if delay is None:
+            due = self._next_due()
+            if due is None:
+                self._timer.stop()
+                return
+            delay = max(0, due - self.now())
+        if self._timer.isActive() and self._timer.remainingTime() <= delay:
+            return
+        self._timer.start(delay)
+
+    def _tick(self):
+        self.wakeups += 1
+        self._in_tick = True
+        try:
+            now = self.now()
+            self._run_jobs(now + self.COALESCE_MS)
+            for ticker in list(self._tickers):
+                try:
+                    ticker(now)
+                except Exception as e:
+                    print(f"[帧时钟] 逐帧回调出错: {str(e)}")
+            self._flush_repaints()
+        finally:
+            self._in_tick = False
+        if self._repaints:
+            self._rearm(0)
+        else:
+            self._rearm()
+
+    def _run_jobs(self, horizon):
+        last_seq = self._seq
+        deferred = []
+        while self._jobs and self._jobs[0][0] <= horizon:
+            job = heapq.heappop(self._jobs)
+            _due, seq, callback = job
+            if seq not in self._live_jobs:
+                continue
+            if seq > last_seq:
+                deferred.append(job)  # 本次唤醒中新加的任务留到下一次，避免0ms任务死循环
+                continue
+            self._live_jobs.discard(seq)
+            try:
+                callback()
+            except Exception as e:
+                print(f"[帧时钟] 任务出错: {str(e)}")
+        for job in deferred:
+            heapq.heappush(self._jobs, job)
+
+    def _flush_repaints(self):
+        repaints, self._repaints = self._repaints, {}
+        for callback in repaints.values():
+            self.repaints += 1
+            try:
+                callback()
+            except Exception as e:
+                print(f"[帧时钟] 刷新出错: {str(e)}")
+
+    def stats(self):
+        seconds = max(0.001, (self.now() - self._stats_start) / 1000)
+        return {
+            "wakeups": self.wakeups,
+            "wakeups_per_sec": self.wakeups / seconds,
+            "repaints": self.repaints,
+            "coalesced_repaints": self.coalesced_repaints,
+            "pending_jobs": len(self._live_jobs),
+            "tickers": len(self._tickers),
+        }
+
+
+class ClockTimer(QObject):
+    """接口与QTimer相同的定时器，但由FrameClock统一唤醒"""
+    timeout = pyqtSignal()
+
+    def __init__(self, clock, parent=None):
+        super().__init__(parent)
+        self._clock = clock
+        self._interval = 0
+        self._single_shot = False
+        self._handle = None
+
+    def setInterval(self, msec):
+        self._interval = int(msec)
+
+    def interval(self):
+        return self._interval
+
+    def setSingleShot(self, single_shot):
+        self._single_shot = single_shot
+
+    def start(self, msec=None):
+        if msec is not None:
+            self._interval = int(msec)
+        self._clock.cancel(self._handle)
+        self._handle = self._clock.schedule(self._interval, self._fire)
+
+    def stop(self):
+        self._clock.cancel(self._handle)
+        self._handle = None
+
+    def isActive(self):
+        return self._clock.is_pending(self._handle)
+
+    def _fire(self):
+        self._handle = None
+        if not self._single_shot:
+            self._handle = self._clock.schedule(self._interval, self._fire)
+        self.timeout.emit()
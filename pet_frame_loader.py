@@ -0,0 +1,178 @@
+from common_imports import *
+import heapq
+
+
+class _DecodeRunnable(QRunnable):
+    """在线程池里执行一个DecodeJob，完成后通过加载器的信号交回GUI线程"""
+
+    def __init__(self, job, done):
+        super().__init__()
+        self.job = job
+        self._done = done
+
+    def run(self):
+        try:
+            self.job.run()
+        except Exception as e:
+            self.job.decoded = None
+            self.job.error = str(e)
+        self._done.emit(self.job)
+
+
+class FrameLoader(QObject):
+    """后台解码动画帧
+
+    GIF读取、缩放、磁盘缓存和命中测试位图都在线程池里完成（只用QImage），
+    结果通过信号排队回到GUI线程，由FrameAtlas.finish转换成QPixmap。
+    优先级越大越先解码；同一个动画同时只有一个任务，再次请求时只提高优先级。
+    排队由这里的堆维护，线程池里只放正在执行的任务（QThreadPool自己的优先级
+    队列在有空闲线程时不保证顺序）。
+    另外监视动画文件，文件被替换后发出sources_changed，由调用方决定如何重新加载。
+    """
+    loaded = pyqtSignal(str)               # 动画名，帧已放入图集
+    failed = pyqtSignal(str)               # 动画名，解码失败
+    sources_changed = pyqtSignal(list)     # 文件被修改或替换的动画名
+    _decoded = pyqtSignal(object)          # 工作线程 -> GUI线程
+
+    URGENT = 1000          # 正在等待播放的动画
+    MAX_THREADS = 2
+    WATCH_DELAY_MS = 300   # 文件变化后等写完再重新解码
+
+    def __init__(self, atlas, parent=None):
+        super().__init__(parent)
+        self.atlas = atlas
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(self.MAX_THREADS, QThread.idealThreadCount())))
+        self._inflight = {}   # 动画名 -> [任务, 优先级, 是否预取, 是否已开始]
+        self._queue = []      # 堆: (-优先级, 序号, 动画名)，过时的条目出堆时跳过
+        self._seq = 0
+        self._running = 0
+        self._decoded.connect(self._on_decoded)
+        self.completed = 0
+        self.failures = 0
+        self.dropped = 0      # 来源已变化而作废的结果
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._watched = {}    # 绝对路径 -> 使用该文件的动画名
+        self._changed = set()
+        self._watch_timer = QTimer(self)
+        self._watch_timer.setSingleShot(True)
+        self._watch_timer.timeout.connect(self._apply_changes)
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    # ---- 解码 ----
+    def request(self, name, priority=0, prefetch=False):
+        """请求在后台解码当前变体，已解码时返回False
+
+        prefetch=True 的结果放不下时不挤掉已有的帧；之后被当作非预取请求时会改为可以淘汰。
+        """
+        if self.atlas.contains(name):
+            return False
+        record = self._inflight.get(name)
+        if record is not None:
+            job = record[0]
+            if job.key == self.atlas._key(name) and job.token == self.atlas.token(name):
+                record[2] = record[2] and prefetch
+                if priority > record[1] and not record[3]:
+                    record[1] = priority
+                    self._push(name, priority)
+                return True
+            # 变体或来源已变：换成新任务，旧任务的结果回来时会被丢弃
+        job = self.atlas.job(name)
+        if job is None:
+            return False
+        self._inflight[name] = [job, priority, prefetch, False]
+        self._push(name, priority)
+        self._pump()
+        return True
+
+    def pending(self, name):
+        return name in self._inflight
+
+    def _push(self, name, priority):
+        self._seq += 1
+        heapq.heappush(self._queue, (-priority, self._seq, name))
+
+    def _pump(self):
+        """线程有空闲时按优先级取出任务执行"""
+        while self._queue and self._running < self.pool.maxThreadCount():
+            neg_priority, _seq, name = heapq.heappop(self._queue)
+            record = self._inflight.get(name)
+            if record is None or record[3] or record[1] != -neg_priority:
+                continue  # 已完成、已开始或优先级已提高的旧条目
+            record[3] = True
+            self._running += 1
+            self.pool.start(_DecodeRunnable(record[0], self._decoded))
+
+    def _on_decoded(self, job):
+        self._running -= 1
+        self._pump()
+        record = self._inflight.get(job.name)
+        if record is None or record[0] is not job:
+            self.dropped += 1  # 已经被新的任务取代
+            return
+        del self._inflight[job.name]
+        _job, priority, prefetch, _started = record
+        if job.token != self.atlas.token(job.name):
+            self.dropped += 1
+            if not prefetch:
+                self.request(job.name, priority)  # 有人在等这个动画，按新的来源重新解码
+            return
+        if job.error:
+            print(f"[帧图集] 后台解码出错 {job.name}: {job.error}")
+        if job.decoded is None:
+            self.failures += 1
+            self.failed.emit(job.name)
+            return
+        if self.atlas.finish(job, evict=not prefetch) is not None:
+            self.completed += 1
+            self.loaded.emit(job.name)
+
+    def shutdown(self):
+        """退出前丢弃排队的任务并等待正在执行的任务结束"""
+        self._queue.clear()
+        self._inflight.clear()
+        self.pool.waitForDone(2000)
+
+    # ---- 文件监视 ----
+    def watch(self, paths):
+        """监视动画文件，paths: 文件路径 -> 使用它的动画名列表"""
+        files = self._watcher.files()
+        if files:
+            self._watcher.removePaths(files)
+        self._watched = {os.path.abspath(path): list(names)
+                         for path, names in paths.items() if path and os.path.exists(path)}
+        if self._watched:
+            self._watcher.addPaths(list(self._watched))
+
+    def _on_file_changed(self, path):
+        self._changed.add(path)
+        self._watch_timer.start(self.WATCH_DELAY_MS)
+
+    def _apply_changes(self):
+        names = []
+        watching = set(self._watcher.files())
+        for path in self._changed:
+            # 编辑器保存时常常先删除再创建，监视随旧文件失效，需要重新添加
+            if path not in watching and os.path.exists(path):
+                self._watcher.addPath(path)
+            names.extend(n for n in self._watched.get(path, ()) if n not in names)
+        self._changed.clear()
+        if names:
+            print(f"[帧图集] 动画文件已更新: {', '.join(names)}")
+            self.sources_changed.emit(names)
+
+    def stats(self):
+        return {
+            "threads": self.pool.maxThreadCount(),
+            "inflight": len(self._inflight),
+            "running": self._running,
+            "completed": self.completed,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "watched": len(self._watched),
+        }
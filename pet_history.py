@@ -0,0 +1,149 @@
+from common_imports import *
+import re
+
+
+_CJK = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_SPACES = re.compile(r"\s+")
+
+# 每次请求发送的上下文（系统提示+摘要+对话）的token预算，按模型名里的关键字匹配。
+# 桌宠的回答都很短，预算远小于模型的上下文窗口，目的是让请求大小和延迟不随对话变长而增长
+CONTEXT_BUDGETS = (
+    ("lite", 1024),      # 讯飞星火Lite
+    ("free", 2048),
+    ("mini", 2048),
+    ("gpt-3.5", 2048),
+)
+DEFAULT_BUDGET = 3072
+MESSAGE_OVERHEAD = 4     # 每条消息的角色和分隔符大约占用的token
+
+
+def estimate_tokens(text):
+    """粗略估计token数：中日韩字符每字约1个，其余每4个字符约1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def context_budget(model):
+    """模型的上下文预算"""
+    model = (model or "").lower()
+    for keyword, budget in CONTEXT_BUDGETS:
+        if keyword in model:
+            return budget
+    return DEFAULT_BUDGET
+
+
+class ConversationHistory:
+    """两个API处理器共用的对话历史
+
+    每条消息加入时计算一次token数，总数增量维护。超出预算时从最早的消息开始删除，
+    最新的用户消息总会保留。被删掉的提问可以压缩成一句简短摘要（“之前聊过：…”），
+    附在系统提示后面，摘要本身也有预算，超出时丢掉最早的话题。
+    所以不管对话多长，每次请求的大小都有上限。
+    """
+    SUMMARY_BUDGET = 96
+    SUMMARY_ITEM_CHARS = 24
+
+    def __init__(self, system_prompt, budget=DEFAULT_BUDGET, summarize=True):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.summarize = summarize
+        self._messages = []     # {"role", "content"}
+        self._tokens = []       # 与_messages对应的token数
+        self._total = 0
+        self._topics = []       # 被删掉的提问摘要
+        self._summary = ""
+        self._fixed = self._count(self.system_prompt)  # 系统提示加摘要
+        self.evicted = 0
+
+    @staticmethod
+    def _count(text):
+        return estimate_tokens(text) + MESSAGE_OVERHEAD
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def tokens(self):
+        """messages() 的估计token数"""
+        return self._fixed + self._total
+
+    def use_model(self, model):
+        """按模型设置预算"""
+        self.set_budget(context_budget(model))
+
+    def set_budget(self, budget):
+        if budget != self.budget:
+            self.budget = budget
+            self.trim()
+
+    def add(self, role, content):
+        """加入一条消息，超出预算时删除最早的消息"""
+        tokens = self._count(content)
+        self._messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self._total += tokens
+        self.trim()
+
+    def discard_unanswered(self):
+        """请求失败或被取消时删掉末尾还没有回复的用户消息，下次请求不会出现连续两条用户消息"""
+        if self._messages and self._messages[-1]["role"] == "user":
+            self._total -= self._tokens.pop()
+            self._messages.pop()
+
+    def trim(self):
+        # 至少保留最后一条用户消息及其之后的内容
+        keep = len(self._messages)
+        for i in range(len(self._messages) - 1, -1, -1):
+            if self._messages[i]["role"] == "user":
+                keep = len(self._messages) - i
+                break
+        while self.tokens > self.budget and len(self._messages) > keep:
+            # 按轮删除：提问和它后面的回复一起删，保留的对话不会以回复开头
+            message = self._pop()
+            while len(self._messages) > keep and self._messages[0]["role"] != "user":
+                self._pop()
+            if self.summarize and message["role"] == "user":
+                self._add_topic(message["content"])
+
+    def _pop(self):
+        self._total -= self._tokens.pop(0)
+        self.evicted += 1
+        return self._messages.pop(0)
+
+    def _add_topic(self, text):
+        topic = _SPACES.sub(" ", text).strip()[:self.SUMMARY_ITEM_CHARS]
+        if not topic:
+            return
+        self._topics.append(topic)
+        while len(self._topics) > 1 and estimate_tokens("；".join(self._topics)) > self.SUMMARY_BUDGET:
+            self._topics.pop(0)
+        self._summary = "之前聊过：" + "；".join(self._topics)
+        self._fixed = self._count(self._system_content())
+
+    def _system_content(self):
+        if not self._summary:
+            return self.system_prompt
+        return f"{self.system_prompt}\n{self._summary}"
+
+    def messages(self):
+        """发送给API的消息列表：系统提示（附摘要）加保留的对话"""
+        return [{"role": "system", "content": self._system_content()}] + [dict(m) for m in self._messages]
+
+    def clear(self):
+        self._messages.clear()
+        self._tokens.clear()
+        self._total = 0
+        self._topics.clear()
+        self._summary = ""
+        self._fixed = self._count(self.system_prompt)
+
+    def stats(self):
+        return {
+            "messages": len(self._messages),
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "evicted": self.evicted,
+            "summary_topics": len(self._topics),
+        }
@@ -1,5 +1,5 @@
 ﻿from common_imports import *
-import datetime
+from datetime import datetime
 
 class PetInput:
     def __init__(self, pet_widget):
@@ -11,8 +11,16 @@ class PetInput:
         self.current_conversation_id = None
 
     def setup_input(self):
+        # 输入框和回复框放在跟随桌宠的独立小窗口里，显示/隐藏时不影响桌宠窗口
+        self.window = QWidget(self.pet_widget, Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.window.setAttribute(Qt.WA_TranslucentBackground)
+        self.layout = QVBoxLayout(self.window)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(5)
+        self.layout.setSizeConstraint(QLayout.SetFixedSize)
+
         # 创建输入框
-        self.input_box = QLineEdit(self.pet_widget)
+        self.input_box = QLineEdit(self.window)
         self.input_box.setPlaceholderText("要问我什么呢...")
         self.input_box.setStyleSheet("""
             QLineEdit {
@@ -25,7 +33,7 @@ class PetInput:
         """)
     
         # 创建响应框
-        self.response_box = QTextEdit(self.pet_widget)
+        self.response_box = QTextEdit(self.window)
         self.response_box.setReadOnly(True)
         self.response_box.setStyleSheet("""
             QTextEdit {
@@ -40,18 +48,33 @@ class PetInput:
         self.response_box.setLineWrapMode(QTextEdit.WidgetWidth)  # 自动换行
         self.response_box.hide()
     
+        # 等待回复时按Esc取消请求
+        self.cancel_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self.window)
+        self.cancel_shortcut.setContext(Qt.WidgetWithChildrenShortcut)
+        self.cancel_shortcut.activated.connect(self.pet_widget.cancel_chat)
+
         self.input_box.hide()
+        self.layout.addWidget(self.input_box, 0, Qt.AlignCenter)
+        self.layout.addWidget(self.response_box, 0, Qt.AlignCenter)
 
     def adjust_window_size(self):
-        base_width = max(250, self.pet_widget.pet_image.width())  # 确保足够宽度
-        height = self.pet_widget.pet_image.height()
-    
-        if not self.input_box.isHidden():
-            height += self.input_box.height() + 10
-        if not self.response_box.isHidden():
-            height += self.response_box.height() + 10
-    
-        self.pet_widget.resize(base_width, height)
+        """根据显示的控件调整聊天窗口，都隐藏时关闭窗口"""
+        if self.input_box.isHidden() and self.response_box.isHidden():
+            self.window.hide()
+            return
+        self.window.adjustSize()
+        self.update_position()
+        if not self.window.isVisible():
+            self.window.show()
+
+    def update_position(self):
+        """把聊天窗口放在桌宠正下方"""
+        if self.input_box.isHidden() and self.response_box.isHidden():
+            return
+        pet = self.pet_widget
+        size = self.window.sizeHint()
+        pos = QPoint(pet.x() + (pet.width() - size.width()) // 2, pet.y() + pet.height() + 5)
+        self.window.move(pet.screens.clamp(pos, size))
 
     def toggle_input(self):
         if self.input_box.isHidden():
@@ -61,8 +84,9 @@ class PetInput:
 
     def show_input(self):
         self.input_box.show()
-        self.input_box.setFocus()
         self.adjust_window_size()
+        self.window.activateWindow()
+        self.input_box.setFocus()
 
     def hide_input(self):
         self.input_box.hide()
@@ -82,6 +106,32 @@ class PetInput:
         self.conversation_history.append(("assistant", text))
         self.save_conversation()
 
+    def begin_stream(self):
+        """开始流式回复：清空回复框，之后的文字逐段追加"""
+        if not self.current_conversation_id:
+            self.current_conversation_id = int(time.time())
+        self.response_box.clear()
+        self.response_box.show()
+        self.adjust_window_size()
+
+    def append_response(self, text):
+        """在回复末尾追加文字并滚动到最新内容"""
+        cursor = self.response_box.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.response_box.setTextCursor(cursor)
+
+    def finish_stream(self, text):
+        """流式回复结束，把完整回复记入对话历史"""
+        self.conversation_history.append(("assistant", text))
+        self.save_conversation()
+
+    def show_error(self, text):
+        """在回复框显示错误提示，不计入对话历史"""
+        self.response_box.setPlainText(f"出错了: {text}")
+        self.response_box.show()
+        self.adjust_window_size()
+
     def add_user_input(self, text):
         """添加用户输入到对话历史"""
         if not self.current_conversation_id:
@@ -107,20 +157,3 @@ class PetInput:
         with open(filename, "w", encoding="utf-8") as f:
             for role, text in self.conversation_history:
                 f.write(f"{role}: {text}\n\n")
-
-    def adjust_window_size(self):
-        height = self.pet_widget.pet_image.height()
-        if not self.input_box.isHidden():
-            height += self.input_box.height() + 10
-        if not self.response_box.isHidden():
-            height += self.response_box.height() + 10
-        self.pet_widget.resize(max(200, self.pet_widget.width()), height)
-
-    def setup_layout(self):
-        layout = QVBoxLayout(self.pet_widget)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setSpacing(5)
-        layout.addWidget(self.pet_widget.pet_image, 0, Qt.AlignCenter)
-        layout.addWidget(self.input_box, 0, Qt.AlignCenter)
-        layout.addWidget(self.response_box, 0, Qt.AlignCenter)
-        return layout
\ No newline at end of file
@@ -0,0 +1,289 @@
+from common_imports import *
+from array import array
+
+
+class EasingTable:
+    """预先采样的缓动曲线，运行时查表加线性插值，不用每帧调用QEasingCurve"""
+    SAMPLES = 256
+    _tables = {}
+
+    def __init__(self, curve_type):
+        curve = QEasingCurve(curve_type)
+        last = self.SAMPLES - 1
+        self.values = array('d', (curve.valueForProgress(i / last) for i in range(self.SAMPLES)))
+
+    @classmethod
+    def get(cls, curve_type):
+        """同一种曲线全局只采样一次"""
+        table = cls._tables.get(curve_type)
+        if table is None:
+            table = cls._tables[curve_type] = cls(curve_type)
+        return table
+
+    def value(self, t):
+        values = self.values
+        if t <= 0.0:
+            return values[0]
+        if t >= 1.0:
+            return values[-1]
+        pos = t * (len(values) - 1)
+        i = int(pos)
+        a = values[i]
+        return a + (values[i + 1] - a) * (pos - i)
+
+
+def _as_pair(value):
+    if value is None:
+        return None
+    if isinstance(value, (QPoint, QPointF)):
+        return (float(value.x()), float(value.y()))
+    return (float(value[0]), float(value[1]))
+
+
+class MotionSegment:
+    """一段补间：在duration毫秒内把位置(pos)或透明度(opacity)从起点插值到终点
+
+    对象可以反复configure复用。start为None时从开始那一刻的当前值出发，
+    by表示相对起点的位移，keyframes是[(进度, 值), ...]形式的透明度关键帧。
+    """
+    __slots__ = ("prop", "duration", "easing", "keyframes", "on_start",
+                 "_start", "_end", "_by", "_from", "_to", "_t0", "end_time")
+
+    def __init__(self):
+        self.configure("pos", 0)
+
+    def configure(self, prop, duration, end=None, start=None, by=None,
+                  easing=QEasingCurve.Linear, keyframes=None, on_start=None):
+        self.prop = prop
+        self.duration = max(0, int(duration))
+        self.easing = EasingTable.get(easing)
+        self.keyframes = keyframes
+        self.on_start = on_start  # 段开始时的回调，例如切换精灵动画
+        if prop == "pos":
+            self._start, self._end, self._by = _as_pair(start), _as_pair(end), _as_pair(by)
+        else:
+            self._start, self._end, self._by = start, end, by
+        self._from = self._to = None
+        self._t0 = self.end_time = 0
+        return self
+
+    def begin(self, engine, now):
+        self._t0 = now
+        if self.on_start is not None:
+            self.on_start()
+        current = engine.value(self.prop)
+        self._from = self._start if self._start is not None else current
+        if self._end is not None:
+            self._to = self._end
+        elif self._by is not None:
+            if self.prop == "pos":
+                self._to = (self._from[0] + self._by[0], self._from[1] + self._by[1])
+            else:
+                self._to = self._from + self._by
+        else:
+            self._to = self._from
+
+    def update(self, engine, now):
+        """推进到now，返回是否已结束"""
+        elapsed = now - self._t0
+        t = 1.0 if elapsed >= self.duration else elapsed / self.duration
+        if self.keyframes:
+            engine.set_value(self.prop, self._keyframe_value(t))
+        else:
+            k = self.easing.value(t)
+            a, b = self._from, self._to
+            if self.prop == "pos":
+                engine.set_value("pos", (a[0] + (b[0] - a[0]) * k, a[1] + (b[1] - a[1]) * k))
+            else:
+                engine.set_value(self.prop, a + (b - a) * k)
+        if t >= 1.0:
+            self.end_time = self._t0 + self.duration
+            return True
+        return False
+
+    def _keyframe_value(self, t):
+        keys = self.keyframes
+        prev_t, prev_v = keys[0]
+        for key_t, key_v in keys:
+            if t <= key_t:
+                if key_t <= prev_t:
+                    return key_v
+                return prev_v + (key_v - prev_v) * (t - prev_t) / (key_t - prev_t)
+            prev_t, prev_v = key_t, key_v
+        return prev_v
+
+
+class SequentialMotion:
+    """依次执行子运动，下一段从上一段结束的时刻和位置开始"""
+    __slots__ = ("children", "_index", "end_time")
+
+    def __init__(self, *children):
+        self.children = list(children)
+        self._index = 0
+        self.end_time = 0
+
+    def begin(self, engine, now):
+        self._index = 0
+        self.end_time = now
+        if self.children:
+            self.children[0].begin(engine, now)
+
+    def update(self, engine, now):
+        children = self.children
+        while self._index < len(children):
+            child = children[self._index]
+            if not child.update(engine, now):
+                return False
+            self.end_time = child.end_time
+            self._index += 1
+            if self._index < len(children):
+                # 按上一段的理论结束时间开始，跨帧时不会累积误差
+                children[self._index].begin(engine, child.end_time)
+        return True
+
+
+class ParallelMotion:
+    """同时执行子运动（例如位移加透明度），全部结束才算结束"""
+    __slots__ = ("children", "_done", "end_time")
+
+    def __init__(self, *children):
+        self.children = list(children)
+        self._done = [False] * len(self.children)
+        self.end_time = 0
+
+    def begin(self, engine, now):
+        if len(self._done) != len(self.children):
+            self._done = [False] * len(self.children)
+        self.end_time = now
+        for i, child in enumerate(self.children):
+            self._done[i] = False
+            child.begin(engine, now)
+
+    def update(self, engine, now):
+        finished = True
+        for i, child in enumerate(self.children):
+            if self._done[i]:
+                continue
+            if child.update(engine, now):
+                self._done[i] = True
+                self.end_time = max(self.end_time, child.end_time)
+            else:
+                finished = False
+        return finished
+
+
+class MotionEngine:
+    """在全局帧时钟上推进桌宠的位置和透明度
+
+    每次唤醒先推进所有运动，再把最终的位置和透明度一次性写到窗口上；
+    没有运动时不占用时钟。运动结束或被停止后交还给pool（如果有）。
+    """
+
+    def __init__(self, widget, clock, pool=None):
+        self.widget = widget
+        self.clock = clock
+        self.pool = pool
+        self._active = []        # [(运动, 完成回调)]
+        self._pos = None         # 本次唤醒待写入的位置(浮点)
+        self._opacity = None
+        self._ticking = False
+        self.steps = 0
+        self.completed = 0
+
+    def run(self, motion, on_finished=None):
+        """开始一个运动（同一个对象正在运行时从头开始），返回motion本身"""
+        self._active = [entry for entry in self._active if entry[0] is not motion]
+        motion.begin(self, self.clock.now())
+        self._active.append((motion, on_finished))
+        if not self._ticking:
+            self._ticking = True
+            self.clock.add_ticker(self._tick)
+        return motion
+
+    def stop(self, motion=None):
+        """停止指定运动，motion为None时停止全部；不会触发完成回调"""
+        keep = []
+        for entry in self._active:
+            if motion is None or entry[0] is motion:
+                self._recycle(entry[0])
+            else:
+                keep.append(entry)
+        self._active = keep
+        if not self._active:
+            self._apply()
+            self._stop_ticking()
+
+    def is_running(self, motion=None):
+        if motion is None:
+            return bool(self._active)
+        return any(entry[0] is motion for entry in self._active)
+
+    def value(self, prop):
+        if prop == "pos":
+            if self._pos is not None:
+                return self._pos
+            pos = self.widget.pos()
+            return (float(pos.x()), float(pos.y()))
+        if self._opacity is not None:
+            return self._opacity
+        return self.widget.windowOpacity()
+
+    def set_value(self, prop, value):
+        if prop == "pos":
+            self._pos = value
+        else:
+            self._opacity = min(1.0, max(0.0, value))
+
+    def _tick(self, now):
+        self.steps += 1
+        finished = []
+        for entry in list(self._active):
+            motion, callback = entry
+            try:
+                done = motion.update(self, now)
+            except Exception as e:
+                print(f"[运动] 更新出错: {str(e)}")
+                done = True
+            if done:
+                self._active.remove(entry)
+                self._recycle(motion)
+                finished.append(callback)
+        self._apply()
+        if not self._active:
+            self._stop_ticking()
+        for callback in finished:
+            self.completed += 1
+            if callback is not None:
+                callback()
+
+    def _recycle(self, motion):
+        if self.pool is not None:
+            self.pool.release(motion)
+
+    def _apply(self):
+        widget = self.widget
+        if self._pos is not None:
+            x, y = round(self._pos[0]), round(self._pos[1])
+            self._pos = None
+            if x != widget.x() or y != widget.y():
+                widget.move(x, y)
+        if self._opacity is not None:
+            opacity, self._opacity = self._opacity, None
+            if abs(widget.windowOpacity() - opacity) > 0.004:
+                widget.setWindowOpacity(opacity)
+
+    def _stop_ticking(self):
+        if self._ticking:
+            self._ticking = False
+            self.clock.remove_ticker(self._tick)
+
+    def stats(self):
+        stats = {
+            "active": len(self._active),
+            "steps": self.steps,
+            "completed": self.completed,
+            "easing_tables": len(EasingTable._tables),
+        }
+        if self.pool is not None:
+            stats["pool"] = self.pool.stats()
+        return stats
@@ -0,0 +1,383 @@
+from common_imports import *
+from enum import Enum
+import ctypes
+import ctypes.util
+from pet_frame_clock import FrameClock
+
+try:
+    from PyQt5.QtDBus import QDBusConnection, QDBusMessage, QDBusPendingCallWatcher, QDBusPendingReply
+    _dbus_slot = pyqtSlot(QDBusMessage)
+except ImportError:  # 没有QtDBus时不检测Linux锁屏
+    QDBusConnection = None
+    _dbus_slot = lambda func: func
+
+LOGIN1_SERVICE = "org.freedesktop.login1"
+LOGIN1_SESSION = "/org/freedesktop/login1/session/auto"
+
+
+class RenderMode(Enum):
+    FULL = "full"        # 正常帧率
+    REDUCED = "reduced"  # 降低帧率（电池、长时间无操作、只是在发呆）
+    FROZEN = "frozen"    # 停在当前帧（被遮挡、全屏应用、锁屏）
+
+
+class _X11Session:
+    """通过Xlib/XScreenSaver查询全屏窗口和空闲时间，库不存在时所有查询返回None"""
+    class XScreenSaverInfo(ctypes.Structure):
+        _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int),
+                    ("kind", ctypes.c_int), ("til_or_since", ctypes.c_ulong),
+                    ("idle", ctypes.c_ulong), ("eventMask", ctypes.c_ulong)]
+
+    def __init__(self):
+        self.display = None
+        self.xss = None
+        try:
+            self.xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library("X11") or "libX11.so.6")
+        except OSError:
+            return
+        x = self.xlib
+        x.XOpenDisplay.restype = ctypes.c_void_p
+        x.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x.XDefaultRootWindow.restype = ctypes.c_ulong
+        x.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x.XInternAtom.restype = ctypes.c_ulong
+        x.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long, ctypes.c_long,
+            ctypes.c_int, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_void_p)]
+        x.XFree.argtypes = [ctypes.c_void_p]
+        self.display = x.XOpenDisplay(None)
+        if not self.display:
+            return
+        self.root = x.XDefaultRootWindow(self.display)
+        self.atom_active = x.XInternAtom(self.display, b"_NET_ACTIVE_WINDOW", False)
+        self.atom_state = x.XInternAtom(self.display, b"_NET_WM_STATE", False)
+        self.atom_fullscreen = x.XInternAtom(self.display, b"_NET_WM_STATE_FULLSCREEN", False)
+        try:
+            self.xss = ctypes.cdll.LoadLibrary(ctypes.util.find_library("Xss") or "libXss.so.1")
+            self.xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(self.XScreenSaverInfo)
+            self.xss.XScreenSaverQueryInfo.argtypes = [
+                ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(self.XScreenSaverInfo)]
+            self.xss_info = self.xss.XScreenSaverAllocInfo()
+        except (OSError, AttributeError):
+            self.xss = None
+
+    def _window_property(self, window, atom):
+        """读取32位窗口属性，返回整数列表"""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        status = self.xlib.XGetWindowProperty(
+            self.display, window, atom, 0, 64, False, 0,  # AnyPropertyType
+            ctypes.byref(actual_type), ctypes.byref(actual_format),
+            ctypes.byref(nitems), ctypes.byref(after), ctypes.byref(data))
+        if status != 0 or not data.value:
+            return []
+        try:
+            if actual_format.value != 32:
+                return []
+            # 格式为32的属性在客户端中按C long存放
+            values = ctypes.cast(data, ctypes.POINTER(ctypes.c_ulong))
+            return [values[i] for i in range(nitems.value)]
+        finally:
+            self.xlib.XFree(data)
+
+    def active_window_fullscreen(self, own_window=None):
+        if not self.display:
+            return None
+        active = self._window_property(self.root, self.atom_active)
+        if not active or not active[0] or active[0] == own_window:
+            return False
+        return self.atom_fullscreen in self._window_property(active[0], self.atom_state)
+
+    def idle_ms(self):
+        if not self.display or not self.xss:
+            return None
+        if not self.xss.XScreenSaverQueryInfo(self.display, self.root, self.xss_info):
+            return None
+        return self.xss_info.contents.idle
+
+
+class _WindowsSession:
+    """通过Win32 API查询全屏、锁屏、空闲时间和电源状态"""
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    class SYSTEM_POWER_STATUS(ctypes.Structure):
+        _fields_ = [("ACLineStatus", ctypes.c_byte), ("BatteryFlag", ctypes.c_byte),
+                    ("BatteryLifePercent", ctypes.c_byte), ("SystemStatusFlag", ctypes.c_byte),
+                    ("BatteryLifeTime", ctypes.c_ulong), ("BatteryFullLifeTime", ctypes.c_ulong)]
+
+    # SHQueryUserNotificationState 返回值
+    QUNS_BUSY = 2
+    QUNS_RUNNING_D3D_FULL_SCREEN = 3
+    QUNS_PRESENTATION_MODE = 4
+
+    def __init__(self):
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+        self.shell32 = ctypes.windll.shell32
+
+    def active_window_fullscreen(self, own_window=None):
+        state = ctypes.c_int()
+        if self.shell32.SHQueryUserNotificationState(ctypes.byref(state)) != 0:
+            return None
+        return state.value in (self.QUNS_BUSY, self.QUNS_RUNNING_D3D_FULL_SCREEN,
+                               self.QUNS_PRESENTATION_MODE)
+
+    def locked(self):
+        desktop = self.user32.OpenInputDesktop(0, False, 0x0100)  # DESKTOP_SWITCHDESKTOP
+        if not desktop:
+            return True
+        try:
+            return not self.user32.SwitchDesktop(desktop)
+        finally:
+            self.user32.CloseDesktop(desktop)
+
+    def idle_ms(self):
+        info = self.LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not self.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        return (self.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF
+
+    def on_battery(self):
+        status = self.SYSTEM_POWER_STATUS()
+        if not self.kernel32.GetSystemPowerStatus(ctypes.byref(status)):
+            return None
+        return status.ACLineStatus == 0
+
+
+class PowerMonitor(QObject):
+    """根据窗口可见性、全屏应用、锁屏、电池和空闲状态切换渲染模式"""
+    mode_changed = pyqtSignal(object)
+
+    POLL_INTERVAL = 3000           # 系统状态轮询间隔(ms)，挂在全局帧时钟上
+    SESSION_IDLE_REDUCE = 60000    # 系统无输入超过1分钟降帧
+    SESSION_IDLE_FREEZE = 600000   # 超过10分钟冻结
+    PET_IDLE_REDUCE = 20000        # 只在播放idle且20秒没人理它时降帧
+    REDUCED_FRAME_SCALE = 2.0      # 降帧模式下帧延迟放大倍数
+    REDUCED_TWEEN_INTERVAL = 33
+
+    def __init__(self, pet, clock):
+        super().__init__(pet)
+        self.pet = pet
+        self.clock = clock
+        self.mode = RenderMode.FULL
+        self.reasons = []
+        self.last_interaction = time.monotonic()
+        self._poll_job = None
+        self._expose_seen = False  # 平台发过Expose事件后才用isExposed判断遮挡
+        self._started = False
+        self._bus = None
+
+        # 系统状态（poll时刷新，evaluate只做组合判断）
+        self.fullscreen_app = False
+        self.locked = False
+        self.on_battery = False
+        self.session_idle_ms = 0     # None表示系统不提供空闲时间
+
+        self._session = None
+        try:
+            if os.name == "nt":
+                self._session = _WindowsSession()
+            elif QGuiApplication.platformName() == "xcb":
+                self._session = _X11Session()
+        except Exception as e:
+            print(f"[省电] 无法初始化系统状态查询: {e}")
+
+        # 每个模式的CPU时间和唤醒次数
+        self._mode_stats = {m: {"seconds": 0.0, "cpu_seconds": 0.0, "wakeups": 0} for m in RenderMode}
+        self._mode_since = (time.monotonic(), time.process_time(), clock.wakeups)
+
+    @property
+    def frozen(self):
+        return self.mode == RenderMode.FROZEN
+
+    def start(self):
+        """窗口显示后开始监控"""
+        self._started = True
+        window = self.pet.windowHandle()
+        if window is not None:
+            window.installEventFilter(self)
+        if not hasattr(self._session, "locked"):
+            self._watch_lock()
+        self.poll()
+
+    def eventFilter(self, obj, event):
+        """窗口被遮挡/恢复、显示/隐藏时立即重新评估"""
+        if event.type() in (QEvent.Expose, QEvent.Show, QEvent.Hide):
+            if event.type() == QEvent.Expose:
+                self._expose_seen = True
+            self.clock.schedule(0, self.evaluate)
+        return False
+
+    def notify_interaction(self):
+        """用户与桌宠交互时立即恢复全速"""
+        self.last_interaction = time.monotonic()
+        self.session_idle_ms = 0
+        if self.mode != RenderMode.FULL:
+            self.evaluate()
+
+    def poll(self):
+        """刷新系统状态并重新评估"""
+        self.clock.cancel(self._poll_job)
+        session = self._session
+        if session is not None:
+            try:
+                own = int(self.pet.winId()) if self.pet.isVisible() else None
+                self.fullscreen_app = bool(session.active_window_fullscreen(own))
+                if hasattr(session, "locked"):
+                    self.locked = bool(session.locked())
+                self.session_idle_ms = session.idle_ms()
+            except Exception as e:
+                print(f"[省电] 查询系统状态失败: {e}")
+        else:
+            self.session_idle_ms = None
+        self.on_battery = self._on_battery()
+        self.evaluate()
+        self._poll_job = self.clock.schedule(self.POLL_INTERVAL, self.poll)
+
+    def _pet_idle_ms(self):
+        return int((time.monotonic() - self.last_interaction) * 1000)
+
+    def _on_battery(self):
+        if isinstance(self._session, _WindowsSession):
+            return bool(self._session.on_battery())
+        supplies = Path("/sys/class/power_supply")
+        if not supplies.is_dir():
+            return False
+        has_battery = False
+        for supply in supplies.iterdir():
+            try:
+                kind = (supply / "type").read_text().strip()
+                if kind == "Mains" and (supply / "online").read_text().strip() == "1":
+                    return False
+                if kind == "Battery":
+                    has_battery = True
+            except OSError:
+                continue
+        return has_battery
+
+    def _watch_lock(self):
+        """Linux桌面通过login1会话的LockedHint判断锁屏
+
+        订阅属性变化信号，变化时异步查询并缓存结果；D-Bus调用都不阻塞GUI线程
+        """
+        if os.name == "nt" or QDBusConnection is None:
+            return
+        bus = QDBusConnection.systemBus()
+        if not bus.isConnected():
+            return
+        self._bus = bus
+        bus.connect(LOGIN1_SERVICE, "", "org.freedesktop.DBus.Properties", "PropertiesChanged",
+                    self._on_login1_properties)
+        self._query_locked()
+
+    @_dbus_slot
+    def _on_login1_properties(self, message):
+        args = message.arguments()
+        if len(args) < 3 or args[0] != "org.freedesktop.login1.Session":
+            return
+        # 其他用户的会话也会发这个信号，只要涉及LockedHint就重新查询自己的会话
+        if "LockedHint" in args[1] or "LockedHint" in args[2]:
+            self._query_locked()
+
+    def _query_locked(self):
+        message = QDBusMessage.createMethodCall(LOGIN1_SERVICE, LOGIN1_SESSION,
+                                                "org.freedesktop.DBus.Properties", "Get")
+        message.setArguments(["org.freedesktop.login1.Session", "LockedHint"])
+        watcher = QDBusPendingCallWatcher(self._bus.asyncCall(message), self)
+        watcher.finished.connect(self._on_locked_reply)
+
+    def _on_locked_reply(self, watcher):
+        reply = QDBusPendingReply(watcher)
+        watcher.deleteLater()
+        if reply.isError():
+            return
+        value = reply.argumentAt(0)
+        locked = bool(value.variant() if hasattr(value, "variant") else value)
+        if locked != self.locked:
+            self.locked = locked
+            self.evaluate()
+
+    def evaluate(self):
+        """组合各项状态得到渲染模式"""
+        if not self._started:
+            return
+        reasons = []
+        window = self.pet.windowHandle()
+        if not self.pet.isVisible() or self.pet.isMinimized() or \
+                (self._expose_seen and window is not None and not window.isExposed()):
+            reasons.append("occluded")
+        if self.fullscreen_app:
+            reasons.append("fullscreen")
+        if self.locked:
+            reasons.append("locked")
+        # 拿不到系统空闲时间（Wayland、macOS等）时不按空闲冻结：桌宠没人理不代表用户没在用电脑，
+        # 这种情况只由下面的pet_idle降帧
+        idle = self.session_idle_ms
+        if idle is not None and idle >= self.SESSION_IDLE_FREEZE:
+            reasons.append("session_idle_long")
+
+        if reasons:
+            mode = RenderMode.FROZEN
+        else:
+            if self.on_battery:
+                reasons.append("battery")
+            if idle is not None and idle >= self.SESSION_IDLE_REDUCE:
+                reasons.append("session_idle")
+            animations = getattr(self.pet, "animations", None)
+            if animations is not None and animations.current_anim == "idle" and \
+                    self._pet_idle_ms() >= self.PET_IDLE_REDUCE:
+                reasons.append("pet_idle")
+            mode = RenderMode.REDUCED if reasons else RenderMode.FULL
+
+        self.reasons = reasons
+        if mode != self.mode:
+            self._set_mode(mode)
+
+    def _set_mode(self, mode):
+        self._close_stats_period()
+        print(f"[省电] 渲染模式 {self.mode.value} -> {mode.value} {self.reasons}")
+        self.mode = mode
+        animations = getattr(self.pet, "animations", None)
+        if mode == RenderMode.FULL:
+            self.clock.frame_interval = FrameClock.FRAME_INTERVAL
+            if animations:
+                animations.set_render_mode(1.0, frozen=False)
+        elif mode == RenderMode.REDUCED:
+            self.clock.frame_interval = self.REDUCED_TWEEN_INTERVAL
+            if animations:
+                animations.set_render_mode(self.REDUCED_FRAME_SCALE, frozen=False)
+        else:
+            if animations:
+                animations.set_render_mode(1.0, frozen=True)
+        self.mode_changed.emit(mode)
+
+    def _close_stats_period(self):
+        since_wall, since_cpu, since_wakeups = self._mode_since
+        now = (time.monotonic(), time.process_time(), self.clock.wakeups)
+        stats = self._mode_stats[self.mode]
+        stats["seconds"] += now[0] - since_wall
+        stats["cpu_seconds"] += now[1] - since_cpu
+        stats["wakeups"] += now[2] - since_wakeups
+        self._mode_since = now
+
+    def stats(self):
+        """每种渲染模式累计的时间、CPU占用和唤醒次数"""
+        self._close_stats_period()
+        result = {"mode": self.mode.value, "reasons": list(self.reasons)}
+        for mode, stats in self._mode_stats.items():
+            seconds = stats["seconds"]
+            result[mode.value] = dict(
+                stats,
+                cpu_percent=100.0 * stats["cpu_seconds"] / seconds if seconds else 0.0,
+                wakeups_per_sec=stats["wakeups"] / seconds if seconds else 0.0,
+            )
+        return result
+
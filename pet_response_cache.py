@@ -0,0 +1,222 @@
+from common_imports import *
+from collections import namedtuple
+import hashlib
+import sqlite3
+import unicodedata
+import re
+
+from pet_history import estimate_tokens
+
+
+_PUNCT = re.compile(r"[\W_]+")
+# 依赖上文的追问：同一句话在不同对话里意思不同，归一化匹配时要带上上文
+_REFERENCE = re.compile(r"这|那|它|他|她|刚才|上面|前面|之前|继续|还有|然后|为什么"
+                        r"|\b(it|that|this|they|them|more|again|why|continue)\b", re.I)
+# 答案随时间变化的问题不缓存
+_VOLATILE = re.compile(r"几点|时间|日期|今天|明天|昨天|现在|星期|周几|天气|新闻"
+                       r"|\b(time|date|today|tomorrow|yesterday|now|weather|news)\b", re.I)
+# 讯飞处理器把错误当作回复返回，不能缓存
+_ERROR_PREFIXES = ("错误:", "API错误:")
+
+
+def normalize_prompt(text):
+    """归一化：全角转半角、忽略大小写、去掉空白和标点"""
+    return _PUNCT.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+CacheKey = namedtuple("CacheKey", "exact normalized provider model prompt_tokens")
+CachedResponse = namedtuple("CachedResponse", "text kind latency_ms tokens")
+
+
+class ResponseCache:
+    """聊天回复缓存（SQLite，保存在 cache/responses.db）
+
+    每条回复有两个键：
+    - 精确键：供应商、模型、系统提示、最近一轮上下文和原样的输入
+    - 归一化键：输入归一化后匹配；输入引用了上文（“那”“继续”“为什么”等）时也带上归一化的上文
+    先查精确键再查归一化键。超过ttl的条目作废，条目数超过max_entries时按最近使用时间淘汰。
+    问时间、天气之类答案会变的问题和错误回复不缓存。
+    命中次数、节省的时间和token数累计保存在数据库里。
+    """
+    CONTEXT_MESSAGES = 2     # 键里带上的上文消息数（最近一问一答）
+    TTL = 7 * 24 * 3600
+    MAX_ENTRIES = 500
+
+    def __init__(self, path=Path("cache") / "responses.db", ttl=TTL, max_entries=MAX_ENTRIES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self._db = None
+        self._lock = threading.Lock()
+        self._totals = {}
+        self.hits = 0             # 本次运行
+        self.exact_hits = 0
+        self.misses = 0
+        self.skipped = 0          # 不适合缓存的问题
+        self.saved_ms = 0.0
+        self.saved_tokens = 0
+
+    # ---- 键 ----
+    def key(self, handler, prompt, history=None):
+        """生成缓存键，不适合缓存时返回None；history默认取处理器的对话历史（不含本次输入）"""
+        if not prompt or _VOLATILE.search(prompt):
+            self.skipped += 1
+            return None
+        history = handler.conversation_history if history is None else history
+        system = [m for m in history[:1] if m.get("role") == "system"]
+        context = [m for m in history[len(system):]][-self.CONTEXT_MESSAGES:]
+        provider = getattr(handler, "API_TYPE", "")
+        model = getattr(handler, "model", "") or getattr(handler, "domain", "")
+        # 系统提示后面附的摘要会随对话变化，键里只用原始的系统提示
+        shared = getattr(handler, "history", None)
+        system_text = shared.system_prompt if shared is not None else (system[0]["content"] if system else "")
+
+        exact = self._digest(provider, model, system_text,
+                             [(m["role"], m["content"]) for m in context], prompt)
+        normalized_context = []
+        if _REFERENCE.search(prompt):
+            normalized_context = [(m["role"], normalize_prompt(m["content"])) for m in context]
+        normalized = self._digest(provider, model, system_text, normalized_context, normalize_prompt(prompt))
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in history) + estimate_tokens(prompt)
+        return CacheKey(exact, normalized, provider, model, prompt_tokens)
+
+    @staticmethod
+    def _digest(*parts):
+        return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    # ---- 存储 ----
+    def _connect(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    exact_key TEXT PRIMARY KEY,
+                    normalized_key TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS responses_normalized ON responses(normalized_key);
+                CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+                CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value REAL NOT NULL);
+            """)
+            db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            db.commit()
+            self._totals = dict(db.execute("SELECT name, value FROM totals"))
+            self._db = db
+        return self._db
+
+    def _run(self, func, default=None, force=False):
+        """数据库出错时只打印，聊天照常走网络；force表示缓存关闭时也执行（清空、统计）"""
+        if not self.enabled and not force:
+            return default
+        with self._lock:
+            try:
+                return func(self._connect())
+            except (sqlite3.Error, OSError) as e:
+                print(f"[回复缓存] 数据库错误: {str(e)}")
+                return default
+
+    def get(self, key):
+        """查找缓存，命中时返回CachedResponse"""
+        def lookup(db):
+            now = time.time()
+            kind = "exact"
+            row = db.execute("SELECT exact_key, response, latency_ms, tokens, created FROM responses "
+                             "WHERE exact_key = ?", (key.exact,)).fetchone()
+            if row is None:
+                kind = "normalized"
+                row = db.execute("SELECT exact_key, response, latency_ms, tokens, created FROM responses "
+                                 "WHERE normalized_key = ? ORDER BY accessed DESC LIMIT 1",
+                                 (key.normalized,)).fetchone()
+            if row is not None and now - row[4] > self.ttl:
+                db.execute("DELETE FROM responses WHERE exact_key = ?", (row[0],))
+                db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                self._add_totals(db, misses=1)
+                db.commit()
+                return None
+            exact_key, text, latency_ms, tokens, _created = row
+            db.execute("UPDATE responses SET accessed = ?, hits = hits + 1 WHERE exact_key = ?", (now, exact_key))
+            self.hits += 1
+            self.exact_hits += kind == "exact"
+            self.saved_ms += latency_ms
+            self.saved_tokens += tokens
+            self._add_totals(db, hits=1, saved_ms=latency_ms, saved_tokens=tokens)
+            db.commit()
+            return CachedResponse(text, kind, latency_ms, tokens)
+        return self._run(lookup)
+
+    def put(self, key, prompt, response, latency_ms):
+        """保存一次网络请求的回复；错误回复不保存"""
+        if not response or response.startswith(_ERROR_PREFIXES):
+            return
+
+        def store(db):
+            now = time.time()
+            tokens = key.prompt_tokens + estimate_tokens(response)
+            db.execute("INSERT OR REPLACE INTO responses (exact_key, normalized_key, provider, model, prompt, "
+                       "response, latency_ms, tokens, created, accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key.exact, key.normalized, key.provider, key.model, prompt, response,
+                        latency_ms, tokens, now, now))
+            count = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                db.execute("DELETE FROM responses WHERE exact_key IN "
+                           "(SELECT exact_key FROM responses ORDER BY accessed LIMIT ?)",
+                           (count - self.max_entries,))
+            db.commit()
+        self._run(store)
+
+    def _add_totals(self, db, **values):
+        for name, value in values.items():
+            self._totals[name] = self._totals.get(name, 0) + value
+            db.execute("INSERT INTO totals (name, value) VALUES (?, ?) "
+                       "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, value))
+
+    def clear(self):
+        """清空缓存条目和累计统计"""
+        def wipe(db):
+            db.execute("DELETE FROM responses")
+            db.execute("DELETE FROM totals")
+            db.commit()
+            self._totals = {}
+        self._run(wipe, force=True)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        entries = self._run(lambda db: db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 0, force=True)
+        lookups = self.hits + self.misses
+        total_hits = int(self._totals.get("hits", 0))
+        total_lookups = total_hits + int(self._totals.get("misses", 0))
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_ms": self.saved_ms,
+            "saved_tokens": self.saved_tokens,
+            "total_hits": total_hits,
+            "total_hit_rate": total_hits / total_lookups if total_lookups else 0.0,
+            "total_saved_ms": self._totals.get("saved_ms", 0.0),
+            "total_saved_tokens": int(self._totals.get("saved_tokens", 0)),
+        }
@@ -0,0 +1,148 @@
+from common_imports import *
+
+
+class ScreenInfo:
+    """一个显示器的缓存信息"""
+    __slots__ = ("screen", "name", "geometry", "available", "dpr", "dpi",
+                 "left", "top", "right", "bottom", "area")
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.name = screen.name()
+        self.geometry = screen.geometry()
+        self.available = screen.availableGeometry()
+        self.dpr = screen.devicePixelRatio()
+        self.dpi = screen.logicalDotsPerInch()
+        # 右、下边界用开区间，查询时只做整数比较
+        rect = self.available
+        self.left, self.top = rect.x(), rect.y()
+        self.right, self.bottom = rect.x() + rect.width(), rect.y() + rect.height()
+        self.area = rect.width() * rect.height()
+
+    def contains(self, x, y):
+        return self.left <= x < self.right and self.top <= y < self.bottom
+
+    def distance2(self, x, y):
+        """点到可用区域的距离平方，在区域内为0"""
+        dx = self.left - x if x < self.left else (x - self.right + 1 if x >= self.right else 0)
+        dy = self.top - y if y < self.top else (y - self.bottom + 1 if y >= self.bottom else 0)
+        return dx * dx + dy * dy
+
+
+class ScreenIndex(QObject):
+    """多显示器几何缓存
+
+    启动时读取每个显示器的可用区域（去掉任务栏）和DPI，只在显示器增减、分辨率或
+    任务栏变化时重建；边界检测、落点选择都只查这里的缓存，不再访问窗口系统。
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._screens = []
+        self._last_hit = None   # 上一次命中的显示器，行走时基本总在同一个显示器上
+        self.generation = 0
+        self.rebuilds = 0
+        app = QGuiApplication.instance()
+        app.screenAdded.connect(self._on_screen_added)
+        app.screenRemoved.connect(self._on_screen_removed)
+        app.primaryScreenChanged.connect(self.rebuild)
+        for screen in QGuiApplication.screens():
+            self._watch(screen)
+        self.rebuild()
+
+    def _watch(self, screen):
+        screen.availableGeometryChanged.connect(self.rebuild)
+        screen.geometryChanged.connect(self.rebuild)
+        screen.logicalDotsPerInchChanged.connect(self.rebuild)
+
+    def _on_screen_added(self, screen):
+        self._watch(screen)
+        self.rebuild()
+
+    def _on_screen_removed(self, screen):
+        self.rebuild(exclude=screen)
+
+    def rebuild(self, *_args, exclude=None):
+        primary = QGuiApplication.primaryScreen()
+        screens = [ScreenInfo(s) for s in QGuiApplication.screens() if s is not exclude]
+        screens.sort(key=lambda info: info.screen is not primary)  # 主显示器排第一
+        self._screens = screens
+        self._last_hit = None
+        self.generation += 1
+        self.rebuilds += 1
+        print(f"[显示器] {len(screens)}个: " +
+              ", ".join(f"{s.name} {s.available.width()}x{s.available.height()}@{s.dpr:g}" for s in screens))
+        self.changed.emit()
+
+    # ---- 查询 ----
+    def screens(self):
+        return list(self._screens)
+
+    def primary(self):
+        return self._screens[0] if self._screens else None
+
+    def screen_at(self, x, y=None):
+        """包含该点的显示器，不在任何显示器上时返回None；x可以直接传QPoint"""
+        if y is None:
+            x, y = x.x(), x.y()
+        last = self._last_hit
+        if last is not None and last.contains(x, y):
+            return last
+        for info in self._screens:
+            if info.contains(x, y):
+                self._last_hit = info
+                return info
+        return None
+
+    def nearest(self, x, y=None):
+        """包含该点或离该点最近的显示器"""
+        if y is None:
+            x, y = x.x(), x.y()
+        info = self.screen_at(x, y)
+        if info is None and self._screens:
+            info = min(self._screens, key=lambda s: s.distance2(x, y))
+        return info
+
+    def screen_for_rect(self, rect):
+        center = rect.center()
+        return self.nearest(center.x(), center.y())
+
+    def contains(self, rect, margin=0):
+        """rect是否完整落在某个显示器的可用区域内（四周留margin）"""
+        info = self.screen_for_rect(rect)
+        if info is None:
+            return False
+        return (rect.left() >= info.left + margin and rect.top() >= info.top + margin and
+                rect.right() < info.right - margin and rect.bottom() < info.bottom - margin)
+
+    def intersects(self, rect):
+        """rect是否至少有一部分可见"""
+        return any(info.available.intersects(rect) for info in self._screens)
+
+    def clamp(self, pos, size, margin=0, screen=None):
+        """把左上角为pos、大小为size的矩形移到最近显示器的可用区域内"""
+        info = screen or self.nearest(pos.x() + size.width() // 2, pos.y() + size.height() // 2)
+        if info is None:
+            return QPoint(pos)
+        max_x = max(info.left + margin, info.right - size.width() - margin)
+        max_y = max(info.top + margin, info.bottom - size.height() - margin)
+        return QPoint(min(max(pos.x(), info.left + margin), max_x),
+                      min(max(pos.y(), info.top + margin), max_y))
+
+    def random_position(self, size, margin=0, screen=None, avoid=()):
+        """随机选一个能放下size的位置；screen为空时按面积随机选显示器，尽量避开avoid里的矩形"""
+        if not self._screens:
+            return QPoint(0, 0)
+        pos = None
+        for _ in range(8):
+            info = screen or random.choices(self._screens, weights=[s.area for s in self._screens])[0]
+            max_x = max(info.left + margin, info.right - size.width() - margin)
+            max_y = max(info.top + margin, info.bottom - size.height() - margin)
+            pos = QPoint(random.randint(info.left + margin, max_x), random.randint(info.top + margin, max_y))
+            if not avoid:
+                break
+            rect = QRect(pos, size)
+            if not any(rect.intersects(other) for other in avoid):
+                break
+        return pos
@@ -0,0 +1,154 @@
+from common_imports import *
+import json
+import zipfile
+import hashlib
+
+
+class SkinAnimation:
+    """清单里的一个动画"""
+    __slots__ = ("name", "file", "frame_ms", "hitbox")
+
+    def __init__(self, name, spec):
+        if isinstance(spec, str):
+            spec = {"file": spec}
+        self.name = name
+        self.file = spec["file"]
+        # 帧时长覆盖：整数表示每帧相同，列表表示逐帧；不写时用GIF自带的延迟
+        self.frame_ms = spec.get("frame_ms")
+        # 可点击区域 [x, y, 宽, 高]，相对精灵尺寸的比例(0~1)；不写时整个不透明区域都可点击
+        hitbox = spec.get("hitbox")
+        self.hitbox = QRectF(*hitbox) if hitbox else None
+
+
+class SkinPack:
+    """皮肤包：一个目录或zip压缩包，根目录下的 manifest.json 描述动画
+
+    {
+      "name": "皮卡丘",
+      "scale": 1.0,                 精灵相对桌宠大小的比例(0.25~1)
+      "preload": ["idle"],          启动时最先解码的动画，其余在后台按播放的可能性依次解码
+      "tray_icon": "tray_icon.png",
+      "rest_image": "relax.png",
+      "animations": {
+        "idle": {"file": "idle.gif"},
+        "jump": {"file": "jump.gif", "frame_ms": 60, "hitbox": [0.1, 0.1, 0.8, 0.9]}
+      }
+    }
+
+    加载时只读清单；zip包里的文件在第一次用到时才解压到 cache/skins 下。
+    没有清单的目录按 <动画名>.gif 查找默认动画。
+    """
+    MANIFEST = "manifest.json"
+    DEFAULT_ANIMATIONS = ("idle", "phonewalkright", "phonewalkleft", "walkleft",
+                          "walkright", "jump", "touch", "shake")
+    EXTRACT_ROOT = Path("cache") / "skins"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.is_zip = os.path.isfile(self.path) and zipfile.is_zipfile(self.path)
+        self.id = os.path.splitext(os.path.basename(self.path))[0]
+        self._extract_dir = None
+        manifest = self._read_manifest()
+
+        try:
+            self.name = str(manifest.get("name") or self.id)
+            self.scale = min(1.0, max(0.25, float(manifest.get("scale", 1.0))))
+            self.preload = list(manifest.get("preload", ["idle"]))
+            self.resources = {key: manifest[key] for key in ("tray_icon", "rest_image") if manifest.get(key)}
+            self.animations = {name: SkinAnimation(name, spec)
+                               for name, spec in manifest.get("animations", {}).items()}
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"皮肤清单格式错误 {self.path}: {e}") from e
+        if "idle" not in self.animations:
+            raise ValueError(f"皮肤 {self.name} 缺少idle动画")
+
+    # ---- 清单 ----
+    def _read_manifest(self):
+        try:
+            if self.is_zip:
+                with zipfile.ZipFile(self.path) as archive:
+                    if self.MANIFEST not in archive.namelist():
+                        raise ValueError(f"压缩包里没有 {self.MANIFEST}")
+                    return json.loads(archive.read(self.MANIFEST).decode("utf-8-sig"))
+            manifest_path = os.path.join(self.path, self.MANIFEST)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, "r", encoding="utf-8-sig") as f:
+                    return json.load(f)
+        except (OSError, zipfile.BadZipFile, json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"皮肤清单无效 {self.path}: {e}") from e
+        if not os.path.isdir(self.path):
+            raise ValueError(f"不是皮肤目录或压缩包: {self.path}")
+        return self._default_manifest()
+
+    def _default_manifest(self):
+        animations = {name: {"file": f"{name}.gif"} for name in self.DEFAULT_ANIMATIONS
+                      if os.path.exists(os.path.join(self.path, f"{name}.gif"))}
+        resources = {key: f"{key}.png" for key in ("tray_icon", "rest_image")
+                     if os.path.exists(os.path.join(self.path, f"{key}.png"))}
+        return dict(animations=animations, **resources)
+
+    def bindings(self):
+        """动画名 -> 包内文件名"""
+        return {name: anim.file for name, anim in self.animations.items()}
+
+    # ---- 文件 ----
+    def file_path(self, name):
+        """动画的本地文件路径，zip包第一次调用时才解压该文件；不存在时返回None"""
+        anim = self.animations.get(name)
+        return self._local_path(anim.file) if anim else None
+
+    def resource(self, key):
+        """托盘图标等附加资源的本地路径，没有时返回None"""
+        member = self.resources.get(key)
+        return self._local_path(member) if member else None
+
+    def _local_path(self, member):
+        if os.path.isabs(member) or ".." in Path(member).parts:
+            print(f"[皮肤] 忽略包外路径: {member}")
+            return None
+        if not self.is_zip:
+            path = os.path.join(self.path, member)
+            return path if os.path.exists(path) else None
+        try:
+            target = self._extract_root() / member
+            if not target.exists():
+                with zipfile.ZipFile(self.path) as archive:
+                    data = archive.read(member)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_suffix(target.suffix + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, target)
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            # 缓存目录只读或磁盘满时也当作取不到文件
+            print(f"[皮肤] 解压失败 {member}: {e}")
+            return None
+        return str(target)
+
+    def invalidate(self):
+        """压缩包被替换后调用，之后取文件时解压到新的目录"""
+        self._extract_dir = None
+
+    def _extract_root(self):
+        """解压目录名包含压缩包的大小和修改时间，替换压缩包后自动换新目录"""
+        if self._extract_dir is None:
+            stat = os.stat(self.path)
+            digest = hashlib.sha1(f"{self.path}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:10]
+            self._extract_dir = self.EXTRACT_ROOT / f"{self.id}_{digest}"
+        return self._extract_dir
+
+
+def discover_skins(builtin_dir, skins_dir):
+    """内置皮肤加上skins目录下的所有皮肤目录和zip包，无效的跳过"""
+    candidates = [builtin_dir]
+    if os.path.isdir(skins_dir):
+        for entry in sorted(os.listdir(skins_dir)):
+            path = os.path.join(skins_dir, entry)
+            if os.path.isdir(path) or entry.lower().endswith(".zip"):
+                candidates.append(path)
+    skins = []
+    for path in candidates:
+        try:
+            skins.append(SkinPack(path))
+        except ValueError as e:
+            print(f"[皮肤] 跳过 {path}: {e}")
+    return skins
@@ -0,0 +1,262 @@
+from common_imports import *
+from collections import Counter
+from array import array
+import struct
+import zlib
+
+
+# ---- 调色板工具（精灵文件和紧凑帧存储共用） ----
+TRANSPARENT = 0   # 调色板0号固定为全透明
+
+
+def _pixels(image):
+    """ARGB32(非预乘)像素数组"""
+    image = image.convertToFormat(QImage.Format_ARGB32)
+    return array('I', image.constBits().asstring(image.sizeInBytes()))
+
+
+def build_palette(images, max_colors=256):
+    """所有帧共用的调色板：0号为透明，其余为出现过的不透明颜色
+
+    GIF每帧最多256色且只有1位透明度，通常整套动画的颜色合起来也放得下；
+    放不下时按出现次数保留最常用的颜色，其余颜色由index_image映射到最接近的。
+    """
+    colors = set()
+    for image in images:
+        colors.update(_pixels(image))
+    opaque = [c for c in colors if c >> 24 >= 128]
+    if len(opaque) >= max_colors:
+        counts = Counter()
+        for image in images:
+            counts.update(c for c in _pixels(image) if c >> 24 >= 128)
+        opaque = [c for c, _n in counts.most_common(max_colors - 1)]
+    return [0x00000000] + sorted(c | 0xff000000 for c in opaque)
+
+
+def index_image(image, palette):
+    """把帧转换成使用palette的Indexed8图像，不在调色板里的颜色取最接近的"""
+    # 先转成预乘格式，所有透明像素都变成0x00000000，正好对应0号颜色
+    image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    return image.convertToFormat(QImage.Format_Indexed8, palette, Qt.ThresholdDither | Qt.AvoidDither)
+
+
+def indexed_bytes(indexed):
+    """Indexed8图像去掉行尾对齐后的索引数据，长度为宽*高"""
+    width, height, stride = indexed.width(), indexed.height(), indexed.bytesPerLine()
+    data = indexed.constBits().asstring(indexed.sizeInBytes())
+    if stride == width:
+        return bytes(data)
+    return b"".join(data[y * stride:y * stride + width] for y in range(height))
+
+
+def indexed_image(data, width, height, palette):
+    """由索引数据和调色板创建Indexed8图像（复制数据，不再引用data）"""
+    image = QImage(data, width, height, width, QImage.Format_Indexed8)
+    image.setColorTable(palette)
+    return image.copy()
+
+
+def opaque_bounds(data, width, height):
+    """索引数据中非透明像素的外接矩形 (x, y, 宽, 高)，全透明时返回None"""
+    left, right, top, bottom = width, -1, None, -1
+    for y in range(height):
+        row = data[y * width:(y + 1) * width]
+        stripped = row.lstrip(b"\0")
+        if not stripped:
+            continue
+        if top is None:
+            top = y
+        bottom = y
+        left = min(left, width - len(stripped))
+        right = max(right, len(row.rstrip(b"\0")) - 1)
+    if top is None:
+        return None
+    return left, top, right - left + 1, bottom - top + 1
+
+
+class SpriteData:
+    """解码后的精灵：共享调色板、裁剪区域和去重后的索引帧"""
+    __slots__ = ("canvas", "crop", "palette", "delays", "frame_map", "frames")
+
+    def __init__(self, canvas, crop, palette, delays, frame_map, frames):
+        self.canvas = canvas        # 原始画面尺寸 (宽, 高)
+        self.crop = crop            # 所有帧不透明区域的并集 (x, y, 宽, 高)
+        self.palette = palette      # QRgb列表，0号透明
+        self.delays = delays        # array('H')，每帧延迟
+        self.frame_map = frame_map  # 每帧对应的去重帧序号
+        self.frames = frames        # 去重后的索引数据，每个长度为 裁剪宽*裁剪高
+
+    def __len__(self):
+        return len(self.frame_map)
+
+    def nbytes(self):
+        return sum(len(f) for f in self.frames) + len(self.palette) * 4
+
+
+class SpriteFile:
+    """.pspr 精灵文件
+
+    GIF的帧先去重，再统一裁剪到所有帧不透明区域的并集，像素存为共享调色板的
+    8位索引；每个去重帧和上一帧比较，只保存变化区域（比整帧还大时存整帧），
+    数据块用zlib压缩。读取只需要解压和按行拼接，不经过GIF解码器。
+
+    文件布局：头部 | 调色板(QRgb) | 帧表(延迟, 去重帧序号) | 数据块...
+    """
+    MAGIC = b"PSPR"
+    VERSION = 1
+    SUFFIX = ".pspr"
+    # magic, version, 画面宽, 画面高, 裁剪x, 裁剪y, 裁剪宽, 裁剪高, 帧数, 去重帧数, 调色板颜色数
+    HEADER = struct.Struct("<4sHHHHHHHHHH")
+    FRAME = struct.Struct("<HH")
+    # 类型(0整帧/1变化区域), x, y, 宽, 高, 压缩后长度
+    CHUNK = struct.Struct("<BHHHHI")
+    KEY, DELTA = 0, 1
+
+    # ---- 写入 ----
+    @classmethod
+    def encode(cls, images, delays):
+        """由帧图像和延迟生成SpriteData"""
+        palette = build_palette(images)
+        width, height = images[0].width(), images[0].height()
+        frame_map, unique, seen = [], [], {}
+        for image in images:
+            data = indexed_bytes(index_image(image, palette))
+            if data not in seen:
+                seen[data] = len(unique)
+                unique.append(data)
+            frame_map.append(seen[data])
+
+        crop = None
+        for data in unique:
+            bounds = opaque_bounds(data, width, height)
+            if bounds is None:
+                continue
+            if crop is None:
+                crop = bounds
+            else:
+                x0, y0 = min(crop[0], bounds[0]), min(crop[1], bounds[1])
+                x1 = max(crop[0] + crop[2], bounds[0] + bounds[2])
+                y1 = max(crop[1] + crop[3], bounds[1] + bounds[3])
+                crop = (x0, y0, x1 - x0, y1 - y0)
+        crop = crop or (0, 0, 1, 1)
+        cx, cy, cw, ch = crop
+        frames = [b"".join(data[(cy + y) * width + cx:(cy + y) * width + cx + cw] for y in range(ch))
+                  for data in unique]
+        return SpriteData((width, height), crop, palette, array('H', delays), frame_map, frames)
+
+    @classmethod
+    def save(cls, sprite, path):
+        cw, ch = sprite.crop[2], sprite.crop[3]
+        chunks = []
+        previous = None
+        for data in sprite.frames:
+            key = zlib.compress(data, 9)
+            chunk = (cls.KEY, 0, 0, cw, ch, key)
+            if previous is not None:
+                rect = cls._changed_rect(previous, data, cw, ch)
+                if rect is None:
+                    rect = (0, 0, 1, 1)
+                x, y, w, h = rect
+                patch = b"".join(data[(y + r) * cw + x:(y + r) * cw + x + w] for r in range(h))
+                delta = zlib.compress(patch, 9)
+                if len(delta) < len(key):
+                    chunk = (cls.DELTA, x, y, w, h, delta)
+            chunks.append(chunk)
+            previous = data
+
+        tmp = str(path) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, *sprite.canvas, *sprite.crop,
+                                    len(sprite.frame_map), len(sprite.frames), len(sprite.palette)))
+            f.write(array('I', sprite.palette).tobytes())
+            for delay, index in zip(sprite.delays, sprite.frame_map):
+                f.write(cls.FRAME.pack(delay, index))
+            for kind, x, y, w, h, payload in chunks:
+                f.write(cls.CHUNK.pack(kind, x, y, w, h, len(payload)))
+                f.write(payload)
+        os.replace(tmp, path)
+        return sum(len(c[5]) for c in chunks), sum(1 for c in chunks if c[0] == cls.DELTA)
+
+    @staticmethod
+    def _changed_rect(previous, data, width, height):
+        """两帧索引数据不同的区域 (x, y, 宽, 高)，完全相同时返回None"""
+        left, right, top, bottom = width, -1, None, -1
+        for y in range(height):
+            start = y * width
+            a, b = previous[start:start + width], data[start:start + width]
+            if a == b:
+                continue
+            if top is None:
+                top = y
+            bottom = y
+            x = 0
+            while a[x] == b[x]:
+                x += 1
+            left = min(left, x)
+            x = width - 1
+            while a[x] == b[x]:
+                x -= 1
+            right = max(right, x)
+        if top is None:
+            return None
+        return left, top, right - left + 1, bottom - top + 1
+
+    # ---- 读取 ----
+    @classmethod
+    def load(cls, path):
+        """读取.pspr文件，返回SpriteData；格式不对时抛出ValueError"""
+        with open(path, "rb") as f:
+            blob = f.read()
+        try:
+            (magic, version, width, height, cx, cy, cw, ch,
+             count, unique_count, colors) = cls.HEADER.unpack_from(blob, 0)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"不是精灵文件或版本不支持: {path}")
+            offset = cls.HEADER.size
+            palette = list(array('I', blob[offset:offset + colors * 4]))
+            offset += colors * 4
+            delays, frame_map = array('H'), []
+            for _ in range(count):
+                delay, index = cls.FRAME.unpack_from(blob, offset)
+                delays.append(delay)
+                frame_map.append(index)
+                offset += cls.FRAME.size
+
+            frames = []
+            previous = None
+            for _ in range(unique_count):
+                kind, x, y, w, h, size = cls.CHUNK.unpack_from(blob, offset)
+                offset += cls.CHUNK.size
+                payload = zlib.decompress(blob[offset:offset + size])
+                offset += size
+                if kind == cls.KEY:
+                    frames.append(payload)
+                else:
+                    buf = bytearray(previous)
+                    for r in range(h):
+                        start = (y + r) * cw + x
+                        buf[start:start + w] = payload[r * w:(r + 1) * w]
+                    frames.append(bytes(buf))
+                previous = frames[-1]
+        except (struct.error, zlib.error, TypeError) as e:
+            raise ValueError(f"精灵文件损坏 {path}: {e}") from e
+        return SpriteData((width, height), (cx, cy, cw, ch), palette, delays, frame_map, frames)
+
+    @staticmethod
+    def render(sprite, pixel_size, transform=Qt.SmoothTransformation):
+        """展开成pixel_size大小的ARGB32预乘帧，重复帧返回同一个QImage对象"""
+        width, height = sprite.canvas
+        cx, cy, cw, ch = sprite.crop
+        sx, sy = pixel_size.width() / width, pixel_size.height() / height
+        target = QRectF(cx * sx, cy * sy, cw * sx, ch * sy)
+        rendered = []
+        for data in sprite.frames:
+            crop = indexed_image(data, cw, ch, sprite.palette).convertToFormat(QImage.Format_ARGB32_Premultiplied)
+            image = QImage(pixel_size, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.transparent)
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, transform == Qt.SmoothTransformation)
+            painter.drawImage(target, crop)
+            painter.end()
+            rendered.append(image)
+        return [rendered[i] for i in sprite.frame_map]
@@ -0,0 +1,90 @@
+from common_imports import *
+
+
+class StartupStage:
+    """一个启动阶段"""
+    def __init__(self, name, func, priority=0):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.done = False
+        self.duration_ms = None
+
+
+class StartupScheduler(QObject):
+    """分阶段启动：先显示桌宠，其余子系统在空闲时按优先级逐个初始化"""
+    stage_finished = pyqtSignal(str, float)  # 阶段名, 用时(ms)
+    all_finished = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._created_at = time.perf_counter()
+        self._stages = {}
+        self._pending = []
+        self.started = False
+        self.finished = False
+        self.first_frame_ms = None
+        self.timings = {}
+
+    def add_stage(self, name, func, priority=0):
+        """注册阶段，priority越小越先执行"""
+        self._stages[name] = StartupStage(name, func, priority)
+
+    def start(self):
+        """开始执行后台阶段（可重复调用）"""
+        if self.started:
+            return
+        self.started = True
+        self.first_frame_ms = (time.perf_counter() - self._created_at) * 1000
+        self.timings["first_frame"] = self.first_frame_ms
+        print(f"[启动] 首帧用时 {self.first_frame_ms:.1f}ms")
+
+        self._pending = sorted(
+            (s for s in self._stages.values() if not s.done),
+            key=lambda s: s.priority
+        )
+        self._schedule_next()
+
+    def _schedule_next(self):
+        # 0ms定时器在事件队列空闲时触发，每次只跑一个阶段，保证绘制不被阻塞
+        QTimer.singleShot(0, self._run_next)
+
+    def _run_next(self):
+        while self._pending and self._pending[0].done:
+            self._pending.pop(0)
+        if not self._pending:
+            self._finish()
+            return
+        self._run_stage(self._pending.pop(0))
+        self._schedule_next()
+
+    def _run_stage(self, stage):
+        stage.done = True
+        start = time.perf_counter()
+        try:
+            stage.func()
+        except Exception as e:
+            print(f"[启动] 阶段 {stage.name} 失败: {str(e)}")
+        stage.duration_ms = (time.perf_counter() - start) * 1000
+        self.timings[stage.name] = stage.duration_ms
+        print(f"[启动] {stage.name} 用时 {stage.duration_ms:.1f}ms")
+        self.stage_finished.emit(stage.name, stage.duration_ms)
+
+    def _finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.timings["total"] = (time.perf_counter() - self._created_at) * 1000
+        print(f"[启动] 全部完成，总用时 {self.timings['total']:.1f}ms")
+        self.all_finished.emit()
+
+    def require(self, *names):
+        """需要某些子系统时立即同步执行对应阶段（例如启动中用户就打开了菜单）"""
+        for name in names:
+            stage = self._stages.get(name)
+            if stage and not stage.done:
+                self._run_stage(stage)
+
+    def is_done(self, name):
+        stage = self._stages.get(name)
+        return stage is not None and stage.done
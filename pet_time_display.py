@@ -156,18 +156,20 @@ class PetTimeDisplay(QObject):
         """)
         self.update_time()
 
-    def update_label_position(self):
-        """更新标签位置到桌宠正上方"""
+    def update_label_position(self, raise_top=True):
+        """更新标签位置到桌宠正上方；跟随移动时不必每次raise_()"""
         if self.time_label:
-            # 获取桌宠的全局位置
-            pet_global_pos = self.parent.mapToGlobal(QPoint(0, 0))
+            # 获取桌宠的全局位置（无边框窗口，pos()就是客户区左上角，move后立即生效）
+            pet_global_pos = self.parent.pos()
         
             # 计算时间框位置（居中于桌宠上方）
             label_x = pet_global_pos.x() + (self.parent.width() - self.time_label.width()) // 2
             label_y = pet_global_pos.y() - self.time_label.height() - 5  # 上方5像素
         
-            self.time_label.move(label_x, label_y)
-            self.time_label.raise_()  # 确保置顶
+            if self.time_label.pos() != QPoint(label_x, label_y):
+                self.time_label.move(label_x, label_y)
+            if raise_top:
+                self.time_label.raise_()  # 确保置顶
 
 
 
@@ -175,7 +177,7 @@ class PetTimeDisplay(QObject):
         """事件过滤器，用于监听桌宠移动"""
         if obj == self.parent and event.type() == QEvent.Move:
             if self.enabled:
-                self.update_label_position()
+                self.update_label_position(raise_top=False)
         return super().eventFilter(obj, event)
 
     def load_state(self):
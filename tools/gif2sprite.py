@@ -0,0 +1,137 @@
+"""把GIF转换成桌宠的 .pspr 精灵格式（去重、裁剪、调色板索引、变化区域帧）
+
+用法:
+    python tools/gif2sprite.py pikaqiu                    # 转换目录里所有GIF，输出到同一目录
+    python tools/gif2sprite.py a.gif b.gif -o out         # 转换指定文件到out目录
+    python tools/gif2sprite.py pikaqiu --manifest         # 同时把皮肤清单里的动画改为.pspr
+    python tools/gif2sprite.py pikaqiu --verify           # 转换后逐像素和GIF比对
+
+.pspr 由 pet_frame_atlas 直接加载，不经过Qt的GIF解码器。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QGuiApplication, QImage, QImageReader
+
+from pet_sprite import SpriteFile
+
+MIN_DELAY = 20
+DEFAULT_DELAY = 100
+
+
+def read_gif(path):
+    """读出GIF的全部帧（原始尺寸）和延迟，与帧图集的延迟规则一致"""
+    reader = QImageReader(path)
+    images, delays = [], []
+    while True:
+        image = reader.read()
+        if image.isNull():
+            break
+        delay = reader.nextImageDelay()
+        delays.append(min(65535, max(MIN_DELAY, delay if delay > 0 else DEFAULT_DELAY)))
+        images.append(image.convertToFormat(QImage.Format_ARGB32))
+        if not reader.canRead():
+            break
+    if not images:
+        raise ValueError(f"无法解码 {path}: {reader.errorString()}")
+    return images, delays
+
+
+def verify(images, sprite_path):
+    """重新读取精灵文件，和GIF逐帧逐像素比较，返回不一致的帧序号"""
+    sprite = SpriteFile.load(sprite_path)
+    rendered = SpriteFile.render(sprite, QSize(*sprite.canvas))
+    bad = []
+    for i, (original, image) in enumerate(zip(images, rendered)):
+        a = original.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        if a != image:
+            bad.append(i)
+    if len(rendered) != len(images):
+        bad.append(len(images))
+    return bad
+
+
+def convert(path, out_dir, check=False):
+    start = time.perf_counter()
+    images, delays = read_gif(path)
+    sprite = SpriteFile.encode(images, delays)
+    name = os.path.splitext(os.path.basename(path))[0] + SpriteFile.SUFFIX
+    target = os.path.join(out_dir, name)
+    payload, deltas = SpriteFile.save(sprite, target)
+    elapsed = (time.perf_counter() - start) * 1000
+    before, after = os.path.getsize(path), os.path.getsize(target)
+    cx, cy, cw, ch = sprite.crop
+    print(f"{os.path.basename(path)} -> {name}: {len(images)}帧 去重后{len(sprite.frames)}帧"
+          f"(变化区域帧{deltas}) 裁剪{cw}x{ch}+{cx}+{cy}/{sprite.canvas[0]}x{sprite.canvas[1]} "
+          f"{len(sprite.palette)}色 {before // 1024}KB -> {after // 1024}KB 用时{elapsed:.0f}ms")
+    if check:
+        bad = verify(images, target)
+        print(f"  校验: {'通过' if not bad else f'{len(bad)}帧不一致 {bad[:10]}'}")
+        if bad:
+            return None
+    return target
+
+
+def update_manifest(skin_dir, converted):
+    """把清单里指向已转换GIF的动画改为.pspr"""
+    manifest_path = os.path.join(skin_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        print(f"没有清单，跳过: {manifest_path}")
+        return
+    with open(manifest_path, "r", encoding="utf-8-sig") as f:
+        manifest = json.load(f)
+    changed = 0
+    for spec in manifest.get("animations", {}).values():
+        if isinstance(spec, dict) and spec.get("file") in converted:
+            spec["file"] = converted[spec["file"]]
+            changed += 1
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"已更新清单 {manifest_path}: {changed}个动画")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIF转桌宠精灵格式")
+    parser.add_argument("inputs", nargs="+", help="GIF文件或包含GIF的目录")
+    parser.add_argument("-o", "--out", help="输出目录，默认与GIF相同")
+    parser.add_argument("--manifest", action="store_true", help="更新输入目录里的manifest.json")
+    parser.add_argument("--verify", action="store_true", help="转换后逐像素校验")
+    args = parser.parse_args()
+
+    app = QGuiApplication(sys.argv[:1])  # QPainter渲染需要
+    failed = 0
+    for item in args.inputs:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, f) for f in os.listdir(item) if f.lower().endswith(".gif"))
+        else:
+            paths = [item]
+        converted = {}
+        for path in paths:
+            out_dir = args.out or os.path.dirname(os.path.abspath(path))
+            os.makedirs(out_dir, exist_ok=True)
+            try:
+                target = convert(path, out_dir, args.verify)
+            except (OSError, ValueError) as e:
+                print(f"转换失败 {path}: {e}")
+                target = None
+            if target is None:
+                failed += 1
+                continue
+            converted[os.path.basename(path)] = os.path.relpath(target, os.path.dirname(os.path.abspath(path))).replace(os.sep, "/")
+        if args.manifest and os.path.isdir(item):
+            update_manifest(item, converted)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()